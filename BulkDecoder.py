@@ -0,0 +1,157 @@
+#
+#   Long captures decoded by several processes
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   A capture is split at idle gaps longer than any frame (NEC frame with
+#   its repeat codes ~110ms, DHT22 is triggered every 2s at least), so no
+#   frame is cut and a repeat code always stays with its command. Shards
+#   are decoded by a pool of processes and the results come back in
+#   order of time.
+#
+#   DHT22 averages depend on the measures of the last 3 minutes: every
+#   task decodes that much of the capture before its own shards again,
+#   and only the results of its own shards are returned. Decoders run on
+#   a virtual clock moved by the edges, so averages age by capture time.
+#
+#   Usage:
+#   decoder = BulkDecoder.BulkDecoder(["NEC", "NEC_REPEAT"], processes=4)
+#   for frameTime, result in decoder.decode(edgeTimes):
+#       print(frameTime, result)
+#
+
+import os
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+import Clock
+import MultiProtocolDecoder
+from Timeline import TimelineDataProvider
+
+
+# Protocol name -> seconds of earlier signal its decoder state depends on
+WARMUP_SECONDS = {"DHT22": 180}
+
+
+class EdgeList(list):
+    # Collects edges from a data provider instead of a queue
+    put = list.append
+
+
+def getEdgeTimes(filenames, addZeroTime=False, leader=None):
+    # Timeline files as one capture, the same way SignalTool replays them
+    edges = EdgeList()
+    provider = TimelineDataProvider(startTime=Clock.VirtualClock.START_TIME)
+    provider.InitDataQueue(edges)
+    for filename in filenames:
+        provider.putFile(filename, addZeroTime, leader)
+    return edges
+
+
+def getProtocols(names=None):
+    return [protocol for protocol in MultiProtocolDecoder.getDefaultProtocols() if names is None or protocol.name in names]
+
+
+class FrameCollector(MultiProtocolDecoder.MultiProtocolDecoder):
+    # Decodes edges pushed one by one, keeps start time of every frame
+
+    def __init__(self, protocols=None):
+        super().__init__(protocols)
+        self.setClock(Clock.VirtualClock())
+
+    def initialize(self, timeQueue=None, debug=False):
+        super().initialize(timeQueue, debug)
+        self.frames = []
+
+    def decodeFrame(self, protocol, startTime, pulses):
+        super().decodeFrame(protocol, startTime, pulses)
+        self.frames.append((startTime, self.results.popleft()))
+
+    def addEdges(self, edgeTimes):
+        for edgeTime in edgeTimes:
+            self.clock.advanceTo(edgeTime)
+            pulseLength = edgeTime - self.lastEdgeTime
+            self.lastEdgeTime = edgeTime
+            self.addPulse(pulseLength, edgeTime)
+
+    def finish(self):
+        if self.frameProtocol is not None:
+            self.finishFrame()
+        return self.frames
+
+
+def decodeTask(task):
+    # Entry of worker process: [(frame time, result)] of one task
+    protocolNames, warmupEdges, edgeTimes = task
+    decoder = FrameCollector(getProtocols(protocolNames))
+    decoder.initialize()
+    decoder.addEdges(warmupEdges)
+    decoder.addEdges(edgeTimes)
+
+    firstEdgeTime = edgeTimes[0]
+    return [(frameTime, result) for frameTime, result in decoder.finish() if frameTime >= firstEdgeTime]
+
+
+class BulkDecoder:
+
+    # Longer than NEC frame with repeat codes, shorter than DHT22 interval
+    MIN_GAP_SECONDS = 0.12
+
+    # More tasks than processes, so processes finish at similar time
+    TASKS_PER_PROCESS = 4
+
+    def __init__(self, protocols=None, processes=None, minGap=None, warmupSeconds=None):
+        # Protocol names of MultiProtocolDecoder.getDefaultProtocols, all by default
+        self.protocols = protocols
+        self.processes = processes if processes is not None else os.cpu_count()
+        self.minGap = minGap if minGap is not None else self.MIN_GAP_SECONDS
+
+        if warmupSeconds is None:
+            names = protocols if protocols is not None else [protocol.name for protocol in getProtocols()]
+            warmupSeconds = max([WARMUP_SECONDS.get(name, 0) for name in names] + [0])
+        self.warmupSeconds = warmupSeconds
+
+    def getShardStarts(self, edgeTimes):
+        # Index of the first edge of every shard
+        starts = [0]
+        for i in range(1, len(edgeTimes)):
+            if edgeTimes[i] - edgeTimes[i - 1] > self.minGap:
+                starts.append(i)
+        return starts
+
+    def getTasks(self, edgeTimes):
+        shardStarts = self.getShardStarts(edgeTimes)
+        shardStartTimes = [edgeTimes[i] for i in shardStarts]
+        edgesPerTask = max(1, len(edgeTimes) // max(1, self.processes * self.TASKS_PER_PROCESS))
+
+        tasks = []
+        first = 0
+        for shard in range(1, len(shardStarts) + 1):
+            end = shardStarts[shard] if shard < len(shardStarts) else len(edgeTimes)
+            start = shardStarts[first]
+            if end - start < edgesPerTask and shard < len(shardStarts):
+                continue
+
+            # Warm-up starts at a shard too, so no frame is cut
+            warmup = bisect_left(shardStartTimes, edgeTimes[start] - self.warmupSeconds, 0, first) if self.warmupSeconds > 0 else first
+            tasks.append((self.protocols, edgeTimes[shardStarts[warmup]:start], edgeTimes[start:end]))
+            first = shard
+        return tasks
+
+    def decode(self, edgeTimes):
+        # (frame time, result) of the whole capture, in order of time
+        if len(edgeTimes) == 0:
+            return
+
+        tasks = self.getTasks(edgeTimes)
+        if self.processes <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                for frame in decodeTask(task):
+                    yield frame
+            return
+
+        with ProcessPoolExecutor(self.processes) as executor:
+            for frames in executor.map(decodeTask, tasks):
+                for frame in frames:
+                    yield frame
@@ -0,0 +1,118 @@
+#
+#   Time used by decoders and data providers
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Decoders read time and wait only through a clock. The real clock
+#   calls timeit.default_timer and time.sleep directly, so live decoding
+#   is unchanged. The virtual clock moves only when something waits on
+#   it or an edge is read from the queue; recorded signals are then
+#   decoded without waiting and give the same results every time. A wait
+#   for the next edge ends at the next edge put on the queue, or at its
+#   virtual deadline when that edge comes later or the producer is idle.
+#   A stopped SignalDecoder.EdgeQueue ends the input at its end time: the
+#   wait raises SignalDecoder.EndOfInput once the queue is empty and the
+#   clock has reached it.
+#
+#   Usage:
+#   clock = Clock.VirtualClock()
+#   provider = Timeline.TimelineDataProvider(clock=clock)
+#   IReader = SignalDecoder.SignalDecoder(provider, DHT22.DHT22Decoder(), clock=clock)
+#   provider.putFile("Tests/test-dht22-01.txt", True)
+#   clock.setIdle()
+#
+
+from queue import Empty
+from time import sleep
+from timeit import default_timer
+
+
+class Clock:
+    # Real time
+
+    now = staticmethod(default_timer)
+    sleep = staticmethod(sleep)
+
+    def get(self, queue, timeout):
+        # queue.get waiting at most timeout seconds, raises Empty
+        return queue.get(timeout=timeout)
+
+    def advanceTo(self, time):
+        # Real time can not be moved
+        pass
+
+    def setIdle(self, idle=True):
+        # Real time goes on without any producer
+        pass
+
+
+class VirtualClock(Clock):
+
+    # Longest real wait for one virtual wait, lets other threads run
+    # without spinning when there is nothing to decode. Virtual time
+    # never depends on it
+    REAL_SLEEP_SECONDS = 0.0005
+
+    # Decoders start measuring from time 0, the first edge must not be
+    # taken for a pulse
+    START_TIME = 1.0
+
+    def __init__(self, startTime=START_TIME):
+        self.time = startTime
+
+        # Producer puts no more edges until it is set busy again
+        self.idle = False
+        # Queues with a decoder waiting for an edge
+        self.waitingQueues = set()
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += seconds
+        sleep(min(seconds, self.REAL_SLEEP_SECONDS))
+
+    def get(self, queue, timeout):
+        # Edge put on the queue before the deadline, otherwise Empty at the
+        # deadline. An empty queue is waited for until the producer is idle,
+        # a stopped SignalDecoder.EdgeQueue ends at its endTime
+        deadline = self.time + timeout
+        with queue.not_empty:
+            self.waitingQueues.add(queue)
+            while len(queue.queue) == 0 and not self.idle and not getattr(queue, "isStopped", False):
+                queue.not_empty.wait()
+            self.waitingQueues.discard(queue)
+            nextEdge = queue.queue[0] if len(queue.queue) > 0 else None
+
+        if nextEdge is None and getattr(queue, "isStopped", False):
+            endTime = queue.endTime
+            if endTime is None or self.time >= endTime:
+                # Raises SignalDecoder.EndOfInput
+                return queue.get_nowait()
+            deadline = min(deadline, endTime)
+
+        if nextEdge is None or (isinstance(nextEdge, (int, float)) and nextEdge > deadline):
+            self.advanceTo(deadline)
+            if nextEdge is None:
+                sleep(self.REAL_SLEEP_SECONDS)
+            raise Empty
+
+        self.advanceTo(nextEdge)
+        return queue.get_nowait()
+
+    def advanceTo(self, time):
+        # Signal up to this time has been read
+        if time > self.time:
+            self.time = float(time)
+
+    def setIdle(self, idle=True):
+        # Producer has put all its edges (idle) or puts more (busy)
+        self.idle = idle
+        for queue in list(self.waitingQueues):
+            with queue.not_empty:
+                queue.not_empty.notify_all()
+
+
+realClock = Clock()
@@ -6,11 +6,15 @@
 #   MIT Licence
 #
 
-from time import sleep
 from queue import Queue
 from queue import Empty
-from timeit import default_timer
 from collections import deque
+import Log
+import Clock
+import PulseProtocol
+from Results import DHT22Reading, formatBinary
+
+log = Log.getLogger("DHT22")
 
 
 class Measure:
@@ -29,7 +33,10 @@ class AverageMeasure:
   ALLOW_TEMPERATURE_DIFFERENCE = 2
   ALLOW_HUMIDITY_DIFFERENCE = 10
 
-  def __init__(self, maximum_length_seconds = 180):
+  log = log
+
+  def __init__(self, maximum_length_seconds = 180, clock = Clock.realClock):
+      self.clock = clock
       self.sum = Measure(0, 0, 0)
       self.results = deque()
       self.maximum_length_seconds = maximum_length_seconds
@@ -37,9 +44,10 @@ class AverageMeasure:
 
 
   def remove(self):
-      while len(self.results) > 0 and default_timer() - self.results[0].DateTime > self.maximum_length_seconds:
+      now = self.clock.now()
+      while len(self.results) > 0 and now - self.results[0].DateTime > self.maximum_length_seconds:
           first = self.results.popleft()
-          print("removing first measure after {0} seconds: {1}C".format(default_timer() - first.DateTime, first.Temperature))
+          self.log.debug("removing first measure after %f seconds: %sC", now - first.DateTime, first.Temperature)
           self.sum.Temperature -= first.Temperature
           self.sum.Humidity -= first.Humidity
     
@@ -47,12 +55,6 @@ class AverageMeasure:
 
     
       self.results.append(measure)
-      print(self.results)
-      i = 0
-      for result in self.results:
-          i += 1
-          print("{0}. = {1}".format(i, result.Temperature))
-
       
       self.sum.Temperature += measure.Temperature
       self.sum.Humidity += measure.Humidity
@@ -60,17 +62,12 @@ class AverageMeasure:
       self.lastMeasureDateTime = measure.DateTime
       divider = len(self.results)
     
-      result = 0
-      if divider > 0:
-        result = self.sum.Temperature / divider  
-
-      print("+ {0} = {1} / {2} = {3}".format(measure.Temperature, self.sum.Temperature, divider, result))
+      self.log.debug("+ %s = %s / %d measures", measure.Temperature, self.sum.Temperature, divider)
       pass
 
   def canAddMeasure(self, measure: Measure):
       average = self.getAvegareMeasure()
-      print(abs(measure.Temperature - average.Temperature))
-      print(abs(measure.Humidity - average.Humidity))
+      self.log.debug("Difference from average %s C, %s %%", abs(measure.Temperature - average.Temperature), abs(measure.Humidity - average.Humidity))
     
       return len(self.results) < 2 or (abs(measure.Temperature - average.Temperature) <= self.ALLOW_TEMPERATURE_DIFFERENCE and abs(measure.Humidity - average.Humidity) <= self.ALLOW_HUMIDITY_DIFFERENCE)
 
@@ -96,10 +93,22 @@ class DHT22Decoder:
 
   MAX_DHT22_SIGNAL_LENGTH = 0.0048
 
+  # Response of the sensor before the first bit: 80 µs low, 80 µs high
+  PREAMBLE_LENGTH = 0.00016
+  PREAMBLE_ERROR_RANGE = 0.00003
+
+  # Noise edges read after the start signal, above 40 pulses of the frame
+  MAX_EXTRA_PULSES = 24
+
   REMOVE_READING_WHEN_TEMPERATURE_DIFFERENT_FROM_AVG = 20
   REMOVE_READING_WHEN_HUMIDITY_DIFFERENT_FROM_AVG = 20
 
+  # 40 correct pulses are read from the tables of the spec
+  SPEC = PulseProtocol.getCompiled("DHT22")
+
   DEBUG = False
+  clock = Clock.realClock
+  log = log
 
   def __init__(self) -> None:
       self.averageMeasure = AverageMeasure()
@@ -113,9 +122,16 @@ class DHT22Decoder:
       self.lastAverageHumidity = 0
       pass
   
+  def setClock(self, clock):
+      self.clock = clock
+      self.averageMeasure.clock = clock
+
   def initialize(self, timeQueue, DebugMode = False):
       self.signalEdgeDetectedTimeQueue = timeQueue
-      self.DEBUG = DebugMode
+      if DebugMode:
+          self.log = Log.enableDebug(self.log)
+          self.averageMeasure.log = self.log
+      self.DEBUG = DebugMode or Log.isDebugEnabled(self.log)
       pass
       
   def getBurst(self, pulseCount, burstStartTime, maxTime):
@@ -123,54 +139,85 @@ class DHT22Decoder:
       edgeTimeDetected = burstStartTime
       previousPulseStart = burstStartTime
       i = 0
-      signalTime = 0
 
       if self.DEBUG:
-          print("Queue length: {0}".format(self.signalEdgeDetectedTimeQueue.qsize()))
-
-      while self.signalEdgeDetectedTimeQueue.qsize() > 40:
-          i += 1
-          edgeTimeDetected = self.signalEdgeDetectedTimeQueue.get_nowait()
-          signalTime = edgeTimeDetected - previousPulseStart
-          previousPulseStart = edgeTimeDetected
+          self.log.debug("Queue length: %d", self.signalEdgeDetectedTimeQueue.qsize())
 
-      i = 0
-      while self.signalEdgeDetectedTimeQueue.qsize() > 0 and i < pulseCount and edgeTimeDetected <= maxTime:
-          i += 1
-  
+      # All edges of the response are read, noise and missed edges included,
+      # the frame is found in them by alignFrame
+      while edgeTimeDetected <= maxTime and i < pulseCount + self.MAX_EXTRA_PULSES:
           try:
               edgeTimeDetected = self.signalEdgeDetectedTimeQueue.get_nowait()
-              signalTime = edgeTimeDetected - previousPulseStart
-          
           except Empty:
               if self.DEBUG:
-                print("Empty: {0}".format(len(resultArray)))
-                print (resultArray)
-              
-              print("Left: {0}".format(maxTime - previousPulseStart))
-              signalTime = default_timer() - previousPulseStart
+                self.log.debug("Empty: %d, left: %f", len(resultArray), maxTime - previousPulseStart)
+              break
 
+          i += 1
+          signalTime = edgeTimeDetected - previousPulseStart
           self.signalEdgeDetectedTimeQueue.task_done()
           resultArray.append(signalTime)
           previousPulseStart = edgeTimeDetected
           if self.DEBUG:
-              print ("{:0>2} {:.6f}".format(i, signalTime))
+              self.log.debug("%02d %.6f", i, signalTime)
       
       self.timeFromNextPhase = edgeTimeDetected - maxTime
       if self.DEBUG:
-          print ("{:0>2} {:.6f}".format(i, self.timeFromNextPhase))
+          self.log.debug("%02d %.6f", i, self.timeFromNextPhase)
       
-      return resultArray
+      return self.alignFrame(self.SPEC.resolvePulses(resultArray), pulseCount)
+
+  def getPulseBit(self, pulseLength):
+      if pulseLength >= self.PULSE_POSITIVE_LENGTH and pulseLength <= self.PULSE_POSITIVE_LENGTH + self.PulseErrorRange:
+          return 1
+      if pulseLength > self.PULSE_NEGATIVE_LENGTH - self.PulseErrorRange and pulseLength < self.PULSE_POSITIVE_LENGTH:
+          return 0
+      return None
+
+  def hasValidChecksum(self, bits):
+      values = [0, 0, 0, 0, 0]
+      for i in range(0, 40):
+          values[i // 8] = (values[i // 8] << 1) | bits[i]
+      return sum(values[0:4]) & 255 == values[4]
+
+  def alignFrame(self, pulseArray, pulseCount):
+      # Sliding window over the pulses; the best frame has all the pulses
+      # in bit timing, correct checksum and follows the response preamble
+      if len(pulseArray) <= pulseCount:
+          return pulseArray
+
+      bestOffset = 0
+      bestScore = -1
+      for offset in range(0, len(pulseArray) - pulseCount + 1):
+          bits = [self.getPulseBit(pulseLength) for pulseLength in pulseArray[offset:offset + pulseCount]]
+          score = pulseCount - bits.count(None)
+
+          if score == pulseCount and pulseCount == 40 and self.hasValidChecksum(bits):
+              score += pulseCount
+
+          if offset > 0 and abs(pulseArray[offset - 1] - self.PREAMBLE_LENGTH) <= self.PREAMBLE_ERROR_RANGE:
+              score += 1
+
+          if score > bestScore:
+              bestScore = score
+              bestOffset = offset
+
+      if self.DEBUG:
+          self.log.debug("Frame at pulse %d of %d, score %d", bestOffset, len(pulseArray), bestScore)
+
+      return pulseArray[bestOffset:bestOffset + pulseCount]
   
   def formatBinary(self, signal):
-      ending = ""
-      if len(signal) > 40:
-          ending = " " + signal[40:len(signal)]
-      return signal[0:8] + " " + signal[8:16] + " " + signal[16:24] + " " + signal[24:32] + " " + signal[32:40] + ending
+      return formatBinary(signal)
     
   def getCommand(self):
       signalTime = self.waitForSignal()
       pulseArray = self.getBurst(40, self.currentSignalStartTime, self.currentSignalStartTime + signalTime + self.MAX_DHT22_SIGNAL_LENGTH)    
+      # Edges are read from the queue directly, virtual time follows them
+      self.clock.advanceTo(self.currentSignalStartTime)
+      return self.decodePulses(pulseArray, self.currentSignalStartTime)
+
+  def decodePulses(self, pulseArray, signalStartTime):
       decodedSignal = self.translateSignal(pulseArray)
 
       if not self.validateSignal(decodedSignal):
@@ -179,7 +226,7 @@ class DHT22Decoder:
       self.averageMeasure.remove()
 
       if self.validateSignal(decodedSignal):
-          measure = Measure(temperature = self.temperature, humidity = self.humidity, dateTime = self.currentSignalStartTime)
+          measure = Measure(temperature = self.temperature, humidity = self.humidity, dateTime = signalStartTime)
         
           if self.averageMeasure.canAddMeasure(measure):
               self.averageMeasure.append(measure)
@@ -190,29 +237,28 @@ class DHT22Decoder:
                   self.lastAverageHumidity = average.Humidity
 
           
-              return { "binary": self.formatBinary(decodedSignal),
-                       "result": "OK",
-                       "temperature": self.temperature,
-                       "humidity": self.humidity,
-                       "avg_temperature": average.Temperature,
-                       "avg_humidity": average.Humidity
-                       }
+              return DHT22Reading("OK", decodedSignal, self.temperature, self.humidity,
+                                  avgTemperature = average.Temperature,
+                                  avgHumidity = average.Humidity,
+                                  dateTime = signalStartTime)
       
-      return { "binary": self.formatBinary(decodedSignal),
-               "result": "ERROR",
-               "checksum": self.checksum,
-               "calculated_checksum": self.calculated_checksum,
-               "temperature": self.temperature,
-               "humidity": self.humidity
-               }
+      return DHT22Reading("ERROR", decodedSignal, self.temperature, self.humidity,
+                          checksum = self.checksum,
+                          calculatedChecksum = self.calculated_checksum,
+                          dateTime = signalStartTime)
 
   def correctSignal(self, decodedSignal):
       if len(decodedSignal) != 40:
           return decodedSignal
       
       correctedSignal = decodedSignal
-      print("Correcting {0}".format(self.formatBinary(decodedSignal)))
-      print("Checksum read {0} == {1} calculated".format(self.checksum, self.calculated_checksum))
+      
+      # Nothing is corrected yet, differences are only logged
+      if not Log.isDebugEnabled(self.log):
+          return correctedSignal
+      
+      self.log.debug("Correcting %s", self.formatBinary(decodedSignal))
+      self.log.debug("Checksum read %d == %d calculated", self.checksum, self.calculated_checksum)
 
       difference_too_high = (256 - self.checksum) & self.calculated_checksum
       difference_too_low = (256 - self.calculated_checksum) & self.checksum
@@ -226,54 +272,73 @@ class DHT22Decoder:
           if difference_too_low & (1 << i) > 0:
               counts_too_low += 1
       
-      print("Bitwise difference HI {0}, LOW {1}".format(difference_too_high, difference_too_low))
-      print("Bits different HI {0}, LOW {1}".format(counts_too_high, counts_too_low))
+      self.log.debug("Bitwise difference HI %d, LOW %d", difference_too_high, difference_too_low)
+      self.log.debug("Bits different HI %d, LOW %d", counts_too_high, counts_too_low)
 
       temperatureDifference = self.lastAverageTemperature - self.temperature
       humidityDifference = self.lastAverageHumidity - self.humidity
 
-      print("Temperature difference {0} = {1} (avg) - {2} (last)".format(temperatureDifference, self.lastAverageTemperature, self.temperature))
-      print("Humidity difference {0} = {1} (avg) - {2} (last)".format(humidityDifference, self.lastAverageHumidity, self.humidity))
+      self.log.debug("Temperature difference %s = %s (avg) - %s (last)", temperatureDifference, self.lastAverageTemperature, self.temperature)
+      self.log.debug("Humidity difference %s = %s (avg) - %s (last)", humidityDifference, self.lastAverageHumidity, self.humidity)
 
       return correctedSignal
       
   def waitForSignal(self):
       self.breakTime = 0
       while True:
+          # Blocks until the next edge, a stopped SignalDecoder.EdgeQueue
+          # raises EndOfInput
+          edgeTimeDetected = self.signalEdgeDetectedTimeQueue.get()
+          self.signalEdgeDetectedTimeQueue.task_done()
+        
+          # Let Raspberry read whole signal before
+          # we use max CPU for decoding
+          signalTime = edgeTimeDetected - self.currentSignalStartTime
+          self.currentSignalStartTime = edgeTimeDetected
 
-          if self.signalEdgeDetectedTimeQueue.qsize() > 0:
-            edgeTimeDetected = self.signalEdgeDetectedTimeQueue.get()
-          
-            # Let Raspberry read whole signal before
-            # we use max CPU for decoding
-            signalTime = edgeTimeDetected - self.currentSignalStartTime
-            self.currentSignalStartTime = edgeTimeDetected
-  
-            if self.DEBUG:
-              print(signalTime)
-            
-            # If signal starts 13,5ms
-            if signalTime > 0.002 and signalTime < 0.008:
-                # Need to wait for the rest of the signal
-                if self.signalEdgeDetectedTimeQueue.qsize() < 40:
-                    #sleep(0.005) - for quarantee that signal has been read increased
-                    sleep(0.01)
-                else:
-                    if self.DEBUG:
-                        print(self.signalEdgeDetectedTimeQueue.qsize())
-                
-                return signalTime
-            else:
-                self.breakTime = signalTime
-                
-                if self.DEBUG:
-                    print("Wrong start signal", signalTime)
+          if self.DEBUG:
+            self.log.debug("Signal %f", signalTime)
           
-          if self.signalEdgeDetectedTimeQueue.empty():
-              sleep(0.01)
+          # If signal starts 13,5ms
+          if signalTime > 0.002 and signalTime < 0.008:
+              # Need to wait for the rest of the signal
+              if self.signalEdgeDetectedTimeQueue.qsize() < 40:
+                  #sleep(0.005) - for quarantee that signal has been read increased
+                  self.clock.sleep(0.01)
+              else:
+                  if self.DEBUG:
+                      self.log.debug("Queue length: %d", self.signalEdgeDetectedTimeQueue.qsize())
+              
+              return signalTime
+          else:
+              self.breakTime = signalTime
+              
+              if self.DEBUG:
+                  self.log.debug("Wrong start signal %f", signalTime)
       
 
+  def translateFrame(self, frame):
+      # Same values as translateSignal reads pulse by pulse
+      fields = self.SPEC.getFields(frame)
+      temperature = fields["temperature"] & 0x3FF
+      if fields["temperature"] & 0x8000:
+          self.temperature = -1 * (1024 - temperature) / 10
+      else:
+          self.temperature = temperature / 10
+
+      self.humidity = (fields["humidity"] & 0x7FF) / 10
+      self.checksum = fields["checksum"]
+      return "00000" + format(frame, "040b")[5:]
+
   def translateSignal(self, timeArray):
+      frame = self.SPEC.getFrame(timeArray)
+      if frame is None:
+          # Both edges mode: pulses out of timing are decided by their spaces
+          timeArray = self.SPEC.resolvePulses(timeArray)
+          frame = self.SPEC.getFrame(timeArray)
+      if frame is not None:
+          return self.translateFrame(frame)
+
       correctSignal = ''
       decodedSignal = ''
       i = 0
@@ -325,7 +390,7 @@ class DHT22Decoder:
       
       if len(signalString) != 40:
           if self.DEBUG:
-              print("Invalid length")
+              self.log.debug("Invalid length")
           return False
 
 
@@ -0,0 +1,147 @@
+#
+#   Decoded commands dispatched to handlers
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Handlers are registered for a decoded hex code, for an address
+#   (high byte of the hex code) or for all events. Handlers are found
+#   by dictionary lookup and called from a small pool of worker
+#   threads, so a slow handler never delays the decoder.
+#
+#   NEC repeat codes are dispatched as the last command with
+#   repeat set to True, at most once per repeatInterval seconds.
+#   Debounce and repeat limits are counted per hex code, so an address
+#   or catch-all handler never drops one key because of another.
+#
+#   Usage:
+#   IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder())
+#   IReader.subscribe(volumeUp, hex="0x2d58", repeatInterval=0.2)
+#   IReader.subscribe(anyKey, address=0x2d)
+#   IReader.subscribe(log)
+#
+
+from queue import Queue
+from queue import Full
+from threading import Thread
+from timeit import default_timer
+import Log
+from Results import NECCommand, NECRepeat
+
+log = Log.getLogger("Dispatcher")
+
+
+class Subscription:
+    __slots__ = ("handler", "debounceSeconds", "repeatInterval", "lastTimes")
+
+    def __init__(self, handler, debounceSeconds, repeatInterval):
+        self.handler = handler
+        self.debounceSeconds = debounceSeconds
+        self.repeatInterval = repeatInterval
+        # hex code -> time of the last accepted event
+        self.lastTimes = {}
+
+    def accepts(self, code, isRepeat, now):
+        # Debounce of new presses, rate limit of held keys
+        limit = self.repeatInterval if isRepeat else self.debounceSeconds
+        lastTime = self.lastTimes.get(code)
+        if lastTime is not None and now - lastTime < limit:
+            return False
+        self.lastTimes[code] = now
+        return True
+
+
+class CommandDispatcher:
+
+    MAX_PENDING = 256
+
+    def __init__(self, workers=2, debounceSeconds=0, repeatInterval=0):
+        self.debounceSeconds = debounceSeconds
+        self.repeatInterval = repeatInterval
+
+        # hex code -> [Subscription], address -> [Subscription]
+        self.byHex = {}
+        self.byAddress = {}
+        self.forAll = []
+
+        self.lastCommand = None
+        self.dropped = 0
+
+        self.pending = Queue(self.MAX_PENDING)
+        self.workers = []
+        for i in range(workers):
+            worker = Thread(target=self.runHandlers)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def subscribe(self, handler, hex=None, address=None, debounceSeconds=None, repeatInterval=None):
+        subscription = Subscription(handler,
+                                    self.debounceSeconds if debounceSeconds is None else debounceSeconds,
+                                    self.repeatInterval if repeatInterval is None else repeatInterval)
+
+        if hex is not None:
+            self.byHex.setdefault(int(hex, 16) if isinstance(hex, str) else hex, []).append(subscription)
+        elif address is not None:
+            self.byAddress.setdefault(address, []).append(subscription)
+        else:
+            self.forAll.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for subscriptions in [self.forAll] + list(self.byHex.values()) + list(self.byAddress.values()):
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+
+    def dispatch(self, command):
+        # Called from the decoder thread, never waits for handlers
+        isRepeat = isinstance(command, NECRepeat)
+        if isRepeat:
+            if self.lastCommand is None:
+                return
+            event = self.lastCommand.asRepeat()
+        elif command:
+            event = command
+        else:
+            return
+
+        subscriptions = self.forAll
+        code = None
+        if isinstance(event, NECCommand):
+            if not isRepeat:
+                self.lastCommand = event
+            code = event.code
+            subscriptions = self.byHex.get(code, []) + self.byAddress.get(code >> 8, []) + subscriptions
+
+        now = default_timer()
+        for subscription in subscriptions:
+            if subscription.accepts(code, isRepeat, now):
+                try:
+                    self.pending.put_nowait((subscription.handler, event))
+                except Full:
+                    self.dropped += 1
+
+    def runHandlers(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+
+            handler, event = item
+            try:
+                handler(event)
+            except Exception:
+                log.exception("Handler %s failed", handler)
+            finally:
+                self.pending.task_done()
+
+    def join(self):
+        # Waits until all dispatched events are handled
+        self.pending.join()
+
+    def close(self):
+        for worker in self.workers:
+            self.pending.put(None)
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,86 @@
+#
+#   Edges filtered before they are put into the decoder queue
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Two edges closer than the shortest pulse of the protocol are a
+#   glitch: the later edge is merged into the earlier one. After idle
+#   time (a pulse longer than any pulse of the protocol) an edge is
+#   queued only when the next pulse is a leader of the protocol, so
+#   isolated noise never reaches the decoder.
+#
+#   Usage:
+#   provider = GPIODataProvider.EdgeDetected(GPIO.BCM, 18, Edge_Filter=EdgeFilter.getFilter("nec"))
+#   print(provider.filter.dropped)
+#
+
+FILTERS = {
+    # Shortest NEC pulse is 1.125ms, leader 9ms + 4.5ms or repeat 9ms + 2.25ms
+    "nec": {"minPulseSeconds": 0.0004, "leaders": [(0.0035, 0.015)], "maxPulseSeconds": 0.015},
+    # Shortest DHT22 pulse is 76us, start signal and response 2-8ms
+    "dht22": {"minPulseSeconds": 0.00002, "leaders": [(0.002, 0.008)], "maxPulseSeconds": 0.008},
+}
+
+
+def getFilter(name):
+    # New filter for one provider, "multi" accepts all the protocols
+    if name == "multi":
+        settings = FILTERS.values()
+        return EdgeFilter(min(setting["minPulseSeconds"] for setting in settings),
+                          [leader for setting in settings for leader in setting["leaders"]],
+                          max(setting["maxPulseSeconds"] for setting in settings))
+    if name not in FILTERS:
+        raise KeyError("Unknown edge filter '{0}'. Available: {1}".format(name, ", ".join(sorted(FILTERS) + ["multi"])))
+    return EdgeFilter(**FILTERS[name])
+
+
+class EdgeFilter:
+
+    def __init__(self, minPulseSeconds=0, leaders=(), maxPulseSeconds=None):
+        self.minPulseSeconds = minPulseSeconds
+        self.leaders = list(leaders)
+        self.maxPulseSeconds = maxPulseSeconds
+
+        # Without leaders every edge which is not a glitch is queued
+        self.inFrame = len(self.leaders) == 0 or maxPulseSeconds is None
+        self.lastEdgeTime = None
+        self.candidateTime = None
+
+        self.passed = 0
+        self.dropped = 0
+
+    def isLeader(self, pulseLength):
+        for leaderMin, leaderMax in self.leaders:
+            if pulseLength > leaderMin and pulseLength < leaderMax:
+                return True
+        return False
+
+    def put(self, queue, edgeTime):
+        lastEdgeTime = self.lastEdgeTime
+        if lastEdgeTime is not None and edgeTime - lastEdgeTime < self.minPulseSeconds:
+            self.dropped += 1
+            return
+
+        self.lastEdgeTime = edgeTime
+        if self.inFrame:
+            if self.maxPulseSeconds is None or lastEdgeTime is None or edgeTime - lastEdgeTime <= self.maxPulseSeconds:
+                queue.put(edgeTime)
+                self.passed += 1
+                return
+
+            # Frame has finished, this edge may start the next one
+            self.inFrame = False
+            self.candidateTime = edgeTime
+            return
+
+        if self.candidateTime is not None and self.isLeader(edgeTime - self.candidateTime):
+            queue.put(self.candidateTime)
+            queue.put(edgeTime)
+            self.passed += 2
+            self.inFrame = True
+        elif self.candidateTime is not None:
+            self.dropped += 1
+
+        self.candidateTime = edgeTime
@@ -0,0 +1,142 @@
+#
+#   Socket server streaming decoded events
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Every decoded NEC command or DHT22 measurement is sent to all the
+#   connected clients as one line of JSON:
+#   {"seq":1,"event":{"hex":"0x2d58",...}}
+#
+#   Every client has its own bounded buffer. When a client does not
+#   read fast enough the oldest lines are dropped for this client only,
+#   the decoder never waits for it. A client that disconnects is removed
+#   at once, not on the next write, and stop ends every client handler.
+#
+#   Usage:
+#   IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder())
+#   asyncio.run(EventServer.EventServer(IReader, port=8765).serveForever())
+#
+#   nc localhost 8765
+#
+
+import asyncio
+import json
+from queue import Empty
+from threading import Thread, Event
+from Results import toJSON
+
+
+class EventServer:
+
+    CLIENT_BUFFER_SIZE = 64
+    POLL_INTERVAL = 0.5
+
+    # Clients only read, what they send is discarded
+    READ_SIZE = 1024
+
+    def __init__(self, signalDecoder=None, host='127.0.0.1', port=0, path=None):
+        self.signalDecoder = signalDecoder
+        self.host = host
+        self.port = port
+        self.path = path
+        self.server = None
+        self.loop = None
+        self.worker = None
+        self.stopped = Event()
+        self.clients = {}
+        self.handlers = set()
+        self.sequence = 0
+        self.dropped = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handleClient, path=self.path)
+        else:
+            self.server = await asyncio.start_server(self.handleClient, self.host, self.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+
+        if self.signalDecoder is not None:
+            self.stopped.clear()
+            self.worker = Thread(target=self.readCommands)
+            self.worker.daemon = True
+            self.worker.start()
+
+    async def serveForever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        # Handlers waiting for the next line are cancelled, they close their clients
+        self.server.close()
+        handlers = list(self.handlers)
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+        # Reader of the decoder notices the stop within POLL_INTERVAL
+        if self.worker is not None:
+            self.stopped.set()
+            await self.loop.run_in_executor(None, self.worker.join)
+            self.worker = None
+
+    def readCommands(self):
+        while not self.stopped.is_set():
+            try:
+                command = self.signalDecoder.getCommand(True, self.POLL_INTERVAL)
+            except Empty:
+                continue
+            self.publish(command)
+
+    def publish(self, event):
+        # Thread safe, may be called from decoder thread
+        self.loop.call_soon_threadsafe(self.broadcast, event)
+
+    def broadcast(self, event):
+        self.sequence += 1
+        line = (json.dumps({"seq": self.sequence, "event": event}, separators=(',', ':'), default=toJSON) + "\n").encode()
+
+        for buffer in self.clients.values():
+            if buffer.full():
+                buffer.get_nowait()
+                self.dropped += 1
+            buffer.put_nowait(line)
+
+    async def watchClient(self, reader):
+        # Ends when the client disconnects, without waiting for a write to fail
+        try:
+            while not reader.at_eof():
+                await reader.read(self.READ_SIZE)
+        except ConnectionError:
+            pass
+
+    async def handleClient(self, reader, writer):
+        buffer = asyncio.Queue(self.CLIENT_BUFFER_SIZE)
+        self.clients[writer] = buffer
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        disconnected = asyncio.ensure_future(self.watchClient(reader))
+        line = None
+
+        try:
+            while not disconnected.done():
+                line = asyncio.ensure_future(buffer.get())
+                await asyncio.wait((line, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if not line.done():
+                    break
+                writer.write(line.result())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            for task in (line, disconnected):
+                if task is not None:
+                    task.cancel()
+            del self.clients[writer]
+            self.handlers.discard(handler)
+            writer.close()
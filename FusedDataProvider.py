@@ -0,0 +1,235 @@
+#
+#   Edges of several receivers fused into one stream
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Receivers on separate pins see the same key press at (almost) the
+#   same time. Their edges are collected frame by frame, until the line
+#   is idle on all of them. Edges of a receiver which is never idle
+#   (sunlight, a bad pin) are dropped when they span more than the
+#   longest frame of the protocol, and the receiver is ignored until it
+#   is idle again, so it holds back neither the others nor memory. The
+#   receiver with most pulses in timing is the base of the frame; its
+#   pulses out of timing are replaced by the edges of another receiver
+#   which has correct pulses at the same time. One decoder gets the
+#   fused frame, so every key press is decoded once and recovery runs
+#   only when no receiver saw it clean.
+#
+#   Usage:
+#   provider = FusedDataProvider.FusedDataProvider([
+#       GPIODataProvider.EdgeDetected(GPIO.BCM, 18),
+#       GPIODataProvider.EdgeDetected(GPIO.BCM, 23),
+#       ])
+#   IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder())
+#
+
+from bisect import bisect_left
+from threading import Lock, Thread
+from SignalDecoder import SignalDataProvider
+import PulseProtocol
+import Log
+
+log = Log.getLogger("FusedDataProvider")
+
+
+class StreamQueue:
+    # Queue given to one receiver, its edges go to the fusion
+
+    def __init__(self, fusion, stream):
+        self.fusion = fusion
+        self.stream = stream
+
+    def put(self, edgeTime, block=True, timeout=None):
+        self.fusion.putEdge(self.stream, edgeTime)
+
+
+class FusedDataProvider(SignalDataProvider):
+
+    # The same edge seen by two receivers, after their delays are aligned
+    MATCH_SECONDS = 0.0003
+
+    # Line idle on all the receivers ends a frame; longer than any pulse
+    # of the frame, shorter than the break before NEC repeat code
+    FRAME_GAP_SECONDS = 0.02
+
+    POLL_SECONDS = 0.005
+
+    isStopped = False
+
+    def __init__(self, providers, spec="NEC", clock=None):
+        self.providers = list(providers)
+
+        # Pulses in timing of this PulseProtocol spec are correct
+        self.protocol = PulseProtocol.getCompiled(spec)
+
+        # Leader and all the bits of the longest frame
+        self.maxFrameSeconds = self.protocol.leaderMax + self.protocol.frameLength
+
+        self.lock = Lock()
+        self.streams = [[] for provider in self.providers]
+        self.lastEdgeTimes = [None for provider in self.providers]
+
+        # Receivers not idle since their edges were dropped
+        self.noisy = set()
+
+        self.frames = 0
+        self.repairs = 0
+        self.dropped = 0
+
+        if clock is not None:
+            self.setClock(clock)
+
+    def setClock(self, clock):
+        self.clock = clock
+        for provider in self.providers:
+            if hasattr(provider, "setClock"):
+                provider.setClock(clock)
+
+    def InitDataQueue(self, queue):
+        self.Queue = queue
+        for stream in range(0, len(self.providers)):
+            self.providers[stream].InitDataQueue(StreamQueue(self, stream))
+        self.Start()
+        pass
+
+    def Start(self):
+        self.isStopped = False
+        self.worker = Thread(target=self.fuseFrames)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def Stop(self):
+        self.isStopped = True
+        for provider in self.providers:
+            if hasattr(provider, "Stop"):
+                provider.Stop()
+
+    def putEdge(self, stream, edgeTime):
+        with self.lock:
+            self.streams[stream].append(edgeTime)
+            lastEdgeTime = self.lastEdgeTimes[stream]
+            if lastEdgeTime is None or edgeTime > lastEdgeTime:
+                self.lastEdgeTimes[stream] = edgeTime
+
+    def fuseFrames(self):
+        while not self.isStopped:
+            self.clock.sleep(self.POLL_SECONDS)
+            self.flush(self.clock.now())
+
+    def flush(self, now):
+        # Fuses the frame when every receiver has been idle long enough,
+        # noisy receivers are not waited for and not fused
+        dropped = []
+        with self.lock:
+            for stream, edges in enumerate(self.streams):
+                if len(edges) > 0 and self.lastEdgeTimes[stream] - edges[0] > self.maxFrameSeconds:
+                    self.streams[stream] = []
+                    self.noisy.add(stream)
+                    dropped.append(stream)
+
+            busy = set(stream for stream, lastEdgeTime in enumerate(self.lastEdgeTimes)
+                       if lastEdgeTime is not None and now - lastEdgeTime <= self.FRAME_GAP_SECONDS)
+            self.noisy &= busy
+
+            streams = [[] if stream in self.noisy else edges for stream, edges in enumerate(self.streams)]
+            ready = len(busy - self.noisy) == 0 and any(len(edges) > 0 for edges in streams)
+            if ready:
+                self.streams = [[] for provider in self.providers]
+                self.lastEdgeTimes = [lastEdgeTime if stream in self.noisy else None for stream, lastEdgeTime in enumerate(self.lastEdgeTimes)]
+
+        if len(dropped) > 0:
+            self.dropped += len(dropped)
+            log.warning("Receivers %s not idle for %f seconds, their edges are dropped", dropped, self.maxFrameSeconds)
+
+        if ready:
+            for edgeTime in self.fuse([sorted(edges) for edges in streams]):
+                self.Queue.put(edgeTime)
+
+    def isCorrect(self, pulseLength):
+        protocol = self.protocol
+        return protocol.getBit(pulseLength) is not None or (pulseLength > protocol.leaderMin and pulseLength < protocol.leaderMax)
+
+    def getScore(self, edges):
+        score = 0
+        for i in range(1, len(edges)):
+            score += 1 if self.isCorrect(edges[i] - edges[i - 1]) else -1
+        return score
+
+    def getOffset(self, base, edges):
+        # Delay of the receiver to the base one: median of matched edges
+        differences = []
+        for edgeTime in edges:
+            i = bisect_left(base, edgeTime)
+            nearest = [base[j] - edgeTime for j in (i - 1, i) if 0 <= j < len(base)]
+            if len(nearest) > 0:
+                difference = min(nearest, key=abs)
+                if abs(difference) < self.MATCH_SECONDS:
+                    differences.append(difference)
+
+        if len(differences) == 0:
+            return 0
+        differences.sort()
+        return differences[len(differences) // 2]
+
+    def findEdge(self, edges, edgeTime):
+        i = bisect_left(edges, edgeTime - self.MATCH_SECONDS)
+        if i < len(edges) and abs(edges[i] - edgeTime) < self.MATCH_SECONDS:
+            return i
+        return None
+
+    def getReplacement(self, edges, startTime, endTime):
+        # Inner edges of a span where all the pulses are correct
+        first = self.findEdge(edges, startTime)
+        last = self.findEdge(edges, endTime)
+        if first is None or last is None or last <= first:
+            return None
+
+        for i in range(first + 1, last + 1):
+            if not self.isCorrect(edges[i] - edges[i - 1]):
+                return None
+        return edges[first + 1:last]
+
+    def fuse(self, streams):
+        # One frame of every receiver -> edges of the fused frame. Receivers
+        # without pulses are skipped, ties are broken by the number of pulses
+        candidates = [stream for stream in range(0, len(streams)) if len(streams[stream]) > 1]
+        if len(candidates) == 0:
+            return []
+
+        self.frames += 1
+        order = sorted(candidates, key=lambda stream: (self.getScore(streams[stream]), len(streams[stream])), reverse=True)
+        base = streams[order[0]]
+        others = []
+        for stream in order[1:]:
+            offset = self.getOffset(base, streams[stream])
+            others.append([edgeTime + offset for edgeTime in streams[stream]])
+
+        fused = base[0:1]
+        i = 1
+        while i < len(base):
+            if self.isCorrect(base[i] - base[i - 1]):
+                fused.append(base[i])
+                i += 1
+                continue
+
+            # Span of pulses out of timing, from base[i - 1] to base[end]
+            end = i
+            while end + 1 < len(base) and not self.isCorrect(base[end + 1] - base[end]):
+                end += 1
+
+            for edges in others:
+                replacement = self.getReplacement(edges, base[i - 1], base[end])
+                if replacement is not None:
+                    log.debug("Pulses %d-%d replaced by %d pulses", i, end, len(replacement) + 1)
+                    fused.extend(replacement)
+                    self.repairs += 1
+                    break
+            else:
+                fused.extend(base[i:end])
+
+            fused.append(base[end])
+            i = end + 1
+
+        return fused
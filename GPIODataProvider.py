@@ -10,18 +10,49 @@ from timeit import default_timer
 from queue import Queue
 from queue import Empty
 from queue import Full
-from SignalDecoder import SignalDataProvider
-import RPi.GPIO as GPIO
+from SignalDecoder import SignalDataProvider, Edge
+import importlib
 import sys 
+import Log
+
+log = Log.getLogger("GPIODataProvider")
 
 
 class EdgeDetected(SignalDataProvider):
 
 	number_of_elements_to_leave = 0
 	Maximum_milliseconds_signal_length = 100
+
+	# Optional Log.PulseTrace of the last edges, for post-mortem
+	trace = None
+
+	# Optional EdgeFilter, glitches and noise between frames are not queued
+	filter = None
+
+	# Both edges mode: falling edges are queued as SignalDecoder.Edge with
+	# the time of the rising edge before them, so decoders know mark and space
+	bothEdges = False
+	riseTime = None
+
+	# Level after the last edge in both edges mode. The pin is read only at
+	# start: after a short mark it is high again before the callback of the
+	# falling edge runs. An edge is rising only when it ends a mark of known
+	# length, so a missed rising edge does not invert the following ones
+	isHigh = True
+	lastEdgeTime = None
+
+	# NEC bit mark and leader mark, with the tolerance of NEC bits
+	MARK_SECONDS = (0.0005625, 0.009)
+	MARK_TOLERANCE = 0.000275625
  
  
-	def __init__(self, GPIO_Mode=None, GPIO_PIN=None, Maximum_milliseconds_signal_length = 100):
+	def __init__(self, GPIO_Mode=None, GPIO_PIN=None, Maximum_milliseconds_signal_length = 100, GPIO_Backend=None, Edge_Filter=None, Both_Edges=False, Mark_Seconds=None):
+
+		# RPi.GPIO is imported only when the provider is created,
+		# decoders can be used on any host without it
+		if GPIO_Backend is None:
+			GPIO_Backend = importlib.import_module("RPi.GPIO")
+		self.GPIO = GPIO_Backend
 
 		if not GPIO_Mode is None:
 			self.GPIO_Mode = GPIO_Mode
@@ -30,33 +61,69 @@ class EdgeDetected(SignalDataProvider):
 			self.GPIO_PIN = GPIO_PIN
 
 		self.Maximum_milliseconds_signal_length = Maximum_milliseconds_signal_length
+		self.filter = Edge_Filter
+		self.bothEdges = Both_Edges
+		if Mark_Seconds is not None:
+			self.MARK_SECONDS = tuple(Mark_Seconds)
 			
-		GPIO.setmode(self.GPIO_Mode)
-		GPIO.setup(self.GPIO_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP) 
+		self.GPIO.setmode(self.GPIO_Mode)
+		self.GPIO.setup(self.GPIO_PIN, self.GPIO.IN, pull_up_down=self.GPIO.PUD_UP) 
 		pass
 
 
 	def Stop(self):
 		try:
-			GPIO.remove_event_detect(self.GPIO_PIN)
+			self.GPIO.remove_event_detect(self.GPIO_PIN)
 		except Exception as e:
-			print(e)
-			print("Can't remove the event detection from PIN {0}".format(self.GPIO_PIN))
+			log.warning("Can't remove the event detection from PIN %d: %s", self.GPIO_PIN, e)
 		pass
 
 	def Start(self):
 		self.Stop()
+		self.isHigh = self.GPIO.input(self.GPIO_PIN) == self.GPIO.HIGH
+		self.lastEdgeTime = None
 		try:
-			GPIO.add_event_detect(self.GPIO_PIN, GPIO.FALLING, callback=self.SignalEdgeDetected)
+			edge = self.GPIO.BOTH if self.bothEdges else self.GPIO.FALLING
+			self.GPIO.add_event_detect(self.GPIO_PIN, edge, callback=self.SignalEdgeDetected)
 		except Exception as e:
-			print(e)
-			print("Exception occured when setting pin {0}. Ignoring".format(self.GPIO_PIN))
+			log.warning("Exception occured when setting pin %d. Ignoring: %s", self.GPIO_PIN, e)
 		pass
     
+	def isMark(self, elapsed):
+		if elapsed is None or elapsed > self.Maximum_milliseconds_signal_length / 1000:
+			return False
+		for mark in self.MARK_SECONDS:
+			if abs(elapsed - mark) < max(self.MARK_TOLERANCE, mark / 4):
+				return True
+		return False
+
 	def SignalEdgeDetected(self, PinNumber):
 		try:
 			
-			self.Queue.put(default_timer())
+			edgeTime = self.clock.now()
+			if self.bothEdges:
+				elapsed = None if self.lastEdgeTime is None else edgeTime - self.lastEdgeTime
+				self.lastEdgeTime = edgeTime
+
+				if not self.isHigh and self.isMark(elapsed):
+					self.isHigh = True
+					self.riseTime = edgeTime
+					return
+
+				# Pulled up line is high between frames. After a low level
+				# of no mark length the rising edge was missed, space is unknown
+				if not self.isHigh:
+					self.riseTime = None
+				self.isHigh = False
+				edgeTime = Edge(edgeTime, self.riseTime)
+
+			if self.filter is None:
+				self.Queue.put(edgeTime)
+			else:
+				self.filter.put(self.Queue, edgeTime)
+
+			if self.trace is not None:
+				self.trace.append(edgeTime)
    
 			"""
 					Unfortunately too slow solution using GPIO
@@ -96,7 +163,7 @@ class EdgeDetected(SignalDataProvider):
 
 			"""
 		except Full:
-			print("Full")
+			log.warning("Queue full on PIN %d, clearing", self.GPIO_PIN)
 			with self.Queue.mutex:
 				while self.Queue.qsize() > self.number_of_elements_to_leave:
 					try:
@@ -113,4 +180,5 @@ class EdgeDetected(SignalDataProvider):
 		pass
 
 	def __del__(self):
-		GPIO.cleanup(self.GPIO_PIN)
+		if hasattr(self, "GPIO"):
+			self.GPIO.cleanup(self.GPIO_PIN)
@@ -0,0 +1,77 @@
+#
+#   Logging of decoders and data providers
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   All loggers are children of "SignalDecoder" and nothing is printed
+#   unless enabled. Messages are formatted only when they are emitted;
+#   per pulse messages are checked by the decoders' DEBUG flag, which
+#   is set when debug is enabled, so they cost nothing otherwise.
+#   DEBUG=True of one SignalDecoder enables debug of its own decoder
+#   only, through a child of the decoder's logger (e.g. "SignalDecoder.NEC.1").
+#
+#   Usage:
+#   import logging
+#   logging.basicConfig()
+#   logging.getLogger("SignalDecoder").setLevel(logging.DEBUG)
+#
+#   Post-mortem of raw edges:
+#   provider.trace = Log.PulseTrace(4096)
+#   provider.trace.save("last-edges.txt")
+#
+
+import logging
+from collections import deque
+from itertools import count
+
+ROOT_NAME = "SignalDecoder"
+
+# Numbers of the child loggers of decoders with debug enabled
+debugNumbers = count(1)
+
+
+def getLogger(name):
+    return logging.getLogger(ROOT_NAME + "." + name)
+
+
+def isDebugEnabled(logger):
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+def enableDebug(logger):
+    # DEBUG=True of SignalDecoder prints debug messages as before, for
+    # one decoder: other decoders sharing the logger stay silent. Loggers
+    # are never freed, a decoder initialized again keeps its child
+    if getattr(logger, "isDebugChild", False):
+        return logger
+
+    child = logger.getChild(str(next(debugNumbers)))
+    child.isDebugChild = True
+    child.setLevel(logging.DEBUG)
+    if not child.hasHandlers():
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(name)s %(levelname)s %(message)s"))
+        child.addHandler(handler)
+    return child
+
+
+class PulseTrace:
+    # Last edge times, kept in a ring buffer
+
+    def __init__(self, size=4096):
+        self.edges = deque(maxlen=size)
+        self.append = self.edges.append
+
+    def getEdges(self):
+        return list(self.edges)
+
+    def getPulses(self):
+        edges = self.getEdges()
+        return [edges[i] - edges[i - 1] for i in range(1, len(edges))]
+
+    def save(self, filename, name="Pulse trace"):
+        # Saved in Tests/*.txt format, can be replayed with SignalTool
+        from Timeline import writeTimelineFile
+        writeTimelineFile(filename, self.getEdges(), name)
@@ -0,0 +1,277 @@
+#
+#   DHT22 measurements stored on disk
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Every level is a separate append-only file of fixed-size records,
+#   sorted by time, so a range of time is found by binary search:
+#
+#   raw.dat - every measurement
+#   1m.dat  - 1 minute rollups
+#   1h.dat  - 1 hour rollups
+#
+#   Record: time (s), sensor, count, min / avg / max temperature and
+#   average humidity (both in 0.1 units) - 16 bytes. A record torn by
+#   a power cut is dropped when the store is opened. A sample of a period
+#   already written (after a restart, or late) is merged into its record;
+#   samples older than that are rejected.
+#
+#   Usage:
+#   store = MeasureStore.MeasureStore("/home/pi/measures")
+#   store.append(sensor=1, temperature=27.2, humidity=49.8)
+#   for record in store.query(sensor=1, start=time() - 86400, level="1h"):
+#       print(record.Time, record.Temperature, record.Humidity)
+#
+
+import os
+import struct
+from time import time
+import Log
+
+log = Log.getLogger("MeasureStore")
+
+
+RECORD = struct.Struct('<IHHhhhH')
+
+# Level name, seconds in one record
+LEVELS = [("raw", 0), ("1m", 60), ("1h", 3600)]
+
+# Rollups of several sensors are written when they are finished,
+# so records may be out of order by this many seconds
+ORDER_TOLERANCE = {"raw": 60, "1m": 120, "1h": 7200}
+
+
+class MeasureRecord:
+    __slots__ = ("Time", "Sensor", "Count", "MinTemperature", "Temperature", "MaxTemperature", "Humidity")
+
+    def __init__(self, time, sensor, count, minTemperature, temperature, maxTemperature, humidity):
+        self.Time = time
+        self.Sensor = sensor
+        self.Count = count
+        self.MinTemperature = minTemperature
+        self.Temperature = temperature
+        self.MaxTemperature = maxTemperature
+        self.Humidity = humidity
+
+    @classmethod
+    def unpack(cls, values):
+        time, sensor, count, minTemperature, temperature, maxTemperature, humidity = values
+        return cls(time, sensor, count, minTemperature / 10, temperature / 10, maxTemperature / 10, humidity / 10)
+
+
+class Rollup:
+    # Measurements of one sensor in one period of time, not written yet
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.count = 0
+        self.minTemperature = 32767
+        self.maxTemperature = -32768
+        self.temperatureSum = 0
+        self.humiditySum = 0
+
+    def add(self, count, minTemperature, temperature, maxTemperature, humidity):
+        self.count += count
+        self.minTemperature = min(self.minTemperature, minTemperature)
+        self.maxTemperature = max(self.maxTemperature, maxTemperature)
+        self.temperatureSum += temperature * count
+        self.humiditySum += humidity * count
+
+    def pack(self, seconds, sensor):
+        return RECORD.pack(self.bucket * seconds, sensor, self.count, self.minTemperature,
+                           round(self.temperatureSum / self.count), self.maxTemperature,
+                           round(self.humiditySum / self.count))
+
+
+class MeasureStore:
+
+    def __init__(self, directory, storeRaw=True):
+        self.directory = directory
+        self.storeRaw = storeRaw
+        os.makedirs(directory, exist_ok=True)
+
+        self.files = {}
+        self.counts = {}
+
+        # Files positioned at their end: appends are not flushed by seeking
+        self.appending = set()
+        for name, seconds in LEVELS:
+            self.openLevel(name)
+
+        # Not finished rollups: (level index, sensor) -> Rollup
+        self.rollups = {}
+
+        # Last written rollups: (level index, sensor) -> (bucket, record number)
+        self.written = {}
+        for levelIndex in range(1, len(LEVELS)):
+            self.loadWritten(levelIndex)
+
+    def getFilename(self, level):
+        return os.path.join(self.directory, level + ".dat")
+
+    def openLevel(self, name):
+        filename = self.getFilename(name)
+        open(filename, "ab").close()
+        file = open(filename, "r+b")
+
+        # Appends after a torn record would not be aligned
+        size = os.path.getsize(filename)
+        if size % RECORD.size != 0:
+            log.warning("Torn record of %d bytes removed from %s", size % RECORD.size, filename)
+            file.truncate(size - size % RECORD.size)
+
+        self.files[name] = file
+        self.counts[name] = size // RECORD.size
+
+    def loadWritten(self, levelIndex):
+        # Last record of every sensor, among records in order tolerance from the end
+        name, seconds = LEVELS[levelIndex]
+        file = self.files[name]
+        lastTime = None
+        for index in range(self.counts[name] - 1, -1, -1):
+            self.seekRecord(name, index)
+            values = RECORD.unpack(file.read(RECORD.size))
+            if lastTime is None:
+                lastTime = values[0]
+            if values[0] < lastTime - ORDER_TOLERANCE[name]:
+                break
+            self.written.setdefault((levelIndex, values[1]), (values[0] // seconds, index))
+
+    def seekRecord(self, name, index):
+        self.appending.discard(name)
+        self.files[name].seek(index * RECORD.size)
+
+    def writeRecord(self, name, data, index=None):
+        # Appended, or written over the record number index
+        if index is not None:
+            self.seekRecord(name, index)
+        else:
+            if name not in self.appending:
+                self.files[name].seek(0, os.SEEK_END)
+                self.appending.add(name)
+            self.counts[name] += 1
+        self.files[name].write(data)
+
+    def append(self, sensor, temperature, humidity, timestamp=None):
+        # False when the sample is older than the rollups can take
+        timestamp = int(time() if timestamp is None else timestamp)
+        temperature = round(temperature * 10)
+        humidity = round(humidity * 10)
+
+        if self.isLate(1, sensor, timestamp // LEVELS[1][1]):
+            log.warning("Sample of sensor %d at %d is too late, rejected", sensor, timestamp)
+            return False
+
+        if self.storeRaw:
+            self.writeRecord("raw", RECORD.pack(timestamp, sensor, 1, temperature, temperature, temperature, humidity))
+
+        self.addToRollup(1, sensor, timestamp, 1, temperature, temperature, temperature, humidity)
+        return True
+
+    def isLate(self, levelIndex, sensor, bucket):
+        # Bucket before the open rollup and not the last written one
+        rollup = self.rollups.get((levelIndex, sensor))
+        written = self.written.get((levelIndex, sensor))
+        if written is not None and bucket == written[0]:
+            return False
+        if rollup is not None:
+            return bucket < rollup.bucket
+        return written is not None and bucket < written[0]
+
+    def addToRollup(self, levelIndex, sensor, timestamp, count, minTemperature, temperature, maxTemperature, humidity):
+        if levelIndex >= len(LEVELS):
+            return
+
+        name, seconds = LEVELS[levelIndex]
+        bucket = timestamp // seconds
+        rollup = self.rollups.get((levelIndex, sensor))
+
+        if self.isLate(levelIndex, sensor, bucket):
+            log.warning("Rollup %s of sensor %d at %d is too late, rejected", name, sensor, timestamp)
+            return
+
+        if rollup is not None and bucket < rollup.bucket:
+            # Late sample of the last written period goes to its record
+            late = Rollup(bucket)
+            late.add(count, minTemperature, temperature, maxTemperature, humidity)
+            self.writeRollup(levelIndex, sensor, late)
+            return
+
+        if rollup is not None and rollup.bucket != bucket:
+            self.writeRollup(levelIndex, sensor, rollup)
+            rollup = None
+
+        if rollup is None:
+            rollup = Rollup(bucket)
+            self.rollups[(levelIndex, sensor)] = rollup
+
+        rollup.add(count, minTemperature, temperature, maxTemperature, humidity)
+
+    def writeRollup(self, levelIndex, sensor, rollup):
+        name, seconds = LEVELS[levelIndex]
+        written = self.written.get((levelIndex, sensor))
+
+        if written is not None and written[0] == rollup.bucket:
+            # One record of the period, with the measurements written before
+            self.seekRecord(name, written[1])
+            merged = Rollup(rollup.bucket)
+            merged.add(*RECORD.unpack(self.files[name].read(RECORD.size))[2:])
+            merged.add(rollup.count, rollup.minTemperature, rollup.temperatureSum / rollup.count,
+                       rollup.maxTemperature, rollup.humiditySum / rollup.count)
+            self.writeRecord(name, merged.pack(seconds, sensor), written[1])
+        else:
+            self.written[(levelIndex, sensor)] = (rollup.bucket, self.counts[name])
+            self.writeRecord(name, rollup.pack(seconds, sensor))
+
+        # Finished rollup is a part of the next level, only its new measurements
+        self.addToRollup(levelIndex + 1, sensor, rollup.bucket * seconds, rollup.count, rollup.minTemperature,
+                         rollup.temperatureSum / rollup.count, rollup.maxTemperature, rollup.humiditySum / rollup.count)
+
+    def flush(self):
+        for file in self.files.values():
+            file.flush()
+
+    def close(self):
+        # Unfinished rollups are written, from the lowest level
+        for levelIndex in range(1, len(LEVELS)):
+            for key in [key for key in self.rollups if key[0] == levelIndex]:
+                self.writeRollup(levelIndex, key[1], self.rollups.pop(key))
+
+        for file in self.files.values():
+            file.close()
+
+    def findFirst(self, file, count, timestamp):
+        # Binary search of the first record not older than timestamp
+        low = 0
+        high = count
+        while low < high:
+            middle = (low + high) // 2
+            file.seek(middle * RECORD.size)
+            if struct.unpack('<I', file.read(4))[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, sensor=None, start=0, end=None, level="1m", chunkRecords=1024):
+        file = self.files[level]
+        file.flush()
+        self.appending.discard(level)
+        count = self.counts[level]
+        tolerance = ORDER_TOLERANCE[level]
+        index = self.findFirst(file, count, start - tolerance)
+
+        while index < count:
+            file.seek(index * RECORD.size)
+            block = file.read(min(chunkRecords, count - index) * RECORD.size)
+            index += len(block) // RECORD.size
+
+            for values in RECORD.iter_unpack(block):
+                if end is not None and values[0] >= end:
+                    if values[0] >= end + tolerance:
+                        return
+                    continue
+                if values[0] >= start and (sensor is None or values[1] == sensor):
+                    yield MeasureRecord.unpack(values)
@@ -0,0 +1,206 @@
+#
+#   Memory used by decoding, frame by frame
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   tracemalloc snapshots are taken when a frame is decoded. Blocks
+#   allocated since the previous frame and still alive are counted by
+#   the stage of the innermost decoder function which allocated them:
+#   burst (edges queued and read), classification (pulses to bits),
+#   recovery (search for errors) and result (results and averages).
+#   Blocks freed during the frame are seen only in its peak. Tracing
+#   slows decoding down several times, use it to compare changes only.
+#
+#   Usage:
+#   IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder(), profile=True)
+#   print(IReader.getProfile())
+#
+#   python -m SignalTool stats --decoder nec --profile Tests/test-001.txt
+#
+
+import importlib
+import inspect
+import tracemalloc
+from collections import deque
+
+# Stage -> "module", "module:Class" or "module:Class.method"
+STAGES = {
+    "burst": [
+        "NEC:NECDecoder.getCommand", "NEC:NECDecoder.waitForSignal", "NEC:NECDecoder.getBurst",
+        "NEC:NECDecoder.getFirst16bitsOr27ms",
+        "DHT22:DHT22Decoder.getCommand", "DHT22:DHT22Decoder.waitForSignal", "DHT22:DHT22Decoder.getBurst",
+        "DHT22:DHT22Decoder.alignFrame",
+        "MultiProtocolDecoder:MultiProtocolDecoder.getCommand", "MultiProtocolDecoder:MultiProtocolDecoder.addPulse",
+        "MultiProtocolDecoder:MultiProtocolDecoder.findLeader",
+        "GPIODataProvider", "EdgeFilter", "Timeline", "WavDataProvider", "FusedDataProvider",
+    ],
+    "classification": [
+        "PulseProtocol", "NEC:NECDecoder.decodePulses",
+        "DHT22:DHT22Decoder.translateSignal", "DHT22:DHT22Decoder.translateFrame", "DHT22:DHT22Decoder.validateSignal",
+        "NECClassifier:NECClassifierDecoder.splitArray", "NECClassifier:NECClassifierDecoder.classifyArray",
+    ],
+    "recovery": [
+        "NEC:NECDecoder.enhanceArray", "NEC:NECDecoder.getCombinationsForTime", "NEC:NECDecoder.scoreCombinations",
+        "NEC:NECDecoder.getBestFirstCombinations", "NEC:NECDecoder.connectSignalParts", "NEC:NECDecoder.getCorrectPattern",
+        "NEC:NECDecoder.getAllCombinations", "NEC:NECDecoder.validateCombinationSignal",
+        "NECClassifier:NECClassifierDecoder.enhanceArray", "DHT22:DHT22Decoder.correctSignal",
+    ],
+    "result": [
+        "Results", "NEC:NECDecoder.getCleanCommand", "NEC:NECDecoder.ConvertString16ToInt",
+        "DHT22:DHT22Decoder.decodePulses", "DHT22:AverageMeasure", "DHT22:Measure",
+        "MultiProtocolDecoder:MultiProtocolDecoder.decodeFrame",
+    ],
+}
+
+OTHER_STAGE = "other"
+
+
+def getLineRange(target):
+    # "module:Class.method" -> (file name, first line, last line)
+    moduleName, _, path = target.partition(":")
+    value = importlib.import_module(moduleName)
+    if not path:
+        return (inspect.getsourcefile(value), 0, float("inf"))
+
+    for name in path.split("."):
+        value = getattr(value, name)
+    lines, firstLine = inspect.getsourcelines(value)
+    return (inspect.getsourcefile(value), firstLine, firstLine + len(lines) - 1)
+
+
+class FrameProfile:
+    __slots__ = ("result", "stages", "blocks", "size", "peak")
+
+    def __init__(self, result, stages, blocks, size, peak):
+        # Type of the result, stage -> [blocks, bytes], totals and peak bytes
+        self.result = result
+        self.stages = stages
+        self.blocks = blocks
+        self.size = size
+        self.peak = peak
+
+
+class MemoryProfiler:
+
+    # Tracebacks deep enough to reach decoder functions from queue and list internals
+    TRACEBACK_FRAMES = 25
+
+    # Profiles of the last frames kept for the report
+    MAX_FRAMES = 1000
+
+    def __init__(self, stages=None):
+        self.stages = stages if stages is not None else STAGES
+        self.ranges = None
+        self.lineStages = {}
+        self.frames = deque(maxlen=self.MAX_FRAMES)
+        self.frameCount = 0
+        self.peak = 0
+        self.snapshot = None
+        self.startSize = 0
+        self.startedTracing = False
+
+    def buildRanges(self):
+        # File name -> [(first line, last line, stage)], shortest ranges first
+        self.ranges = {}
+        for stage, targets in self.stages.items():
+            for target in targets:
+                filename, firstLine, lastLine = getLineRange(target)
+                self.ranges.setdefault(filename, []).append((firstLine, lastLine, stage))
+
+        for ranges in self.ranges.values():
+            ranges.sort(key=lambda element: element[1] - element[0])
+
+    def getLineStage(self, filename, lineno):
+        key = (filename, lineno)
+        if key not in self.lineStages:
+            self.lineStages[key] = None
+            for firstLine, lastLine, stage in self.ranges.get(filename, ()):
+                if firstLine <= lineno <= lastLine:
+                    self.lineStages[key] = stage
+                    break
+        return self.lineStages[key]
+
+    def getStage(self, traceback):
+        # Innermost frame in a function of a stage
+        for frame in reversed(traceback):
+            stage = self.getLineStage(frame.filename, frame.lineno)
+            if stage is not None:
+                return stage
+        return OTHER_STAGE
+
+    def start(self):
+        if self.ranges is None:
+            self.buildRanges()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.TRACEBACK_FRAMES)
+            self.startedTracing = True
+        self.snapshot = self.takeSnapshot()
+        self.resetPeak()
+
+    def stop(self):
+        if self.startedTracing:
+            tracemalloc.stop()
+            self.startedTracing = False
+        self.snapshot = None
+
+    def takeSnapshot(self):
+        # Without blocks of earlier snapshots and their filters
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True),
+            tracemalloc.Filter(False, __file__, all_frames=True),
+        ))
+
+    def resetPeak(self):
+        # Memory traced when the frame starts, with the snapshot kept for it
+        tracemalloc.reset_peak()
+        self.startSize = tracemalloc.get_traced_memory()[0]
+
+    def frameFinished(self, result):
+        # Called by the decoder thread only, as start and stop
+        if self.snapshot is None or not tracemalloc.is_tracing():
+            return None
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self.takeSnapshot()
+
+        stages = {}
+        blocks = 0
+        size = 0
+        for difference in snapshot.compare_to(self.snapshot, "traceback"):
+            if difference.count_diff == 0 and difference.size_diff == 0:
+                continue
+            stage = stages.setdefault(self.getStage(difference.traceback), [0, 0])
+            stage[0] += difference.count_diff
+            stage[1] += difference.size_diff
+            blocks += difference.count_diff
+            size += difference.size_diff
+
+        profile = FrameProfile(type(result).__name__, stages, blocks, size, max(0, peak - self.startSize))
+        self.frames.append(profile)
+        self.frameCount += 1
+        self.peak = max(self.peak, peak)
+
+        self.snapshot = snapshot
+        self.resetPeak()
+        return profile
+
+    def getReport(self):
+        # Average blocks and bytes per frame by stage, peaks in bytes
+        count = len(self.frames)
+        stages = {}
+        for profile in self.frames:
+            for stage, (blocks, size) in profile.stages.items():
+                total = stages.setdefault(stage, [0, 0])
+                total[0] += blocks
+                total[1] += size
+
+        return {
+            "frames": self.frameCount,
+            "stages": {stage: {"blocks": round(blocks / count, 1), "bytes": round(size / count)} for stage, (blocks, size) in sorted(stages.items())},
+            "blocks_per_frame": round(sum(profile.blocks for profile in self.frames) / count, 1) if count > 0 else 0,
+            "frame_peak_bytes": max([profile.peak for profile in self.frames] + [0]),
+            "peak_bytes": self.peak,
+            "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+        }
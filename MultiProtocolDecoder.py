@@ -0,0 +1,206 @@
+#
+#   Multi-protocol Signal Decoder
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   One edge stream (one GPIO pin) decoded as NEC, NEC repeat, Samsung
+#   or DHT22. Every pulse is read once; the leader pulse is looked up in
+#   a table built from all the protocols, and the first data pulse
+#   decides which protocol claims the frame.
+#
+#   Usage:
+#   IReader = SignalDecoder.SignalDecoder(
+#       GPIODataProvider.EdgeDetected(GPIO_Mode, GPIO_PIN),
+#       MultiProtocolDecoder.MultiProtocolDecoder()
+#       )
+#
+#   Remotes described by PulseProtocol specs need no decoder of their own:
+#   MultiProtocolDecoder.PulseDistanceDecoder("NEC", "SAMSUNG")
+#
+
+from bisect import bisect_right
+from collections import deque
+from queue import Empty
+from SignalDecoder import SignalAdapter
+import NEC
+import DHT22
+import PulseProtocol
+import Log
+from Results import NECRepeat
+
+log = Log.getLogger("MultiProtocolDecoder")
+
+
+class Protocol:
+
+    def __init__(self, name, leaderMin, leaderMax, dataMin, dataMax, pulseCount, frameLength, decode, decoder=None):
+        self.name = name
+        self.leaderMin = leaderMin
+        self.leaderMax = leaderMax
+        self.dataMin = dataMin
+        self.dataMax = dataMax
+        self.pulseCount = pulseCount
+        self.frameLength = frameLength
+        self.decode = decode
+        # Decoder behind decode, gets the clock of MultiProtocolDecoder
+        self.decoder = decoder
+
+
+def getDefaultProtocols():
+    necDecoder = NEC.NECDecoder()
+    samsungDecoder = NEC.NECDecoder()
+    dht22Decoder = DHT22.DHT22Decoder()
+    necFrameLength = necDecoder.AddressLengthSeconds + necDecoder.CommandLengthSeconds + 0.0035
+
+    # Order matters: when leaders overlap, first matching protocol claims the frame
+    return [
+        # 9ms + 2.25ms, then single 560us burst
+        Protocol("NEC_REPEAT", 0.0105, 0.012, 0, 0, 0, 0,
+                 lambda pulses, startTime: NECRepeat.create()),
+        # 4.5ms + 4.5ms, bits timed as NEC
+        Protocol("SAMSUNG", 0.008, 0.010, 0.0008, 0.003, 32, necFrameLength,
+                 lambda pulses, startTime: samsungDecoder.decodePulses(pulses), samsungDecoder),
+        # 9ms + 4.5ms
+        Protocol("NEC", 0.0035, 0.015, 0.0002, 0.0035, 32, necFrameLength,
+                 lambda pulses, startTime: necDecoder.decodePulses(pulses), necDecoder),
+        # Host start signal, then 80us + 80us response and 40 bits
+        Protocol("DHT22", 0.002, 0.008, 0.00001, 0.0002, 40, dht22Decoder.MAX_DHT22_SIGNAL_LENGTH + 0.001,
+                 lambda pulses, startTime: dht22Decoder.decodePulses(pulses, startTime), dht22Decoder),
+    ]
+
+
+def getSpecProtocol(spec):
+    # Protocol decoded by the tables of PulseProtocol spec (or its name)
+    compiled = PulseProtocol.getCompiled(spec)
+    return Protocol(compiled.name, compiled.leaderMin, compiled.leaderMax, compiled.dataMin, compiled.dataMax,
+                    compiled.bitCount, compiled.frameLength, compiled.decode)
+
+
+class MultiProtocolDecoder(SignalAdapter):
+
+    # How long to wait for the next edge before checking incomplete frames
+    IDLE_TIMEOUT = 0.01
+
+    log = log
+
+    def __init__(self, protocols=None):
+        self.protocols = protocols if protocols is not None else getDefaultProtocols()
+        self.buildLeaderTable()
+
+    def setClock(self, clock):
+        # DHT22 averages age by the same clock as the edges
+        self.clock = clock
+        for protocol in self.protocols:
+            if hasattr(protocol.decoder, "setClock"):
+                protocol.decoder.setClock(clock)
+
+    def buildLeaderTable(self):
+        # Sorted boundaries of leader lengths. Every range between two
+        # boundaries keeps the protocols whose leader covers it
+        self.boundaries = sorted(set([p.leaderMin for p in self.protocols] + [p.leaderMax for p in self.protocols]))
+        self.leaderTable = [()]
+
+        for i in range(0, len(self.boundaries)):
+            if i + 1 < len(self.boundaries):
+                middle = (self.boundaries[i] + self.boundaries[i + 1]) / 2
+                self.leaderTable.append(tuple(p for p in self.protocols if p.leaderMin < middle < p.leaderMax))
+            else:
+                self.leaderTable.append(())
+
+    def initialize(self, timeQueue, debug=False):
+        self.timeQueue = timeQueue
+        if debug:
+            self.log = Log.enableDebug(self.log)
+        self.DEBUG = debug or Log.isDebugEnabled(self.log)
+        self.lastEdgeTime = 0
+
+        # Protocols waiting for the first data pulse after leader
+        self.candidates = ()
+        self.leaderTime = 0
+
+        # Frame claimed by a protocol: shared buffer of its pulses
+        self.frameProtocol = None
+        self.frameStartTime = 0
+        self.framePulses = []
+
+        self.results = deque()
+
+    def getCommand(self):
+        while len(self.results) == 0:
+            try:
+                edgeTimeDetected = self.clock.get(self.timeQueue, self.IDLE_TIMEOUT)
+                self.timeQueue.task_done()
+            except Empty:
+                if self.frameProtocol is not None and self.clock.now() - self.frameStartTime > self.frameProtocol.frameLength:
+                    self.finishFrame()
+                continue
+
+            pulseLength = edgeTimeDetected - self.lastEdgeTime
+            self.lastEdgeTime = edgeTimeDetected
+            self.addPulse(pulseLength, edgeTimeDetected)
+
+        return self.results.popleft()
+
+    def addPulse(self, pulseLength, edgeTimeDetected):
+        if self.frameProtocol is not None:
+            if edgeTimeDetected - self.frameStartTime <= self.frameProtocol.frameLength:
+                self.framePulses.append(pulseLength)
+
+                if len(self.framePulses) >= self.frameProtocol.pulseCount:
+                    self.finishFrame()
+                return
+
+            # Frame is shorter than expected, this pulse may start the next one
+            self.finishFrame()
+
+        if len(self.candidates) > 0:
+            candidates = self.candidates
+            self.candidates = ()
+
+            for protocol in candidates:
+                if pulseLength > protocol.dataMin and pulseLength < protocol.dataMax:
+                    self.frameProtocol = protocol
+                    self.frameStartTime = self.leaderTime
+                    self.framePulses = [pulseLength]
+                    return
+
+            if self.DEBUG:
+                self.log.debug("No protocol for data pulse %f", pulseLength)
+
+        self.findLeader(pulseLength, edgeTimeDetected)
+
+    def findLeader(self, pulseLength, edgeTimeDetected):
+        protocols = self.leaderTable[bisect_right(self.boundaries, pulseLength)]
+
+        for protocol in protocols:
+            if protocol.pulseCount == 0:
+                self.decodeFrame(protocol, edgeTimeDetected, [])
+                return
+
+        self.candidates = protocols
+        self.leaderTime = edgeTimeDetected
+
+    def finishFrame(self):
+        protocol = self.frameProtocol
+        self.frameProtocol = None
+        self.decodeFrame(protocol, self.frameStartTime, self.framePulses)
+
+    def decodeFrame(self, protocol, startTime, pulses):
+        if self.DEBUG:
+            self.log.debug("%s: %d pulses", protocol.name, len(pulses))
+
+        result = protocol.decode(pulses, startTime)
+        if hasattr(result, "withProtocol"):
+            result = result.withProtocol(protocol.name)
+        elif type(result) is dict:
+            result["protocol"] = protocol.name
+        self.results.append(result)
+
+
+class PulseDistanceDecoder(MultiProtocolDecoder):
+    # Protocols described only by PulseProtocol specs, e.g. PulseDistanceDecoder("NEC", "SAMSUNG")
+
+    def __init__(self, *specs):
+        super().__init__([getSpecProtocol(spec) for spec in specs])
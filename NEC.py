@@ -6,9 +6,17 @@
 #   MIT Licence
 #
 
-from time import sleep
 from queue import Queue
 from queue import Empty
+from math import exp
+from timeit import default_timer
+import heapq
+import Log
+import Clock
+import PulseProtocol
+from Results import NECCommand, NECRepeat, DecodeError
+
+log = Log.getLogger("NEC")
 
 class NECDecoder:
   AddressLengthSeconds = 0.027
@@ -25,15 +33,48 @@ class NECDecoder:
   REPEAT_BURST_LONG_LENGTH = 0.097
   REPEAT_BURST_ERROR_RANGE = 0.01
   
+  # Measured wrong period is compared with the length of candidate bits.
+  # Candidates are tested from the most likely one
+  PATTERN_LENGTH_DEVIATION = 0.00055125
+  
+  # Second valid candidate is searched only when it is at most this much
+  # less likely (log), below AMBIGUOUS_CONFIDENCE the result is ambiguous
+  AMBIGUITY_LOG_MARGIN = 3
+  AMBIGUOUS_CONFIDENCE = 0.75
+  
+  # Recovery budget for a frame (both address and command). When it is
+  # exceeded the best partial pattern is returned. It limits CPU time,
+  # so it is measured in real time with any clock
+  RECOVERY_MAX_ATTEMPTS = 512
+  RECOVERY_MAX_SECONDS = 0.005
+  
+  confidence = 1.0
+  validationAttempts = 0
+  recoveryAttemptsLeft = None
+  recoveryDeadline = None
+  budgetExhausted = False
+  validationFailed = False
+  budgetExhaustedCount = 0
+  
   breakTime = 0
   ir_pulseStart = 0
   timeFromNextPhase = 0
   
+  # Clean frames are read from the tables of the spec, without recovery
+  SPEC = PulseProtocol.getCompiled("NEC")
+  
   DEBUG = False
+  clock = Clock.realClock
+  log = log
+  
+  def setClock(self, clock):
+      self.clock = clock
   
   def initialize(self, timeQueue, DebugMode = False):
       self.IRTimeQueue = timeQueue
-      self.DEBUG = DebugMode
+      if DebugMode:
+          self.log = Log.enableDebug(self.log)
+      self.DEBUG = DebugMode or Log.isDebugEnabled(self.log)
       pass
       
   def getBurst(self, pulseCount, burstStartTime, maxTime):
@@ -56,14 +97,12 @@ class NECDecoder:
               #edgeTimeDetected = maxTime
               #signalTime = maxTime - previousPulseStart
               
-              #if self.DEBUG:
-              print("Empty: {0}".format(len(resultArray)))
+              self.log.debug("Empty: %d", len(resultArray))
               
               if (maxTime - previousPulseStart < self.REPEAT_BURST_ERROR_RANGE):
                   break
               
-              print (resultArray)
-              print("Left: {0}".format(maxTime - previousPulseStart))
+              self.log.debug("Left: %f of %s", maxTime - previousPulseStart, resultArray)
               edgeTimeDetected = self.IRTimeQueue.get()
               self.IRTimeQueue.task_done()
               signalTime = edgeTimeDetected - previousPulseStart
@@ -71,7 +110,7 @@ class NECDecoder:
           resultArray.append(signalTime)
           previousPulseStart = edgeTimeDetected
           if self.DEBUG:
-              print ("{0} {1}".format(i, signalTime))
+              self.log.debug("%d %f", i, signalTime)
       
       self.timeFromNextPhase = edgeTimeDetected - maxTime
       #print ("{0} {1}".format(i, self.timeFromNextPhase))
@@ -104,7 +143,7 @@ class NECDecoder:
       self.timeFromNextPhase = 0
       
       if self.DEBUG:
-          print("Break: {0}".format(self.breakTime))
+          self.log.debug("Break: %f", self.breakTime)
       
       if self.breakTime > self.REPEAT_BURST_SHORT_LENGTH - self.REPEAT_BURST_ERROR_RANGE and self.breakTime < self.REPEAT_BURST_SHORT_LENGTH + self.REPEAT_BURST_ERROR_RANGE:
           repeatCode = True
@@ -112,30 +151,84 @@ class NECDecoder:
           repeatCode = True
       
       if repeatCode:
-          return 'REPEAT'
+          return NECRepeat.create()
       
       new_signalStart = self.ir_pulseStart + self.AddressLengthSeconds + self.PulseErrorRange
       pulseArray = self.getBurst(32, self.ir_pulseStart, self.ir_pulseStart + self.AddressLengthSeconds + self.CommandLengthSeconds)    
       
+      return self.decodePulses(pulseArray)
+
+  def startRecoveryBudget(self):
+      self.recoveryAttemptsLeft = self.RECOVERY_MAX_ATTEMPTS
+      self.recoveryDeadline = default_timer() + self.RECOVERY_MAX_SECONDS
+      self.budgetExhausted = False
+  
+  def isRecoveryBudgetLeft(self, hasCandidate=False):
+      # Budget running out after a valid candidate only ends the search
+      # for ambiguity, the frame is not marked as exhausted
+      if self.recoveryAttemptsLeft is None:
+          return True
+      
+      self.recoveryAttemptsLeft -= 1
+      if self.recoveryAttemptsLeft < 0 or default_timer() > self.recoveryDeadline:
+          if not self.budgetExhausted and not hasCandidate:
+              self.budgetExhausted = True
+              self.budgetExhaustedCount += 1
+          return False
+      return True
+  
+  def decodePulses(self, pulseArray):
+      # Recovery reads the address from at most 27ms of pulses, a clean
+      # frame is taken only when its address fits in them too
+      frame = self.SPEC.getFrame(pulseArray)
+      if frame is None:
+          # Both edges mode: pulses out of timing are decided by their spaces
+          pulseArray = self.SPEC.resolvePulses(pulseArray)
+          frame = self.SPEC.getFrame(pulseArray)
+      if frame is not None and self.SPEC.isValid(frame) and sum(pulseArray[:15]) <= self.AddressLengthSeconds:
+          return self.getCleanCommand(frame)
+      
+      self.startRecoveryBudget()
       addressArray = self.getFirst16bitsOr27ms(pulseArray)
       binarySignalReversed = self.fillInKnownValues(addressArray)
       address = self.reverse_if_string(binarySignalReversed)
+      confidence = self.confidence
+      validationFailed = self.validationFailed
       
       commandArray = pulseArray
       binarySignalReversed = self.fillInKnownValues(commandArray)
       command = self.reverse_if_string(binarySignalReversed)
+      confidence = min(confidence, self.confidence)
+      validationFailed = validationFailed or self.validationFailed
       
       if self.DEBUG:
-          print("Address: {0}".format(address))
-          print("Command: {0}".format(command))
+          self.log.debug("Address: %s", address)
+          self.log.debug("Command: %s", command)
       
       if type(address) != str or type(command) != str:
-          return False
+          return DecodeError("Invalid address or command")
+      
+      return NECCommand.create(self.ConvertString16ToInt(address[:8] + command[-8:]),
+                            address,
+                            command,
+                            round(confidence, 3),
+                            confidence < self.AMBIGUOUS_CONFIDENCE,
+                            self.budgetExhausted,
+                            validationFailed = validationFailed)
+  
+  def getCleanCommand(self, frame):
+      # Same result as the recovery finds for 32 correct pulses
+      fields = self.SPEC.getFields(frame)
+      self.confidence = 1.0
+      self.budgetExhausted = False
+      self.validationAttempts += 2
       
-      return { "hex": self.ConvertString16ToHex(address[:8] + command[-8:]),
-               "address": address,
-               "command": command
-               }
+      if self.DEBUG:
+          self.log.debug("Clean frame: %s", hex(frame))
+      
+      return NECCommand.create((fields["address"] & 0xFF00) | (fields["command"] & 0xFF),
+                            format(fields["address"], "016b"),
+                            format(fields["command"], "016b"))
   
   def calculateSimilarity(self, string1, string2, string3):
       i = 0
@@ -175,10 +268,13 @@ class NECDecoder:
 
   
   def ConvertString16ToHex(self, binaryStringValue):
+      return hex(self.ConvertString16ToInt(binaryStringValue))
+
+  def ConvertString16ToInt(self, binaryStringValue):
       result = 0
       i = 0
       if len(binaryStringValue) != 16:
-          return hex(0)
+          return 0
       
       for character in binaryStringValue:
           i += 1
@@ -186,16 +282,16 @@ class NECDecoder:
               result |= 1 << (16 - i)
               
           if character == '_':
-              return hex(0)
+              return 0
               
-      return hex(result)
+      return result
       
   def waitForSignal(self):
       self.breakTime = 0
       while True:
           # Try to find start 
           edgeTimeDetected = self.IRTimeQueue.get()
-          #self.IRTimeQueue.task_done()
+          self.IRTimeQueue.task_done()
           
           # Let Raspberry read whole signal before
           # we use max CPU for decoding
@@ -206,20 +302,20 @@ class NECDecoder:
           if signalTime > 0.0035 and signalTime < 0.015:
               # Need to wait for the rest of the signal
               if self.IRTimeQueue.qsize() < 32:
-                  sleep(0.054)
+                  self.clock.sleep(0.054)
               else:
                   if self.DEBUG:
-                      print(self.IRTimeQueue.qsize())
+                      self.log.debug("Queue length: %d", self.IRTimeQueue.qsize())
               
               return signalTime
           else:
               self.breakTime = signalTime
               
               if self.DEBUG:
-                  print("Wrong start signal", signalTime)
+                  self.log.debug("Wrong start signal %f", signalTime)
           
           if self.IRTimeQueue.empty():
-              sleep(0.01)
+              self.clock.sleep(0.01)
           
   def enhanceArray(self, timeArray):
       newArray = []
@@ -276,38 +372,94 @@ class NECDecoder:
       if len(chunk) > 0:
           correctChunks.append(chunk)
               
-      combinationsMix = []
+      # Bits are guessed only for wrong periods, a failed check of the
+      # signal is reported as validationFailed, not as low confidence
+      self.confidence = 0.0 if timeToCorrectArray else 1.0
+      self.validationFailed = False
+      scoredMix = []
       for errorTime in timeToCorrectArray:
           
           if self.DEBUG:
-              print ("error {0}".format(errorTime))
+              self.log.debug("error %f", errorTime)
           
           possibleCombinations = self.getCombinationsForTime(errorTime)
           if not possibleCombinations:
               return False
           
-          combinationsMix.append(possibleCombinations)
+          scoredMix.append(self.scoreCombinations(errorTime, possibleCombinations))
       
       result = False
       if correctSignal == '1111111111111111':
           result = chunk
       
-      for combinationToTest in self.getAllCombinations(combinationsMix):
+      bestScore = None
+      for score, combinationToTest in self.getBestFirstCombinations(scoredMix):
+          if bestScore is not None and score < bestScore - self.AMBIGUITY_LOG_MARGIN:
+              break
+          
+          # Signal without errors is validated once, outside of the budget
+          if len(timeToCorrectArray) > 0 and not self.isRecoveryBudgetLeft(bestScore is not None):
+              self.log.info("Recovery budget exhausted")
+              break
+          
           testedSignal = self.connectSignalParts(correctSignal, correctChunks, combinationToTest)
           validated = self.validateCombinationSignal(testedSignal)
+          self.validationAttempts += 1
           
           if self.DEBUG:
-              print ("{0} result: {1}".format(testedSignal, validated))
+              self.log.debug("%s result: %s score: %f", testedSignal, validated, score)
               
           if validated:
-              result = testedSignal
-              break
+              if bestScore is None:
+                  result = testedSignal
+                  bestScore = score
+                  self.confidence = 1.0
+              else:
+                  # Another valid signal, almost as likely as the first one
+                  self.confidence = 1 / (1 + exp(score - bestScore))
+                  break
+          
+      if bestScore is None:
+          self.validationFailed = True
           
       if not result:
           result = self.getCorrectPattern(correctSignal, correctChunks)
           
       return result
   
+  @classmethod
+  def getPatternLength(cls, pattern):
+      return sum(cls.PULSE_POSITIVE_LENGTH if bit == '1' else cls.PULSE_NEGATIVE_LENGTH for bit in pattern)
+  
+  def scoreCombinations(self, errorTime, possibleCombinations):
+      # Log likelihood that the bits explain measured time, the best first
+      scored = []
+      for pattern in possibleCombinations:
+          difference = (errorTime - self.getPatternLength(pattern)) / self.PATTERN_LENGTH_DEVIATION
+          scored.append((-difference * difference / 2, pattern))
+      
+      scored.sort(key=lambda element: element[0], reverse=True)
+      return scored
+  
+  def getBestFirstCombinations(self, scoredMix):
+      # Combinations of candidates ordered by the sum of their scores.
+      # Next combinations differ from already tested one by one index
+      indexes = tuple([0] * len(scoredMix))
+      visited = set([indexes])
+      heap = [(-sum(scored[0][0] for scored in scoredMix), indexes)]
+      
+      while len(heap) > 0:
+          negativeScore, indexes = heapq.heappop(heap)
+          yield -negativeScore, [scoredMix[i][indexes[i]][1] for i in range(0, len(indexes))]
+          
+          for i in range(0, len(indexes)):
+              if indexes[i] + 1 < len(scoredMix[i]):
+                  nextIndexes = indexes[:i] + (indexes[i] + 1,) + indexes[i + 1:]
+                  if nextIndexes not in visited:
+                      visited.add(nextIndexes)
+                      score = negativeScore + scoredMix[i][indexes[i]][0] - scoredMix[i][indexes[i] + 1][0]
+                      heapq.heappush(heap, (score, nextIndexes))
+  
   def getCorrectPattern(self, correctSignal, correctChunks):
       if len(correctSignal) < 10:
           return False
@@ -334,11 +486,7 @@ class NECDecoder:
           return False
       
       if self.DEBUG:
-          correctS = self.getCorrectPattern(correctSignal, correctChunks)
-          print ("For {0} testing:".format(correctSignal))
-          
-          for combination in combinationToTest:
-              print (combination)
+          self.log.debug("For %s testing: %s", correctSignal, combinationToTest)
           
       for character in correctSignal:
           if character == '1':
@@ -374,7 +522,7 @@ class NECDecoder:
       
   def printCombination(self, combination):
       for elements in combination:
-          print(elements)
+          self.log.debug("%s", elements)
           
           #for element in elements:
           #    # print(element)
@@ -426,7 +574,7 @@ class NECDecoder:
       
       if len(signalString) != 16:
           if self.DEBUG:
-              print("Invalid length")
+              self.log.debug("Invalid length")
           return False
       
       difference = 0
@@ -436,7 +584,7 @@ class NECDecoder:
               
       if difference > 0 and difference < 8:        
           if self.DEBUG:
-              print("Invalid reflection")
+              self.log.debug("Invalid reflection")
           return False
           
       return True
@@ -0,0 +1,288 @@
+#
+#   NEC Signal Decoder with learned pulse classifier
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Wrong pulses are resolved by weights learned offline from recorded
+#   timelines, instead of testing all the combinations one by one.
+#   The classifier is a frequency table: for every cell of pulse length
+#   and residue it counts the bit patterns seen in training.
+#
+#   Training:
+#   python NECClassifier.py NECWeights.bin Tests/test-001.txt Tests/test-002.txt
+#
+
+import struct
+import sys
+from array import array
+from NEC import NECDecoder
+from Timeline import readTimelineFile
+import Log
+
+log = Log.getLogger("NECClassifier")
+
+
+class PulseClassifier:
+
+  FILE_HEADER = b'NECW'
+  FILE_VERSION = 1
+
+  # Every bit pattern getCombinationsForTime can return
+  PATTERNS = ['0', '1', '00', '01', '10', '11',
+              '000', '001', '010', '011', '100', '101', '110',
+              '0000', '0001', '0010', '0100', '1000']
+
+  LENGTH_BIN_SECONDS = 0.00025
+  LENGTH_BINS = 28
+  RESIDUE_BINS = 5
+
+  # Tie breaker for patterns never seen in training
+  PRIOR_WEIGHT = 0.01
+
+  def __init__(self, pulseErrorRange=NECDecoder.PulseErrorRange):
+      self.pulseErrorRange = pulseErrorRange
+      self.patternIndex = {pattern: i for i, pattern in enumerate(self.PATTERNS)}
+
+      # Patterns seen in training, cell after cell, and totals of the cells
+      self.weights = array('d', [0.0]) * (self.LENGTH_BINS * self.RESIDUE_BINS * len(self.PATTERNS))
+      self.cellTotals = array('d', [0.0]) * (self.LENGTH_BINS * self.RESIDUE_BINS)
+
+  def getCell(self, pulseLength, residue):
+      lengthBin = min(int(pulseLength / self.LENGTH_BIN_SECONDS), self.LENGTH_BINS - 1)
+
+      # residue of the previous correct pulse, in range of half of the PulseErrorRange
+      halfRange = self.pulseErrorRange / 2
+      residueBin = int((residue + halfRange) / (2 * halfRange) * self.RESIDUE_BINS)
+      residueBin = min(max(residueBin, 0), self.RESIDUE_BINS - 1)
+
+      return lengthBin * self.RESIDUE_BINS + residueBin
+
+  def loadWeights(self, filename):
+      with open(filename, "rb") as file:
+          header = file.read(16)
+          magic, version, lengthBins, residueBins, patterns = struct.unpack('<4sIHHI', header)
+
+          if magic != self.FILE_HEADER or version != self.FILE_VERSION:
+              raise ValueError("{0} is not a NEC weights file".format(filename))
+          if lengthBins != self.LENGTH_BINS or residueBins != self.RESIDUE_BINS or patterns != len(self.PATTERNS):
+              raise ValueError("{0} has been compiled for different classifier".format(filename))
+
+          weights = array('d')
+          weights.fromfile(file, len(self.weights))
+
+      self.weights = weights
+      self.updateTotals()
+      pass
+
+  def saveWeights(self, filename):
+      with open(filename, "wb") as file:
+          file.write(struct.pack('<4sIHHI', self.FILE_HEADER, self.FILE_VERSION, self.LENGTH_BINS, self.RESIDUE_BINS, len(self.PATTERNS)))
+          self.weights.tofile(file)
+      pass
+
+  def updateTotals(self):
+      p = len(self.PATTERNS)
+      for cell in range(0, len(self.cellTotals)):
+          self.cellTotals[cell] = sum(self.weights[cell * p:(cell + 1) * p])
+
+  def calculate(self, pulseLength, residue, candidates):
+      cell = self.getCell(pulseLength, residue)
+      offset = cell * len(self.PATTERNS)
+      total = self.cellTotals[cell] + 1
+      scored = []
+
+      for pattern in candidates:
+          learned = self.weights[offset + self.patternIndex[pattern]] / total
+          prior = 1 - min(1, abs(pulseLength - NECDecoder.getPatternLength(pattern)) / NECDecoder.PULSE_POSITIVE_LENGTH)
+          scored.append((pattern, learned + self.PRIOR_WEIGHT * prior))
+
+      return scored
+
+  def reward(self, pulseLength, residue, pattern):
+      cell = self.getCell(pulseLength, residue)
+      self.weights[cell * len(self.PATTERNS) + self.patternIndex[pattern]] += 1
+      self.cellTotals[cell] += 1
+      pass
+
+
+class NECClassifierDecoder(NECDecoder):
+
+  # When classified signal is not valid, try all the combinations
+  FALLBACK_TO_COMBINATIONS = True
+
+  log = log
+
+  def __init__(self, weightsFile=None, classifier=None):
+      self.classifier = classifier
+
+      if classifier is None and weightsFile is not None:
+          self.classifier = PulseClassifier(self.PulseErrorRange)
+          self.classifier.loadWeights(weightsFile)
+
+  def getPulseBit(self, pulseLength):
+      if pulseLength > self.PULSE_POSITIVE_LENGTH - self.PulseErrorRange / 2 and pulseLength < self.PULSE_POSITIVE_LENGTH + self.PulseErrorRange / 2:
+          return '1'
+      if pulseLength > self.PULSE_NEGATIVE_LENGTH - self.PulseErrorRange / 2 and pulseLength < self.PULSE_NEGATIVE_LENGTH + self.PulseErrorRange / 2:
+          return '0'
+      return None
+
+  def splitArray(self, timeArray):
+      # Correct chunks of bits and wrong periods (length, residue) between them
+      chunks = []
+      gaps = []
+      chunk = ''
+      wrongLength = 0
+      residue = 0
+      gapResidue = 0
+
+      for pulseLength in timeArray:
+          bit = self.getPulseBit(pulseLength)
+
+          if bit is None:
+              if wrongLength == 0:
+                  gapResidue = residue
+              wrongLength += pulseLength
+              continue
+
+          if wrongLength > 0:
+              chunks.append(chunk)
+              gaps.append((wrongLength, gapResidue))
+              chunk = ''
+              wrongLength = 0
+
+          chunk += bit
+          residue = pulseLength - (self.PULSE_POSITIVE_LENGTH if bit == '1' else self.PULSE_NEGATIVE_LENGTH)
+
+      chunks.append(chunk)
+      if wrongLength > 0:
+          gaps.append((wrongLength, gapResidue))
+          chunks.append('')
+
+      return chunks, gaps
+
+  def joinArray(self, chunks, patterns):
+      signal = chunks[0]
+      for i in range(0, len(patterns)):
+          signal += patterns[i] + chunks[i + 1]
+      return signal
+
+  def classifyArray(self, timeArray):
+      chunks, gaps = self.splitArray(timeArray)
+      needed = 16 - sum(len(chunk) for chunk in chunks)
+
+      # Best scored patterns for every number of bits used so far
+      best = {0: (0.0, [])}
+
+      for pulseLength, residue in gaps:
+          candidates = self.getCombinationsForTime(pulseLength)
+          if not candidates:
+              return False
+
+          nextBest = {}
+          for used, (score, patterns) in best.items():
+              for pattern, patternScore in self.classifier.calculate(pulseLength, residue, candidates):
+                  total = used + len(pattern)
+                  if total > needed:
+                      continue
+                  if total not in nextBest or nextBest[total][0] < score + patternScore:
+                      nextBest[total] = (score + patternScore, patterns + [pattern])
+          best = nextBest
+
+      if needed not in best:
+          return False
+
+      return self.joinArray(chunks, best[needed][1])
+
+  def enhanceArray(self, timeArray):
+      if self.classifier is None:
+          return super().enhanceArray(timeArray)
+
+      result = self.classifyArray(timeArray)
+
+      if self.DEBUG:
+          self.log.debug("Classified: %s", result)
+
+      if self.validateCombinationSignal(result):
+          self.confidence = 1.0
+          self.validationFailed = False
+          return result
+
+      if self.FALLBACK_TO_COMBINATIONS:
+          return super().enhanceArray(timeArray)
+
+      return False
+
+  def matchesPattern(self, signal, expectedBits):
+      if expectedBits is None:
+          return True
+      for i in range(0, min(len(signal), len(expectedBits))):
+          if expectedBits[i] != '_' and expectedBits[i] != signal[i]:
+              return False
+      return True
+
+  def learnArray(self, timeArray, expectedBits=None):
+      # Offline only: finds the combination of patterns the slow way
+      chunks, gaps = self.splitArray(timeArray)
+      if len(gaps) == 0:
+          return False
+
+      combinationsMix = []
+      for pulseLength, residue in gaps:
+          possibleCombinations = self.getCombinationsForTime(pulseLength)
+          if not possibleCombinations:
+              return False
+          combinationsMix.append(possibleCombinations)
+
+      for combinationToTest in self.getAllCombinations(combinationsMix):
+          testedSignal = self.joinArray(chunks, combinationToTest)
+
+          if self.validateCombinationSignal(testedSignal) and self.matchesPattern(testedSignal, expectedBits):
+              for (pulseLength, residue), pattern in zip(gaps, combinationToTest):
+                  self.classifier.reward(pulseLength, residue, pattern)
+              return True
+
+      return False
+
+  def getDataPulses(self, pulses):
+      # Skips leader (9ms + 4.5ms) when recorded
+      while len(pulses) > 0 and pulses[0] > 0.0035 and pulses[0] < 0.015:
+          pulses = pulses[1:]
+
+      dataPulses = []
+      totalTime = 0
+      for pulseLength in pulses[:32]:
+          totalTime += pulseLength
+          if totalTime > self.AddressLengthSeconds + self.CommandLengthSeconds:
+              break
+          dataPulses.append(pulseLength)
+
+      return dataPulses
+
+  def learnTimeline(self, timeline):
+      pulseArray = self.getDataPulses(timeline.pulses)
+      expectedBits = timeline.getPatternBits()
+
+      addressArray = self.getFirst16bitsOr27ms(pulseArray)
+      learned = self.learnArray(addressArray, expectedBits[:16] if expectedBits else None)
+      learned = self.learnArray(pulseArray, expectedBits[16:] if expectedBits else None) or learned
+      return learned
+
+
+def train(filenames, classifier=None):
+  decoder = NECClassifierDecoder(classifier=classifier or PulseClassifier())
+
+  for filename in filenames:
+      for timeline in readTimelineFile(filename):
+          decoder.learnTimeline(timeline)
+
+  return decoder.classifier
+
+
+if __name__ == '__main__':
+  if len(sys.argv) < 3:
+      print("Usage: python NECClassifier.py <weights file> <timeline file> [<timeline file> ...]")
+      sys.exit(1)
+
+  train(sys.argv[2:]).saveWeights(sys.argv[1])
@@ -7,6 +7,8 @@
 
 from typing import List
 from abc import ABC, abstractmethod
+from array import array
+from operator import mul
 
 
 class SingleNeuralFactor(ABC):
@@ -139,3 +141,128 @@ class NeuralCalculation(ABC):
 	@abstractmethod
 	def reward(self, value):
 		pass
+
+
+class NeuralValueArray(NeuralCalculation):
+	"""
+	Compact version of NeuralValue. Factors of all the bits are kept
+	in flat arrays, bit after bit (bit 0 is the most significant one):
+
+		values[bit * factors_per_bit + n]
+
+	Weights are shared by all frames, so sums of weights and stabilities
+	are calculated once per reward instead of once per pulse.
+	"""
+
+	def __init__(self, name, max_bits, is_signed, factors_per_bit):
+		self.name = name
+		self.max_bits = max_bits
+		self.is_signed = is_signed
+		self.factors_per_bit = factors_per_bit
+		self.value = 0
+
+		size = max_bits * factors_per_bit
+		self.values = array('d', [0.0]) * size
+		self.factors = array('d', [1.0]) * size
+		self.stabilities = array('d', [1.0]) * size
+		self.bitValues = array('d', [0.0]) * max_bits
+		self.bitStabilities = array('d', [0.0]) * max_bits
+		self.updateSums()
+
+	@classmethod
+	def fromNeuralValue(cls, neuralValue: NeuralValue):
+		factors_per_bit = len(neuralValue.neuralBits[0].neuralFactors) if neuralValue.max_bits > 0 else 0
+		compact = cls(neuralValue.name, neuralValue.max_bits, neuralValue.is_signed, factors_per_bit)
+
+		i = 0
+		for neuralBit in neuralValue.neuralBits:
+			assert len(neuralBit.neuralFactors) == factors_per_bit, "Every bit requires the same number of factors"
+			for neuralFactor in neuralBit.neuralFactors:
+				compact.values[i] = neuralFactor.value
+				compact.factors[i] = neuralFactor.factor
+				compact.stabilities[i] = neuralFactor.stability
+				i += 1
+
+		compact.updateSums()
+		return compact
+
+	def updateSums(self):
+		f = self.factors_per_bit
+		self.factorSums = [sum(self.factors[b * f:(b + 1) * f]) for b in range(0, self.max_bits)]
+		self.stabilitySums = [sum(self.stabilities[b * f:(b + 1) * f]) for b in range(0, self.max_bits)]
+
+	def load(self, values, factors=None, stabilities=None):
+		self.values = array('d', values)
+
+		if factors is not None:
+			self.factors = array('d', factors)
+		if stabilities is not None:
+			self.stabilities = array('d', stabilities)
+		if factors is not None or stabilities is not None:
+			self.updateSums()
+		pass
+
+	def calculateBits(self, values):
+		f = self.factors_per_bit
+		factors = self.factors
+		bitValues = []
+
+		for b in range(0, self.max_bits):
+			start = b * f
+			valueSum = sum(map(mul, values[start:start + f], factors[start:start + f]))
+			bitValues.append(valueSum / self.factorSums[b])
+
+		return bitValues
+
+	def toInteger(self, bitValues):
+		value = 0
+		multiply_by = 1
+		for i in range(0, self.max_bits):
+			if round(bitValues[i]) == 1:
+				if i == 0 and self.is_signed:
+					multiply_by = -1
+				else:
+					value += 1 << (self.max_bits - 1 - i)
+		return multiply_by * value
+
+	def calculate(self):
+		bitValues = self.calculateBits(self.values)
+
+		for b in range(0, self.max_bits):
+			self.bitValues[b] = bitValues[b]
+			self.bitStabilities[b] = self.stabilitySums[b] / self.factorSums[b]
+
+		self.value = self.toInteger(bitValues)
+		return self.value
+
+	def calculateBatch(self, frames):
+		return [self.toInteger(self.calculateBits(values)) for values in frames]
+
+	def expectedBits(self, value):
+		bits = []
+		for i in range(0, self.max_bits):
+			if i == 0 and self.is_signed:
+				bits.append(1 if value < 0 else 0)
+			else:
+				bits.append((abs(value) >> (self.max_bits - 1 - i)) & 1)
+		return bits
+
+	def rewardValues(self, values, value):
+		f = self.factors_per_bit
+		factors = self.factors
+
+		for b, expected in enumerate(self.expectedBits(value)):
+			for i in range(b * f, (b + 1) * f):
+				if values[i] == expected:
+					factors[i] += 1
+
+	def reward(self, value):
+		self.rewardValues(self.values, value)
+		self.updateSums()
+		pass
+
+	def rewardBatch(self, frames, expectedValues):
+		for values, value in zip(frames, expectedValues):
+			self.rewardValues(values, value)
+		self.updateSums()
+		pass
@@ -0,0 +1,257 @@
+#
+#   Pulse-distance protocols described by specs
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   A protocol is described once: leader, timing of bits, number of
+#   bits, order of bits, fields and the rule of a valid frame. The spec
+#   is compiled into tables: pulse length in microseconds -> bit, pulse
+#   number -> bit position in the frame, field -> shift and mask. All the
+#   protocols are decoded by the same short loop over these tables, a
+#   new remote needs only a new spec.
+#
+#   Usage:
+#   PulseProtocol.registerSpec(PulseProtocol.ProtocolSpec(
+#       "MY_REMOTE", leader=(0.008, 0.010), bits={0: 0.001125, 1: 0.00225}, tolerance=0.0003,
+#       bitCount=32, order="lsb", fields=[("address", 0, 16), ("command", 16, 16)],
+#       validation="inverted-bytes"))
+#   IReader = SignalDecoder.SignalDecoder(provider, MultiProtocolDecoder.PulseDistanceDecoder("MY_REMOTE"))
+#
+
+from Results import PulseFrame, DecodeError
+
+
+# Pulse lengths in the tables are integer ticks
+TICKS_PER_SECOND = 1000000
+
+# Table entry of a tick crossed by a window boundary, checked exactly
+BOUNDARY = -1
+
+
+def isInvertedBytes(compiled, frame):
+    # NEC: second byte of every 16-bit field repeats the first one or is its inverse
+    for name, shift, mask in compiled.fieldTable:
+        if mask == 0xFFFF:
+            value = (frame >> shift) & mask
+            if (value >> 8) != (value & 0xFF) and (value >> 8) ^ (value & 0xFF) != 0xFF:
+                return False
+    return True
+
+
+def hasChecksum(compiled, frame):
+    # DHT22: last byte is the sum of the previous bytes
+    total = 0
+    value = frame >> 8
+    while value:
+        total += value & 0xFF
+        value >>= 8
+    return total & 0xFF == frame & 0xFF
+
+
+VALIDATORS = {
+    "none": lambda compiled, frame: True,
+    "inverted-bytes": isInvertedBytes,
+    "checksum": hasChecksum,
+}
+
+
+class ProtocolSpec:
+
+    def __init__(self, name, leader, bits, bitCount, tolerance=0, order="msb", fields=(), validation="none", trailer=0.001, mark=None):
+        self.name = name
+        # (min, max) seconds of the pulse before the first bit
+        self.leader = leader
+        # Bit -> pulse seconds (with tolerance) or (min, max) seconds
+        self.bits = bits
+        self.bitCount = bitCount
+        self.tolerance = tolerance
+        # "msb" or "lsb": order of bits sent in every field
+        self.order = order
+        # (name, first bit, number of bits)
+        self.fields = list(fields)
+        # Name of VALIDATORS or function(compiled, frame)
+        self.validation = validation
+        # Time after the last bit before the frame is given up
+        self.trailer = trailer
+        # Seconds of low level starting every bit, the space after it
+        # decides the bit when both edges are captured
+        self.mark = mark
+
+    def getBitRange(self, bit):
+        timing = self.bits[bit]
+        if isinstance(timing, tuple):
+            return timing
+        return (timing - self.tolerance, timing + self.tolerance)
+
+
+class CompiledProtocol:
+
+    def __init__(self, spec):
+        if spec.order not in ("msb", "lsb"):
+            raise ValueError("Unknown order of bits '{0}'".format(spec.order))
+
+        self.spec = spec
+        self.name = spec.name
+        self.leaderMin, self.leaderMax = spec.leader
+        self.bitCount = spec.bitCount
+        self.bitRanges = [(bit,) + spec.getBitRange(bit) for bit in sorted(spec.bits)]
+        self.dataMin = min(low for bit, low, high in self.bitRanges)
+        self.dataMax = max(high for bit, low, high in self.bitRanges)
+        self.frameLength = self.bitCount * self.dataMax + spec.trailer
+
+        # Middle of the window of every bit, and spaces of bits after the mark
+        self.mark = spec.mark
+        self.periods = {bit: (low + high) / 2 for bit, low, high in self.bitRanges}
+        self.spaceRanges = [] if self.mark is None else [(bit, low - self.mark, high - self.mark) for bit, low, high in self.bitRanges]
+
+        self.buildBitTable()
+        self.buildFieldTable()
+
+        validation = spec.validation
+        if not callable(validation):
+            if validation not in VALIDATORS:
+                raise KeyError("Unknown validation '{0}'. Available: {1}".format(validation, ", ".join(sorted(VALIDATORS))))
+            validation = VALIDATORS[validation]
+        self.validation = validation
+
+    def buildBitTable(self):
+        # Tick -> bit, None when the pulse is no bit, BOUNDARY when the
+        # tick is crossed by a boundary of a window
+        self.bitTable = [None] * (int(self.dataMax * TICKS_PER_SECOND) + 2)
+        for bit, low, high in self.bitRanges:
+            firstTick = max(0, int(low * TICKS_PER_SECOND))
+            lastTick = int(high * TICKS_PER_SECOND)
+            for tick in range(firstTick, lastTick + 1):
+                if tick == firstTick or tick == lastTick or self.bitTable[tick] is not None:
+                    self.bitTable[tick] = BOUNDARY
+                else:
+                    self.bitTable[tick] = bit
+
+    def buildFieldTable(self):
+        # Frame is an integer, fields from the most significant bits.
+        # Pulse number -> bit position, field -> (name, shift, mask)
+        self.shifts = [self.bitCount - 1 - i for i in range(0, self.bitCount)]
+        self.fieldTable = []
+
+        for name, first, length in self.spec.fields:
+            if first < 0 or first + length > self.bitCount:
+                raise ValueError("Field '{0}' is outside of {1} bits".format(name, self.bitCount))
+
+            shift = self.bitCount - first - length
+            self.fieldTable.append((name, shift, (1 << length) - 1))
+            if self.spec.order == "lsb":
+                for k in range(0, length):
+                    self.shifts[first + k] = shift + k
+
+    def getBit(self, pulseLength):
+        for bit, low, high in self.bitRanges:
+            if pulseLength > low and pulseLength < high:
+                return bit
+        return None
+
+    def getSpaceBit(self, space):
+        for bit, low, high in self.spaceRanges:
+            if space > low and space < high:
+                return bit
+        return None
+
+    def resolvePulses(self, pulses):
+        # Pulses out of timing with a known space (both edges mode) are
+        # decided by the space. When a falling edge was missed, the
+        # bits before the last mark are left as one pulse before it
+        if self.mark is None:
+            return pulses
+
+        resolved = []
+        for pulse in pulses:
+            space = getattr(pulse, "space", None)
+            bit = None
+            if space is not None and self.getBit(pulse) is None:
+                bit = self.getSpaceBit(space)
+
+            if bit is None:
+                resolved.append(pulse)
+                continue
+
+            rest = pulse - space - self.mark
+            if rest > self.dataMin:
+                restBit = self.getBit(rest)
+                resolved.append(rest if restBit is None else self.periods[restBit])
+            resolved.append(self.periods[bit])
+        return resolved
+
+    def getFrame(self, pulses):
+        # Frame as integer, None when any pulse is not a bit
+        if len(pulses) != self.bitCount:
+            return None
+
+        table = self.bitTable
+        size = len(table)
+        frame = 0
+        for pulseLength, shift in zip(pulses, self.shifts):
+            tick = int(pulseLength * TICKS_PER_SECOND)
+            if tick < 0 or tick >= size:
+                return None
+
+            bit = table[tick]
+            if bit == BOUNDARY:
+                bit = self.getBit(pulseLength)
+            if bit is None:
+                return None
+            if bit:
+                frame |= 1 << shift
+        return frame
+
+    def getFields(self, frame):
+        return {name: (frame >> shift) & mask for name, shift, mask in self.fieldTable}
+
+    def isValid(self, frame):
+        return self.validation(self, frame)
+
+    def decode(self, pulses, startTime=None):
+        # PulseFrame or DecodeError, used as MultiProtocolDecoder.Protocol.decode
+        frame = self.getFrame(pulses)
+        if frame is None and self.mark is not None:
+            frame = self.getFrame(self.resolvePulses(pulses))
+        if frame is None:
+            return DecodeError("Invalid pulse", self.name)
+        if not self.isValid(frame):
+            return DecodeError("Invalid frame", self.name)
+        return PulseFrame(frame, self.bitCount, self.getFields(frame), self.name)
+
+
+SPECS = {
+    # Same windows as NECDecoder, the leader is 9ms + 4.5ms
+    "NEC": ProtocolSpec("NEC", leader=(0.0035, 0.015), bits={0: 0.001125, 1: 0.00225}, tolerance=0.000275625,
+                        bitCount=32, order="lsb", fields=[("address", 0, 16), ("command", 16, 16)],
+                        validation="inverted-bytes", trailer=0.0035, mark=0.0005625),
+    # NEC bits after 4.5ms + 4.5ms leader
+    "SAMSUNG": ProtocolSpec("SAMSUNG", leader=(0.008, 0.010), bits={0: 0.001125, 1: 0.00225}, tolerance=0.000275625,
+                            bitCount=32, order="lsb", fields=[("address", 0, 16), ("command", 16, 16)],
+                            validation="inverted-bytes", trailer=0.0035, mark=0.0005625),
+    # Same windows as DHT22Decoder, the leader is the host start signal
+    "DHT22": ProtocolSpec("DHT22", leader=(0.002, 0.008), bits={0: (0.000016, 0.000107), 1: (0.000107, 0.000167)},
+                          bitCount=40, fields=[("humidity", 0, 16), ("temperature", 16, 16), ("checksum", 32, 8)],
+                          validation="checksum", mark=0.00005),
+}
+
+compiledSpecs = {}
+
+
+def registerSpec(spec):
+    SPECS[spec.name] = spec
+    compiledSpecs.pop(spec.name, None)
+
+
+def getCompiled(spec):
+    # Spec or name of SPECS, compiled once
+    if isinstance(spec, ProtocolSpec):
+        return CompiledProtocol(spec)
+
+    if spec not in compiledSpecs:
+        if spec not in SPECS:
+            raise KeyError("Unknown protocol spec '{0}'. Available: {1}".format(spec, ", ".join(sorted(SPECS))))
+        compiledSpecs[spec] = CompiledProtocol(SPECS[spec])
+    return compiledSpecs[spec]
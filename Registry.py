@@ -0,0 +1,85 @@
+#
+#   Lazily loaded registry of decoders, data providers and GPIO backends
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Modules are imported when first used, so a service decoding NEC
+#   does not pay for DHT22, GPIO or any other module at startup.
+#
+#   Usage:
+#   import Registry
+#   IReader = SignalDecoder.SignalDecoder(
+#       Registry.getProvider("gpio", GPIO_Mode, GPIO_PIN),
+#       Registry.getDecoder("nec")
+#       )
+#
+
+import importlib
+
+decoders = {
+    "nec": "NEC:NECDecoder",
+    "nec-classifier": "NECClassifier:NECClassifierDecoder",
+    "dht22": "DHT22:DHT22Decoder",
+    "multi": "MultiProtocolDecoder:MultiProtocolDecoder",
+    "pulse-distance": "MultiProtocolDecoder:PulseDistanceDecoder",
+}
+
+providers = {
+    "gpio": "GPIODataProvider:EdgeDetected",
+    "wav": "WavDataProvider:WavDataProvider",
+    "fused": "FusedDataProvider:FusedDataProvider",
+}
+
+backends = {
+    "rpi": "RPi.GPIO",
+    "simulated": "SimulatedGPIO",
+}
+
+
+def registerDecoder(name, target):
+    decoders[name] = target
+
+
+def registerProvider(name, target):
+    providers[name] = target
+
+
+def registerBackend(name, target):
+    backends[name] = target
+
+
+def load(target):
+    # "module:Class" returns the class, "module" returns the module
+    moduleName, _, attribute = target.partition(":")
+    module = importlib.import_module(moduleName)
+    if attribute:
+        return getattr(module, attribute)
+    return module
+
+
+def lookup(registry, kind, name):
+    if name not in registry:
+        raise KeyError("Unknown {0} '{1}'. Available: {2}".format(kind, name, ", ".join(sorted(registry))))
+    return load(registry[name])
+
+
+def getDecoderClass(name):
+    return lookup(decoders, "decoder", name)
+
+
+def getProviderClass(name):
+    return lookup(providers, "provider", name)
+
+
+def getBackend(name="rpi"):
+    return lookup(backends, "GPIO backend", name)
+
+
+def getDecoder(name, *args, **kwargs):
+    return getDecoderClass(name)(*args, **kwargs)
+
+
+def getProvider(name, *args, **kwargs):
+    return getProviderClass(name)(*args, **kwargs)
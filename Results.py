@@ -0,0 +1,245 @@
+#
+#   Results of decoders
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Every decoded frame is one small object with __slots__: NECCommand,
+#   NECRepeat, DHT22Reading, PulseFrame or DecodeError. Strings for display (hex,
+#   binary) are made only when they are read. Results of clean NEC
+#   frames are shared: the same key returns the same object, so results
+#   must never be changed.
+#
+#   Results can still be read as dictionaries:
+#   command["hex"], measure["temperature"], "result" in measure
+#
+#   DecodeError is false, like False returned before:
+#   if not command:
+#       continue
+#
+
+class DecodeResult:
+    __slots__ = ("protocol",)
+
+    # Key of dictionary -> attribute, keys with None value are skipped
+    FIELDS = {"protocol": "protocol"}
+
+    def __getitem__(self, key):
+        value = getattr(self, self.FIELDS[key], None)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.FIELDS and getattr(self, self.FIELDS[key], None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, self.FIELDS.get(key, "_"), None)
+        return default if value is None else value
+
+    def keys(self):
+        return [key for key, attribute in self.FIELDS.items() if getattr(self, attribute) is not None]
+
+    def toDict(self):
+        return {key: getattr(self, attribute) for key, attribute in self.FIELDS.items() if getattr(self, attribute) is not None}
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, self.toDict())
+
+
+def toJSON(value):
+    # Used as json.dumps(default=...)
+    if isinstance(value, DecodeResult):
+        return value.toDict()
+    raise TypeError("{0} is not JSON serializable".format(type(value).__name__))
+
+
+def formatBinary(signal):
+    ending = ""
+    if len(signal) > 40:
+        ending = " " + signal[40:len(signal)]
+    return signal[0:8] + " " + signal[8:16] + " " + signal[16:24] + " " + signal[24:32] + " " + signal[32:40] + ending
+
+
+class NECCommand(DecodeResult):
+    __slots__ = ("code", "address", "command", "confidence", "ambiguous", "budgetExhausted", "repeat", "validationFailed")
+
+    FIELDS = {
+        "hex": "hex",
+        "address": "address",
+        "command": "command",
+        "confidence": "confidence",
+        "ambiguous": "ambiguous",
+        "budget_exhausted": "budgetExhausted",
+        "repeat": "repeat",
+        "protocol": "protocol",
+        # Only when the address or command failed the check of inverted bytes
+        "validation_failed": "validationFailed",
+    }
+
+    # Shared results of clean frames: (address, command, protocol, repeat) -> NECCommand
+    interned = {}
+    MAX_INTERNED = 512
+
+    def __init__(self, code, address, command, confidence=1.0, ambiguous=False, budgetExhausted=False, protocol=None, repeat=None, validationFailed=None):
+        self.code = code
+        self.address = address
+        self.command = command
+        self.confidence = confidence
+        self.ambiguous = ambiguous
+        self.budgetExhausted = budgetExhausted
+        self.protocol = protocol
+        self.repeat = repeat
+        self.validationFailed = validationFailed or None
+
+    @classmethod
+    def create(cls, code, address, command, confidence=1.0, ambiguous=False, budgetExhausted=False, protocol=None, repeat=None, validationFailed=None):
+        if confidence < 1.0 or ambiguous or budgetExhausted or validationFailed:
+            return cls(code, address, command, confidence, ambiguous, budgetExhausted, protocol, repeat, validationFailed)
+
+        key = (address, command, protocol, repeat)
+        result = cls.interned.get(key)
+        if result is None:
+            result = cls(code, address, command, confidence, ambiguous, budgetExhausted, protocol, repeat)
+            if len(cls.interned) < cls.MAX_INTERNED:
+                cls.interned[key] = result
+        return result
+
+    @property
+    def hex(self):
+        return hex(self.code)
+
+    def withProtocol(self, protocol):
+        return self.create(self.code, self.address, self.command, self.confidence, self.ambiguous, self.budgetExhausted, protocol, self.repeat, self.validationFailed)
+
+    def asRepeat(self):
+        # Last command while the key is held
+        return self.create(self.code, self.address, self.command, self.confidence, self.ambiguous, self.budgetExhausted, self.protocol, True, self.validationFailed)
+
+
+class NECRepeat(DecodeResult):
+    __slots__ = ()
+
+    FIELDS = {"result": "result", "protocol": "protocol"}
+    result = "REPEAT"
+
+    interned = {}
+
+    def __init__(self, protocol=None):
+        self.protocol = protocol
+
+    @classmethod
+    def create(cls, protocol=None):
+        result = cls.interned.get(protocol)
+        if result is None:
+            result = cls.interned[protocol] = cls(protocol)
+        return result
+
+    def withProtocol(self, protocol):
+        return self.create(protocol)
+
+    def __str__(self):
+        return self.result
+
+
+class DHT22Reading(DecodeResult):
+    __slots__ = ("result", "bits", "temperature", "humidity", "avgTemperature", "avgHumidity", "checksum", "calculatedChecksum", "dateTime")
+
+    FIELDS = {
+        "binary": "binary",
+        "result": "result",
+        "checksum": "checksum",
+        "calculated_checksum": "calculatedChecksum",
+        "temperature": "temperature",
+        "humidity": "humidity",
+        "avg_temperature": "avgTemperature",
+        "avg_humidity": "avgHumidity",
+        "protocol": "protocol",
+    }
+
+    def __init__(self, result, bits, temperature, humidity, avgTemperature=None, avgHumidity=None, checksum=None, calculatedChecksum=None, dateTime=None, protocol=None):
+        self.result = result
+        self.bits = bits
+        self.temperature = temperature
+        self.humidity = humidity
+        self.avgTemperature = avgTemperature
+        self.avgHumidity = avgHumidity
+        self.checksum = checksum
+        self.calculatedChecksum = calculatedChecksum
+        self.dateTime = dateTime
+        self.protocol = protocol
+
+    @property
+    def ok(self):
+        return self.result == "OK"
+
+    @property
+    def binary(self):
+        return formatBinary(self.bits)
+
+    def withProtocol(self, protocol):
+        return DHT22Reading(self.result, self.bits, self.temperature, self.humidity, self.avgTemperature, self.avgHumidity,
+                            self.checksum, self.calculatedChecksum, self.dateTime, protocol)
+
+
+class PulseFrame(DecodeResult):
+    # Frame of a PulseProtocol spec, its fields are read as keys
+    __slots__ = ("code", "bitCount", "fields")
+
+    FIELDS = {"hex": "hex", "binary": "binary", "protocol": "protocol"}
+
+    def __init__(self, code, bitCount, fields, protocol=None):
+        self.code = code
+        self.bitCount = bitCount
+        self.fields = fields
+        self.protocol = protocol
+
+    @property
+    def hex(self):
+        return hex(self.code)
+
+    @property
+    def binary(self):
+        return format(self.code, "0{0}b".format(self.bitCount))
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return self.fields[key]
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return key in self.fields or super().__contains__(key)
+
+    def get(self, key, default=None):
+        if key in self.fields:
+            return self.fields[key]
+        return super().get(key, default)
+
+    def keys(self):
+        return super().keys() + list(self.fields)
+
+    def toDict(self):
+        values = super().toDict()
+        values.update(self.fields)
+        return values
+
+    def withProtocol(self, protocol):
+        return PulseFrame(self.code, self.bitCount, self.fields, protocol)
+
+
+class DecodeError(DecodeResult):
+    __slots__ = ("reason",)
+
+    FIELDS = {"result": "result", "reason": "reason", "protocol": "protocol"}
+    result = "ERROR"
+
+    def __init__(self, reason, protocol=None):
+        self.reason = reason
+        self.protocol = protocol
+
+    def __bool__(self):
+        return False
+
+    def withProtocol(self, protocol):
+        return DecodeError(self.reason, protocol)
@@ -0,0 +1,269 @@
+#
+#   DHT22 sensors triggered one after another by a single thread
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Every sensor gets its own time slot: the start signal is sent, the
+#   response is read and decoded before the next sensor is triggered,
+#   so edge callbacks of different sensors never interleave.
+#
+#   With MaxMeasureFrequencyInSeconds the interval of a sensor adapts:
+#   it grows while readings stay at the average of the last 3 and drops towards
+#   2 seconds when they change or frames fail.
+#
+#   Usage:
+#   scheduler = SensorScheduler.SensorScheduler()
+#   inside = scheduler.addSensor(12, 2)
+#   outside = scheduler.addSensor(16, 8, MaxMeasureFrequencyInSeconds=60)
+#   scheduler.Start()
+#   print(inside.Temperature, outside.Temperature, scheduler.getSamplingRate())
+#
+
+import heapq
+import importlib
+from collections import deque
+from queue import Queue
+from queue import Empty
+from threading import Thread, Condition
+from time import sleep
+from timeit import default_timer
+import DHT22
+import GPIODataProvider
+
+
+class AdaptiveInterval:
+
+    # DHT22 requires at least 2 seconds between measures
+    MIN_SECONDS = 2
+
+    BACKOFF_FACTOR = 1.5
+    TIGHTEN_FACTOR = 2
+
+    # Reading this close to the average of the last readings of the sensor
+    # is stable. Readings are counted, not seconds: DHT22.AverageMeasure keeps
+    # 3 minutes, which never holds enough readings at long intervals
+    STABLE_TEMPERATURE_DIFFERENCE = 0.2
+    STABLE_HUMIDITY_DIFFERENCE = 1
+    STABLE_READINGS = 3
+
+    def __init__(self, seconds, maxSeconds=None):
+        # Without maxSeconds the interval never changes
+        self.seconds = seconds
+        self.maxSeconds = seconds if maxSeconds is None else max(seconds, maxSeconds)
+        self.minSeconds = seconds if maxSeconds is None else self.MIN_SECONDS
+
+        self.measures = 0
+        self.failures = 0
+
+        # (temperature, humidity) of the last correct readings
+        self.readings = deque(maxlen=self.STABLE_READINGS)
+
+    @property
+    def samplingRate(self):
+        # Measures per second
+        return 1 / self.seconds
+
+    def isStable(self, temperature, humidity):
+        count = len(self.readings)
+        averageTemperature = sum(reading[0] for reading in self.readings) / count
+        averageHumidity = sum(reading[1] for reading in self.readings) / count
+        return abs(temperature - averageTemperature) <= self.STABLE_TEMPERATURE_DIFFERENCE \
+            and abs(humidity - averageHumidity) <= self.STABLE_HUMIDITY_DIFFERENCE
+
+    def update(self, measure):
+        # Interval after a measure, kept until there are enough readings to compare
+        self.measures += 1
+
+        if not measure or measure.get("result") != "OK":
+            self.failures += 1
+            self.seconds = self.minSeconds
+            return self.seconds
+
+        temperature, humidity = measure["temperature"], measure["humidity"]
+        if len(self.readings) == self.STABLE_READINGS:
+            if self.isStable(temperature, humidity):
+                self.seconds = min(self.maxSeconds, self.seconds * self.BACKOFF_FACTOR)
+            else:
+                self.seconds = max(self.minSeconds, self.seconds / self.TIGHTEN_FACTOR)
+
+        self.readings.append((temperature, humidity))
+        return self.seconds
+
+
+class ScheduledSensor:
+
+    Temperature = 0
+    Humidity = 0
+    AvgTemperature = 0
+    AvgHumidity = 0
+
+    def __init__(self, GPIO_PIN, MeasureFrequencyInSeconds, provider, Store=None, MaxMeasureFrequencyInSeconds=None):
+        self.GPIO_PIN = GPIO_PIN
+        self.MeasureFrequencyInSeconds = MeasureFrequencyInSeconds
+        self.interval = AdaptiveInterval(max(MeasureFrequencyInSeconds, AdaptiveInterval.MIN_SECONDS), MaxMeasureFrequencyInSeconds)
+        self.provider = provider
+        self.timeQueue = Queue(SensorScheduler.MAX_QUEUE_SIZE)
+        self.decoder = DHT22.DHT22Decoder()
+        self.decoder.initialize(self.timeQueue)
+        self.Store = Store
+        self.lastResult = None
+
+        if provider is not None:
+            provider.InitDataQueue(self.timeQueue)
+
+
+class SensorScheduler:
+
+    MAX_QUEUE_SIZE = 256
+
+    # DHT22 requires at least 2 seconds between measures
+    MIN_INTERVAL_SECONDS = 2
+
+    # Start signal (host keeps low level) and time to read the whole response
+    START_SIGNAL_SECONDS = 0.002
+    RESPONSE_SECONDS = 0.05
+
+    # Minimum time between start signals of two sensors
+    SLOT_SECONDS = 0.1
+
+    isStopped = False
+
+    def __init__(self, GPIO_Backend=None):
+        if GPIO_Backend is None:
+            GPIO_Backend = importlib.import_module("RPi.GPIO")
+        self.GPIO = GPIO_Backend
+        self.sensors = []
+
+        # (next trigger time, order, sensor), sensors may be added while running
+        self.schedule = []
+        self.condition = Condition()
+        self.nextSlotTime = 0
+        self.order = 0
+
+    def addSensor(self, GPIO_BCM_PIN, MeasureFrequencyInSeconds=8, Store=None, provider=None, MaxMeasureFrequencyInSeconds=None):
+        assert MeasureFrequencyInSeconds >= self.MIN_INTERVAL_SECONDS, "DHT22 requires that measures must be 2 seconds at minimum"
+
+        if provider is None:
+            provider = GPIODataProvider.EdgeDetected(self.GPIO.BCM, GPIO_BCM_PIN, 200, self.GPIO)
+
+        sensor = ScheduledSensor(GPIO_BCM_PIN, MeasureFrequencyInSeconds, provider, Store, MaxMeasureFrequencyInSeconds)
+        self.sensors.append(sensor)
+        self.addToSchedule(sensor, default_timer())
+        return sensor
+
+    def addToSchedule(self, sensor, triggerTime):
+        with self.condition:
+            self.order += 1
+            heapq.heappush(self.schedule, (triggerTime, self.order, sensor))
+            self.condition.notify()
+
+    def scheduleNext(self):
+        # Next sensor and its trigger time, never inside a slot of another sensor.
+        # Waits for the first sensor, (None, None) when stopped before
+        with self.condition:
+            while len(self.schedule) == 0:
+                if self.isStopped:
+                    return None, None
+                self.condition.wait()
+
+            plannedTime, order, sensor = heapq.heappop(self.schedule)
+            triggerTime = max(plannedTime, self.nextSlotTime)
+            self.nextSlotTime = triggerTime + self.SLOT_SECONDS
+            return sensor, triggerTime
+
+    def measured(self, sensor, triggerTime):
+        self.addToSchedule(sensor, triggerTime + sensor.interval.seconds)
+
+    def getSamplingRate(self):
+        # Measures per second of all the sensors
+        return sum(sensor.interval.samplingRate for sensor in self.sensors)
+
+    def Stop(self):
+        with self.condition:
+            self.isStopped = True
+            self.condition.notify_all()
+
+    def Start(self):
+        self.isStopped = False
+
+        self.worker = Thread(target=self.QueueConsumer)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def QueueConsumer(self):
+        while not self.isStopped:
+            sensor, triggerTime = self.scheduleNext()
+            if sensor is None:
+                return
+
+            # Stop ends the wait for the trigger time
+            waitTime = triggerTime - default_timer()
+            if waitTime > 0:
+                with self.condition:
+                    if self.condition.wait_for(lambda: self.isStopped, waitTime):
+                        return
+
+            self.trigger(sensor)
+            sleep(self.RESPONSE_SECONDS)
+            self.readMeasure(sensor)
+            self.measured(sensor, triggerTime)
+
+    def trigger(self, sensor):
+        # Old edges must not be taken as a part of the response
+        self.clearQueue(sensor)
+
+        # You have to set negative signal for at least 1 ms to request data from DHT22
+        self.GPIO.setup(sensor.GPIO_PIN, self.GPIO.OUT)
+        self.GPIO.output(sensor.GPIO_PIN, self.GPIO.LOW)
+        sleep(self.START_SIGNAL_SECONDS)
+        self.GPIO.setup(sensor.GPIO_PIN, self.GPIO.IN, pull_up_down=self.GPIO.PUD_UP)
+
+    def clearQueue(self, sensor):
+        while True:
+            try:
+                sensor.timeQueue.get_nowait()
+            except Empty:
+                return
+
+    def readMeasure(self, sensor):
+        edges = []
+        while True:
+            try:
+                edges.append(sensor.timeQueue.get_nowait())
+            except Empty:
+                break
+
+        pulses, signalStartTime = self.getResponsePulses(sensor.decoder, edges)
+        if pulses is None:
+            sensor.interval.update(None)
+            return None
+
+        measure = sensor.decoder.decodePulses(pulses, signalStartTime)
+        sensor.lastResult = measure
+        sensor.interval.update(measure)
+
+        if measure['result'] == "OK":
+            sensor.Temperature = measure['temperature']
+            sensor.Humidity = measure['humidity']
+            sensor.AvgTemperature = measure['avg_temperature']
+            sensor.AvgHumidity = measure['avg_humidity']
+
+            if sensor.Store is not None:
+                sensor.Store.append(sensor.GPIO_PIN, sensor.Temperature, sensor.Humidity)
+
+        return measure
+
+    def getResponsePulses(self, decoder, edges):
+        # Start signal is the first pulse in range of DHT22Decoder.waitForSignal,
+        # the frame is found in the response as DHT22Decoder.getBurst does
+        for i in range(1, len(edges)):
+            signalTime = edges[i] - edges[i - 1]
+            if signalTime > 0.002 and signalTime < 0.008:
+                maxTime = edges[i] + decoder.MAX_DHT22_SIGNAL_LENGTH
+                lastEdge = min(len(edges), i + 41 + decoder.MAX_EXTRA_PULSES)
+                pulses = [edges[j] - edges[j - 1] for j in range(i + 1, lastEdge) if edges[j] <= maxTime]
+                return decoder.alignFrame(decoder.SPEC.resolvePulses(pulses), 40), edges[i]
+
+        return None, 0
@@ -0,0 +1,147 @@
+#
+#   Decoded events shared with other processes
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Publisher writes every decoded event into a ring in shared memory.
+#   Any number of local processes read the ring at their own pace;
+#   a reader which is too slow loses the oldest events, never blocks
+#   the publisher.
+#
+#   Publisher:
+#   publisher = SharedEvents.EventPublisher("ir-events")
+#   IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder(), publisher=publisher)
+#
+#   Any other process:
+#   subscriber = SharedEvents.EventSubscriber("ir-events")
+#   for sequence, event in subscriber.read():
+#       print(event)
+#
+
+import json
+import struct
+from multiprocessing import shared_memory
+from time import sleep
+from Results import toJSON
+import Log
+
+log = Log.getLogger("SharedEvents")
+
+
+HEADER = struct.Struct('<4sIIQ')
+HEADER_SIZE = 32
+SLOT_HEADER = struct.Struct('<QI')
+MAGIC = b'SDEV'
+
+
+def attachSharedMemory(name):
+    # Readers must not remove shared memory when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except Exception:
+            pass
+        return memory
+
+
+class EventPublisher:
+
+    def __init__(self, name=None, slots=256, slotSize=512):
+        self.slots = slots
+        self.slotSize = slotSize
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * slotSize)
+        self.name = self.memory.name
+        self.sequence = 0
+        self.dropped = 0
+        HEADER.pack_into(self.memory.buf, 0, MAGIC, slots, slotSize, 0)
+
+    def publish(self, event):
+        # Sequence of the event, None when it does not fit in a slot;
+        # the decoder thread calling it must keep running
+        payload = json.dumps(event, separators=(',', ':'), default=toJSON).encode()
+        if len(payload) > self.slotSize - SLOT_HEADER.size:
+            self.dropped += 1
+            log.warning("Event of %d bytes does not fit in slot of %d bytes, skipped", len(payload), self.slotSize)
+            return None
+
+        self.sequence += 1
+        offset = HEADER_SIZE + ((self.sequence - 1) % self.slots) * self.slotSize
+        buffer = self.memory.buf
+
+        # Sequence 0 marks the slot being written
+        SLOT_HEADER.pack_into(buffer, offset, 0, len(payload))
+        buffer[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+        SLOT_HEADER.pack_into(buffer, offset, self.sequence, len(payload))
+        HEADER.pack_into(buffer, 0, MAGIC, self.slots, self.slotSize, self.sequence)
+        return self.sequence
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+class EventSubscriber:
+
+    def __init__(self, name, fromStart=False):
+        self.memory = attachSharedMemory(name)
+        magic, self.slots, self.slotSize, written = HEADER.unpack_from(self.memory.buf, 0)
+        if magic != MAGIC:
+            raise ValueError("{0} is not an event ring".format(name))
+
+        # Next sequence to read; by default only new events
+        self.nextSequence = max(1, written - self.slots + 1) if fromStart else written + 1
+        self.lost = 0
+
+    def getWrittenSequence(self):
+        return HEADER.unpack_from(self.memory.buf, 0)[3]
+
+    def readSlot(self, sequence):
+        offset = HEADER_SIZE + ((sequence - 1) % self.slots) * self.slotSize
+        buffer = self.memory.buf
+
+        slotSequence, length = SLOT_HEADER.unpack_from(buffer, offset)
+        if slotSequence != sequence:
+            return None
+        payload = bytes(buffer[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length])
+
+        # Overwritten while reading
+        if SLOT_HEADER.unpack_from(buffer, offset)[0] != sequence:
+            return None
+        return json.loads(payload)
+
+    def read(self):
+        events = []
+        written = self.getWrittenSequence()
+
+        if written - self.nextSequence >= self.slots:
+            oldest = written - self.slots + 1
+            self.lost += oldest - self.nextSequence
+            self.nextSequence = oldest
+
+        while self.nextSequence <= written:
+            event = self.readSlot(self.nextSequence)
+            if event is None:
+                self.lost += 1
+            else:
+                events.append((self.nextSequence, event))
+            self.nextSequence += 1
+
+        return events
+
+    def wait(self, timeout=None, interval=0.01):
+        waited = 0
+        while self.getWrittenSequence() < self.nextSequence:
+            if timeout is not None and waited >= timeout:
+                return []
+            sleep(interval)
+            waited += interval
+        return self.read()
+
+    def close(self):
+        self.memory.close()
@@ -6,21 +6,31 @@
 #   MIT Licence
 #
 
-from time import sleep
 from queue import Queue
 from queue import Empty
+from queue import Full
 from threading import Thread
+from time import monotonic
 from abc import ABC, abstractmethod
+import Clock
 
 
 class SignalDataProvider():
+    clock = Clock.realClock
 
     def InitDataQueue(self, queue):
         pass
 
+    def setClock(self, clock):
+        self.clock = clock
+
 
 class SignalAdapter():
     DEBUG = False
+    clock = Clock.realClock
+
+    def setClock(self, clock):
+        self.clock = clock
 
     def initialize(self, timeQueue, debug):
         self.timeQueue = timeQueue
@@ -31,6 +41,86 @@ class SignalAdapter():
         pass
 
 
+class Pulse(float):
+    # Period between two falling edges with its space (high level before
+    # the next falling edge), the mark is the rest of the period
+    __slots__ = ("space",)
+
+    def __new__(cls, period, space):
+        pulse = float.__new__(cls, period)
+        pulse.space = space
+        return pulse
+
+    @property
+    def mark(self):
+        return float(self) - self.space
+
+
+class Edge(float):
+    # Falling edge queued in both edges mode: time of the rising edge
+    # before it ends the previous mark. Decoders subtract edges as before,
+    # the difference is a Pulse with its space
+    __slots__ = ("riseTime",)
+
+    def __new__(cls, fallTime, riseTime=None):
+        edge = float.__new__(cls, fallTime)
+        edge.riseTime = riseTime
+        return edge
+
+    def __sub__(self, previous):
+        period = float(self) - previous
+        riseTime = self.riseTime
+        if riseTime is None or riseTime <= previous or riseTime >= self:
+            return period
+        return Pulse(period, float(self) - riseTime)
+
+
+class EndOfInput(Exception):
+    # Edge queue is stopped and all its edges have been read
+    pass
+
+
+class EdgeQueue(Queue):
+    # Queue of edges with an explicit end: after stop, a read of the empty
+    # queue raises EndOfInput instead of waiting for an edge that never
+    # comes. A virtual clock ends the input at endTime, so deadlines before
+    # it are still reached
+
+    isStopped = False
+    endTime = None
+
+    def stop(self, endTime=None):
+        with self.not_empty:
+            self.isStopped = True
+            self.endTime = endTime
+            self.not_empty.notify_all()
+
+    def isFinished(self):
+        return self.isStopped and self.empty()
+
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            if block:
+                deadline = None if timeout is None else monotonic() + timeout
+                while not self._qsize() and not self.isStopped:
+                    if deadline is None:
+                        self.not_empty.wait()
+                        continue
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.not_empty.wait(remaining)
+
+            if not self._qsize():
+                if self.isStopped:
+                    raise EndOfInput()
+                raise Empty
+
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+
 class SignalDecoder:
 
     startIRTimeQueue = 0
@@ -38,10 +128,29 @@ class SignalDecoder:
     MAX_COMMANDS = 20
     isStopped = False
     
-    def __init__(self, dataProvider: SignalDataProvider, decoder: SignalAdapter, DEBUG=False):
+    def __init__(self, dataProvider: SignalDataProvider, decoder: SignalAdapter, DEBUG=False, publisher=None, clock=None, profile=False):
         
         self.DEBUG = DEBUG
 
+        # Clock.VirtualClock decodes recorded signals without waiting
+        self.clock = Clock.realClock if clock is None else clock
+        if clock is not None:
+            for user in (dataProvider, decoder):
+                if hasattr(user, "setClock"):
+                    user.setClock(clock)
+
+        # Optional SharedEvents.EventPublisher, every command is published to other processes
+        self.publisher = publisher
+
+        # Dispatcher.CommandDispatcher, created by the first subscribe
+        self.dispatcher = None
+
+        # MemoryProfiler.MemoryProfiler, allocations of every frame by stage
+        self.profiler = None
+        if profile:
+            import MemoryProfiler
+            self.profiler = MemoryProfiler.MemoryProfiler()
+
         self.timeQueue = Queue(self.MAX_QUEUE_SIZE)
         self.Commands = Queue(self.MAX_COMMANDS)
         self.decoder = decoder
@@ -57,23 +166,62 @@ class SignalDecoder:
     def Start(self):
         self.isStopped = False
 
-        worker = Thread(target=self.QueueConsumer)
-        worker.daemon = True
-        worker.start()
+        self.worker = Thread(target=self.QueueConsumer)
+        self.worker.daemon = True
+        self.worker.start()
         
     
     def QueueConsumer(self):
         self.decoder.initialize(self.timeQueue, self.DEBUG)
+        if self.profiler is not None:
+            self.profiler.start()
         
         while not self.isStopped:
             
             currentCommand = self.decoder.getCommand()
-            self.Commands.put(currentCommand)
+            if self.profiler is not None:
+                self.profiler.frameFinished(currentCommand)
+
+            if self.dispatcher is None and self.publisher is None:
+                self.Commands.put(currentCommand)
+            else:
+                # Subscribers and readers of the shared ring may never poll,
+                # so the decoder must not wait for them
+                try:
+                    self.Commands.put_nowait(currentCommand)
+                except Full:
+                    pass
+                if self.dispatcher is not None:
+                    self.dispatcher.dispatch(currentCommand)
+
+            if self.publisher is not None:
+                self.publisher.publish(currentCommand)
             
             # Minimum time for next IR command
-            sleep(0.01)
+            self.clock.sleep(0.01)
+
+        # Snapshots are taken by this thread, tracing stops between them
+        if self.profiler is not None:
+            self.profiler.stop()
         pass
     
+    def subscribe(self, handler, hex=None, address=None, debounceSeconds=None, repeatInterval=None):
+        # Handler is called with every decoded command, for one hex code, one address or all
+        if self.dispatcher is None:
+            import Dispatcher
+            self.dispatcher = Dispatcher.CommandDispatcher()
+        return self.dispatcher.subscribe(handler, hex, address, debounceSeconds, repeatInterval)
+
+    def unsubscribe(self, subscription):
+        if self.dispatcher is not None:
+            self.dispatcher.unsubscribe(subscription)
+
+    def getProfile(self):
+        # Blocks and bytes per frame by stage, None unless created with profile=True
+        if self.profiler is None:
+            return None
+        return self.profiler.getReport()
+
     def hasDetected(self):
         return not self.Commands.empty()
 
@@ -87,8 +235,12 @@ class SignalDecoder:
                 self.Commands.task_done()
         pass
     
-    def getCommand(self, wait_for_result=False):
-        command = self.Commands.get(wait_for_result)
+    def isAlive(self):
+        # False when the decoder thread has stopped or died on an exception
+        return self.worker.is_alive()
+
+    def getCommand(self, wait_for_result=False, timeout=None):
+        command = self.Commands.get(wait_for_result, timeout)
         self.Commands.task_done()
         return command
     
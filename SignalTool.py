@@ -0,0 +1,288 @@
+#
+#   Command-line tool: capture, decode, stats and benchmark
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   python -m SignalTool capture --pin 16 --seconds 10 capture.txt
+#   python -m SignalTool decode --decoder nec Tests/test-001.txt
+#   python -m SignalTool decode --decoder nec --leader 0.0045 Tests/test-003.txt
+#   python -m SignalTool stats --decoder dht22 --add-zero-time Tests/test-dht22-02.txt
+#   python -m SignalTool stats --decoder nec --profile Tests/test-001.txt
+#   python -m SignalTool benchmark --repeat 5
+#
+
+import argparse
+import json
+import sys
+from queue import Queue
+from queue import Empty
+from threading import Thread
+from time import sleep
+from timeit import default_timer
+import Registry
+import Clock
+import BulkDecoder
+from Results import NECRepeat
+from SignalDecoder import EdgeQueue, EndOfInput
+from Timeline import TimelineDataProvider, readTimelineFile, writeTimelineFile
+
+
+# Decoder name, timeline files, add zero time, leader
+BENCHMARK_SCENARIOS = {
+    "nec-clean": ("nec", ["Tests/test-001.txt"], False, None),
+    "nec-errors": ("nec", ["Tests/test-002.txt"], False, 0.0045),
+    "nec-generic": ("nec", ["Tests/test-003.txt"], False, 0.0045),
+    "dht22": ("dht22", ["Tests/test-dht22-01.txt", "Tests/test-dht22-02.txt"], True, None),
+    "multi": ("multi", ["Tests/test-001.txt", "Tests/test-dht22-02.txt"], True, None),
+}
+
+# Replay checks this often whether its decoder thread has ended
+RESULT_POLL_SECONDS = 0.05
+
+
+class ReplayStats:
+
+    def __init__(self):
+        self.edges = 0
+        self.frames = 0
+        self.valid = 0
+        self.repeats = 0
+        self.errors = 0
+        self.budgetExhausted = 0
+        self.seconds = 0
+
+    def add(self, result):
+        self.frames += 1
+        if result and result.get("budget_exhausted"):
+            self.budgetExhausted += 1
+
+        if isinstance(result, NECRepeat):
+            self.repeats += 1
+        elif result and result.get("result", "OK") == "OK" and result.get("hex") != hex(0):
+            self.valid += 1
+        else:
+            self.errors += 1
+
+    def toDict(self):
+        return {
+            "edges": self.edges,
+            "frames": self.frames,
+            "valid": self.valid,
+            "repeats": self.repeats,
+            "errors": self.errors,
+            "budget_exhausted": self.budgetExhausted,
+            "seconds": round(self.seconds, 6),
+            "edges_per_second": round(self.edges / self.seconds) if self.seconds > 0 else 0,
+        }
+
+
+def replay(decoderName, filenames, addZeroTime=False, leader=None, onResult=None, clock=None, profiler=None):
+    # Decodes recorded files without waiting for real time between frames;
+    # decoders wait on a virtual clock unless a clock is given.
+    # MemoryProfiler.MemoryProfiler gets every decoded frame
+    if clock is None:
+        clock = Clock.VirtualClock()
+
+    timeQueue = EdgeQueue()
+    results = Queue()
+    provider = TimelineDataProvider(clock=clock)
+    provider.InitDataQueue(timeQueue)
+
+    timelines = []
+    for filename in filenames:
+        timelines += readTimelineFile(filename)
+
+    decoder = Registry.getDecoder(decoderName)
+    decoder.setClock(clock)
+    decoder.initialize(timeQueue, False)
+
+    def consume():
+        if profiler is not None:
+            profiler.start()
+        while True:
+            try:
+                result = decoder.getCommand()
+            except EndOfInput:
+                return
+            if profiler is not None:
+                profiler.frameFinished(result)
+            results.put(result)
+
+    worker = Thread(target=consume)
+    worker.daemon = True
+
+    stats = ReplayStats()
+    startTime = default_timer()
+    finishTime = startTime
+    worker.start()
+
+    # Next timeline is put when the decoder has read the previous one,
+    # as it would come from GPIO
+    for timeline in timelines:
+        provider.putPulses(timeline.pulses, addZeroTime, leader)
+        timeQueue.join()
+
+    stats.edges = provider.edgeCount
+    if not isinstance(clock, Clock.VirtualClock):
+        # Decoders finish the last frame by their own timeouts
+        sleep(provider.GAP_BETWEEN_TIMELINES)
+    # Virtual time of the input ends after the gap of the last timeline,
+    # so decoders still finish the last frame by their deadlines
+    provider.Stop()
+
+    while worker.is_alive() or not results.empty():
+        try:
+            result = results.get(timeout=RESULT_POLL_SECONDS)
+        except Empty:
+            continue
+
+        finishTime = default_timer()
+        stats.add(result)
+        if onResult is not None:
+            onResult(result)
+
+    worker.join()
+    stats.seconds = finishTime - startTime
+    return stats
+
+
+def capture(args):
+    backend = Registry.getBackend(args.backend)
+    timeQueue = Queue()
+    provider = Registry.getProvider("gpio", backend.BCM if args.mode == "bcm" else backend.BOARD, args.pin, 100, backend)
+    provider.InitDataQueue(timeQueue)
+
+    sleep(args.seconds)
+    provider.Stop()
+
+    edgeTimes = []
+    while not timeQueue.empty():
+        edgeTimes.append(timeQueue.get_nowait())
+
+    writeTimelineFile(args.output, edgeTimes, "Captured from pin {0}".format(args.pin))
+    print("{0} edges written to {1}".format(len(edgeTimes), args.output))
+    return 0
+
+
+def getClock(args):
+    return Clock.realClock if args.real_clock else None
+
+
+def getProfiler(args):
+    if not args.profile:
+        return None
+    import MemoryProfiler
+    return MemoryProfiler.MemoryProfiler()
+
+
+def printProfile(profiler):
+    if profiler is not None:
+        print(json.dumps(profiler.getReport(), indent=2))
+        profiler.stop()
+
+
+def decode(args):
+    profiler = getProfiler(args)
+    stats = replay(args.decoder, args.files, args.add_zero_time, args.leader, onResult=print, clock=getClock(args), profiler=profiler)
+    if args.stats:
+        printStats(stats)
+    printProfile(profiler)
+    return 0
+
+
+def printStats(stats):
+    for key, value in stats.toDict().items():
+        print("{0}: {1}".format(key, value))
+
+
+def showStats(args):
+    profiler = getProfiler(args)
+    printStats(replay(args.decoder, args.files, args.add_zero_time, args.leader, clock=getClock(args), profiler=profiler))
+    printProfile(profiler)
+    return 0
+
+
+def benchmark(args):
+    report = {}
+    names = args.scenarios or list(BENCHMARK_SCENARIOS)
+
+    for name in names:
+        decoderName, filenames, addZeroTime, leader = BENCHMARK_SCENARIOS[name]
+        runs = [replay(decoderName, filenames, addZeroTime, leader, clock=getClock(args)) for i in range(0, args.repeat)]
+        best = min(runs, key=lambda stats: stats.seconds)
+        report[name] = best.toDict()
+        report[name]["decoder"] = decoderName
+        report[name]["repeat"] = args.repeat
+
+    print(json.dumps(report, indent=2 if args.pretty else None))
+    return 0
+
+
+def bulk(args):
+    protocols = args.protocols.split(",") if args.protocols else None
+    decoder = BulkDecoder.BulkDecoder(protocols, args.processes)
+
+    for frameTime, result in decoder.decode(BulkDecoder.getEdgeTimes(args.files, args.add_zero_time, args.leader)):
+        print("{0:.6f} {1}".format(frameTime, result))
+    return 0
+
+
+def getScenario(name):
+    if name not in BENCHMARK_SCENARIOS:
+        raise argparse.ArgumentTypeError("unknown scenario '{0}', choose from {1}".format(name, ", ".join(sorted(BENCHMARK_SCENARIOS))))
+    return name
+
+
+def getParser():
+    parser = argparse.ArgumentParser(prog="python -m SignalTool", description="Capture, decode and benchmark recorded signals")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_capture = subparsers.add_parser("capture", help="record edges from GPIO into a timeline file")
+    parser_capture.add_argument("output")
+    parser_capture.add_argument("--pin", type=int, required=True)
+    parser_capture.add_argument("--mode", choices=["bcm", "board"], default="bcm")
+    parser_capture.add_argument("--backend", default="rpi")
+    parser_capture.add_argument("--seconds", type=float, default=10)
+    parser_capture.set_defaults(function=capture)
+
+    for name, function, text in (("decode", decode, "decode timeline files and print results"),
+                                 ("stats", showStats, "decode timeline files and print statistics")):
+        parser_decode = subparsers.add_parser(name, help=text)
+        parser_decode.add_argument("files", nargs="+")
+        parser_decode.add_argument("--decoder", default="nec", choices=sorted(Registry.decoders))
+        parser_decode.add_argument("--add-zero-time", action="store_true", help="put an edge before every timeline (DHT22 recordings)")
+        parser_decode.add_argument("--leader", type=float, help="put a leader pulse of given seconds before every timeline")
+        parser_decode.add_argument("--real-clock", action="store_true", help="decoders wait in real time, as on GPIO")
+        parser_decode.add_argument("--profile", action="store_true", help="print allocations per frame by stage and peak memory")
+        if name == "decode":
+            parser_decode.add_argument("--stats", action="store_true")
+        parser_decode.set_defaults(function=function)
+
+    parser_bulk = subparsers.add_parser("bulk", help="decode long captures in several processes")
+    parser_bulk.add_argument("files", nargs="+")
+    parser_bulk.add_argument("--protocols", help="comma separated, e.g. NEC,NEC_REPEAT; all by default")
+    parser_bulk.add_argument("--processes", type=int, help="number of CPU cores by default")
+    parser_bulk.add_argument("--add-zero-time", action="store_true", help="put an edge before every timeline (DHT22 recordings)")
+    parser_bulk.add_argument("--leader", type=float, help="put a leader pulse of given seconds before every timeline")
+    parser_bulk.set_defaults(function=bulk)
+
+    parser_benchmark = subparsers.add_parser("benchmark", help="decode benchmark scenarios, JSON output")
+    parser_benchmark.add_argument("scenarios", nargs="*", default=[], type=getScenario, metavar="scenario",
+                                  help="one of {0}; all by default".format(", ".join(sorted(BENCHMARK_SCENARIOS))))
+    parser_benchmark.add_argument("--repeat", type=int, default=3)
+    parser_benchmark.add_argument("--pretty", action="store_true")
+    parser_benchmark.add_argument("--real-clock", action="store_true", help="decoders wait in real time, as on GPIO")
+    parser_benchmark.set_defaults(function=benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    args = getParser().parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
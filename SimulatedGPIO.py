@@ -0,0 +1,112 @@
+#
+#   Simulated GPIO backend
+#   Same functions and constants as RPi.GPIO, for hosts without GPIO
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Usage:
+#   import SimulatedGPIO
+#   provider = GPIODataProvider.EdgeDetected(SimulatedGPIO.BCM, 16, GPIO_Backend=SimulatedGPIO)
+#   SimulatedGPIO.setInput(16, SimulatedGPIO.LOW)
+#
+
+from threading import Lock
+
+BOARD = 10
+BCM = 11
+
+OUT = 0
+IN = 1
+
+LOW = 0
+HIGH = 1
+
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+mode = None
+pins = {}
+callbacks = {}
+lock = Lock()
+
+
+def setmode(newMode):
+    global mode
+    mode = newMode
+
+
+def getmode():
+    return mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=None):
+    with lock:
+        value = pins.get(channel, LOW)
+        if direction == IN and pull_up_down == PUD_UP:
+            value = HIGH
+        if direction == IN and pull_up_down == PUD_DOWN:
+            value = LOW
+        if direction == OUT and initial is not None:
+            value = initial
+        pins[channel] = value
+
+
+def output(channel, value):
+    setInput(channel, value)
+
+
+def input(channel):
+    return pins.get(channel, LOW)
+
+
+def add_event_detect(channel, edge, callback=None, bouncetime=None):
+    with lock:
+        if channel in callbacks:
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        callbacks[channel] = (edge, callback)
+
+
+def remove_event_detect(channel):
+    with lock:
+        callbacks.pop(channel, None)
+
+
+def cleanup(channel=None):
+    with lock:
+        if channel is None:
+            pins.clear()
+            callbacks.clear()
+        else:
+            pins.pop(channel, None)
+            callbacks.pop(channel, None)
+
+
+def setInput(channel, value):
+    # Changes the level of the pin and calls edge detection callback
+    with lock:
+        previous = pins.get(channel, LOW)
+        pins[channel] = value
+        edge, callback = callbacks.get(channel, (None, None))
+
+    if callback is None or previous == value:
+        return
+
+    if edge == BOTH or (edge == FALLING and value == LOW) or (edge == RISING and value == HIGH):
+        callback(channel)
+
+
+def pulse(channel):
+    # Single falling edge followed by the return to high level
+    setInput(channel, HIGH)
+    setInput(channel, LOW)
+    setInput(channel, HIGH)
@@ -0,0 +1,160 @@
+#
+#   Every pin decoded in its own process
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Edge callbacks of one pin are not delayed by decoding of another
+#   pin, or by the application, holding the GIL. Every data provider
+#   and its decoder run in a separate process, pinned to one core when
+#   possible; only decoded results are sent to the parent. Processes
+#   which exit are started again.
+#
+#   GPIO is set up in the worker process only, the parent never
+#   touches the pins.
+#
+#   Usage:
+#   supervisor = Supervisor.Supervisor()
+#   supervisor.addWorker("ir", "nec", "gpio", (GPIO.BCM, 18), cpu=1)
+#   supervisor.addWorker("dht22", "dht22", "gpio", (GPIO.BCM, 12, 200), cpu=2)
+#   supervisor.Start()
+#
+#   while True:
+#       name, command = supervisor.getResult(True)
+#
+
+import multiprocessing
+import os
+import sys
+from queue import Empty
+from threading import Thread
+from time import sleep
+import Log
+import Registry
+
+log = Log.getLogger("Supervisor")
+
+
+class WorkerSpec:
+
+    def __init__(self, name, decoder, provider="gpio", providerArgs=(), cpu=None):
+        self.name = name
+
+        # Name in Registry.decoders or a function returning the decoder
+        self.decoder = decoder
+
+        # Name in Registry.providers or a function returning the provider
+        self.provider = provider
+        self.providerArgs = providerArgs
+        self.cpu = cpu
+
+        self.process = None
+        self.restarts = 0
+
+
+def pinToCpu(cpu):
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, {cpu % os.cpu_count()})
+    except OSError as e:
+        log.warning("Can't pin to CPU %d: %s", cpu, e)
+
+
+def runWorker(name, decoder, provider, providerArgs, cpu, results, pollInterval):
+    # Entry of worker process, gets no WorkerSpec: its previous process can't be pickled
+    from SignalDecoder import SignalDecoder
+    pinToCpu(cpu)
+
+    if callable(provider):
+        provider = provider(*providerArgs)
+    else:
+        provider = Registry.getProvider(provider, *providerArgs)
+    decoder = decoder() if callable(decoder) else Registry.getDecoder(decoder)
+
+    reader = SignalDecoder(provider, decoder)
+    while True:
+        try:
+            results.put((name, reader.getCommand(True, pollInterval)))
+        except Empty:
+            # Process exits when the decoder thread dies, so it is restarted
+            if not reader.isAlive():
+                log.error("Decoder of worker %s stopped", name)
+                sys.exit(1)
+
+
+class Supervisor:
+
+    MAX_RESULTS = 1024
+
+    # How often a worker checks its decoder thread when there are no results
+    POLL_INTERVAL = 0.5
+
+    # How often processes are checked, and wait before a restart
+    CHECK_INTERVAL = 0.5
+    RESTART_DELAY = 1
+
+    isStopped = True
+
+    def __init__(self, context=None):
+        self.context = multiprocessing.get_context(context)
+        self.results = self.context.Queue(self.MAX_RESULTS)
+        self.workers = {}
+
+    def addWorker(self, name, decoder, provider="gpio", providerArgs=(), cpu=None):
+        if name in self.workers:
+            raise KeyError("Worker '{0}' already exists".format(name))
+
+        spec = WorkerSpec(name, decoder, provider, providerArgs, cpu)
+        self.workers[name] = spec
+        if not self.isStopped:
+            self.startWorker(spec)
+        return spec
+
+    def startWorker(self, spec):
+        args = (spec.name, spec.decoder, spec.provider, spec.providerArgs, spec.cpu, self.results, self.POLL_INTERVAL)
+        spec.process = self.context.Process(target=runWorker, args=args, name="Supervisor-" + spec.name)
+        spec.process.daemon = True
+        spec.process.start()
+
+    def Start(self):
+        self.isStopped = False
+        for spec in self.workers.values():
+            self.startWorker(spec)
+
+        self.monitor = Thread(target=self.Monitor)
+        self.monitor.daemon = True
+        self.monitor.start()
+
+    def Stop(self):
+        self.isStopped = True
+        for spec in self.workers.values():
+            if spec.process is not None:
+                spec.process.terminate()
+                spec.process.join()
+
+    def Monitor(self):
+        while not self.isStopped:
+            sleep(self.CHECK_INTERVAL)
+
+            for spec in list(self.workers.values()):
+                if self.isStopped or spec.process.is_alive():
+                    continue
+
+                log.warning("Worker %s exited with code %s, restarting", spec.name, spec.process.exitcode)
+                spec.process.join()
+                sleep(self.RESTART_DELAY)
+                if not self.isStopped:
+                    spec.restarts += 1
+                    self.startWorker(spec)
+
+    def hasDetected(self):
+        return not self.results.empty()
+
+    def getResult(self, wait_for_result=False, timeout=None):
+        # (worker name, decoded command)
+        try:
+            return self.results.get(wait_for_result, timeout)
+        except Empty:
+            return None
@@ -1,14 +1,15 @@
 from time import sleep 
 from threading import Thread
 
-import RPi.GPIO as GPIO 
+import importlib
 import DHT22
 import SignalDecoder
 import GPIODataProvider
+from SensorScheduler import AdaptiveInterval
 
 class TemperatureSensor:
 
-	GPIO_Mode = GPIO.BCM
+	GPIO_Mode = None
 	GPIO_PIN = 12
 
 	Temperature = 0
@@ -19,14 +20,23 @@ class TemperatureSensor:
 	isStopped = False
 	
   
-	def __init__(self, GPIO_BCM_PIN, MeasureFrequencyInSeconds = 8):
+	def __init__(self, GPIO_BCM_PIN, MeasureFrequencyInSeconds = 8, GPIO_Backend = None, Store = None, MaxMeasureFrequencyInSeconds = None):
 		assert MeasureFrequencyInSeconds>=2, "DHT22 requires that measures must be 2 seconds at minimum"
 		self.GPIO_PIN = GPIO_BCM_PIN
 
+		# Optional MeasureStore.MeasureStore, measures are saved with GPIO pin as sensor number
+		self.Store = Store
+
+		if GPIO_Backend is None:
+			GPIO_Backend = importlib.import_module("RPi.GPIO")
+		self.GPIO = GPIO_Backend
+		self.GPIO_Mode = self.GPIO.BCM
+
 		self.edgeDetectionMethod = GPIODataProvider.EdgeDetected(
 				self.GPIO_Mode,
 				self.GPIO_PIN,
-				200
+				200,
+				self.GPIO
 			)
 
 		self.DHT22Reader = SignalDecoder.SignalDecoder(
@@ -36,6 +46,9 @@ class TemperatureSensor:
 			)
 
 		self.MeasureFrequencyInSeconds = MeasureFrequencyInSeconds
+
+		# With MaxMeasureFrequencyInSeconds stable readings are measured less often
+		self.interval = AdaptiveInterval(MeasureFrequencyInSeconds, MaxMeasureFrequencyInSeconds)
 		self.Start()
 	pass
 
@@ -60,30 +73,40 @@ class TemperatureSensor:
 			#self.edgeDetectionMethod.Stop()
    
 			# Keep positive signal for a while
-			GPIO.setup(self.GPIO_PIN, GPIO.IN, pull_up_down = GPIO.PUD_UP) 
-			sleep(self.MeasureFrequencyInSeconds)
+			self.GPIO.setup(self.GPIO_PIN, self.GPIO.IN, pull_up_down = self.GPIO.PUD_UP) 
+			sleep(self.interval.seconds)
 			
 			# You have to set negative signal for at least 1 ms to request data from DHT22
-			GPIO.setup(self.GPIO_PIN, GPIO.OUT)
-			GPIO.output(self.GPIO_PIN, GPIO.LOW)
+			self.GPIO.setup(self.GPIO_PIN, self.GPIO.OUT)
+			self.GPIO.output(self.GPIO_PIN, self.GPIO.LOW)
 			sleep(0.002)
 			
-			GPIO.setup(self.GPIO_PIN, GPIO.IN, pull_up_down = GPIO.PUD_UP) 
+			self.GPIO.setup(self.GPIO_PIN, self.GPIO.IN, pull_up_down = self.GPIO.PUD_UP) 
 			#self.edgeDetectionMethod.Start()
 			sleep(0.05)
    
 
+			measure = None
 			if self.DHT22Reader.hasDetected():
 				measure = self.DHT22Reader.getCommand()
 
-				if type(measure) is dict and "result" in measure:
+				if measure and "result" in measure:
 					if measure['result'] == "OK":
 						self.Temperature = measure['temperature']
 						self.Humidity = measure['humidity']
 						self.AvgTemperature = measure['avg_temperature']
 						self.AvgHumidity = measure['avg_humidity']
+
+						if self.Store is not None:
+							self.Store.append(self.GPIO_PIN, self.Temperature, self.Humidity)
+
+			self.interval.update(measure)
 		
 	pass
+
+	def getSamplingRate(self):
+		# Measures per second
+		return self.interval.samplingRate
     
 
 
@@ -3,11 +3,49 @@
 from time import sleep 
 from timeit import default_timer
 import unittest
+from queue import Queue
+from queue import Empty
+from threading import Thread
+import threading
 import SignalDecoder
 import datetime
 import NEC
 import DHT22
-from NeuralNetwork import SingleNeuralFactor, NeuralValue, NeuralCalculation
+import Registry
+import PulseProtocol
+import MultiProtocolDecoder
+import SignalTool
+import SharedEvents
+import EventServer
+import MeasureStore
+import SensorScheduler
+import asyncio
+import json
+import SimulatedGPIO
+import GPIODataProvider
+import Dispatcher
+import FusedDataProvider
+from Results import NECCommand, NECRepeat, DHT22Reading, DecodeError, toJSON, PulseFrame
+import Supervisor
+from Timeline import TimelineDataProvider
+import Log
+import io
+import contextlib
+import logging
+import pickle
+import Clock
+import EdgeFilter
+import WavDataProvider
+import BulkDecoder
+import MemoryProfiler
+import wave
+import random
+import struct
+import NECClassifier
+import os
+import tempfile
+from Timeline import readTimelineFile
+from NeuralNetwork import SingleNeuralFactor, NeuralValue, NeuralCalculation, NeuralValueArray
 
 
 class TestDataProvider(SignalDecoder.SignalDataProvider):
@@ -70,14 +108,1103 @@ class NECTesting(unittest.TestCase):
             cmd = self.IReader.getCommand()
             print(cmd)
             print("Expected:" + result)
-            self.assertTrue(type(cmd) is dict and "hex" in cmd and cmd['hex'] in result)
+            self.assertTrue(isinstance(cmd, NECCommand) and "hex" in cmd and cmd['hex'] in result)
             sleep(0.1)
 
         self.IReader.Stop()
         pass
-        
+
+    def test_best_first_search(self):
+        decoder = NEC.NECDecoder()
+        self.assertTrue(list(decoder.getBestFirstCombinations([[(0, '1'), (-1, '00')], [(-0.5, '10'), (-2, '01')]])) ==
+                        [(-0.5, ['1', '10']), (-1.5, ['00', '10']), (-2, ['1', '01']), (-3, ['00', '01'])])
+
+        # 2 errors in one reading
+        timeline = readTimelineFile("Tests/test-002.txt")[-1]
+        addressArray = decoder.getFirst16bitsOr27ms(timeline.pulses)
+        self.assertTrue(decoder.enhanceArray(addressArray) == "1011010010110100")
+        self.assertTrue(decoder.confidence == 1.0)
+
+        # Extended address is timed correctly, nothing is guessed, it only fails the check
+        bits = [(0x342d >> i) & 1 for i in range(0, 16)] + [(0xa758 >> i) & 1 for i in range(0, 16)]
+        result = NEC.NECDecoder().decodePulses([0.00225 if bit else 0.001125 for bit in bits])
+        self.assertTrue(result['confidence'] == 1.0 and not result['ambiguous'] and result['validation_failed'])
+        self.assertTrue('validation_failed' not in NEC.NECDecoder().decodePulses(timeline.pulses))
+        pass
+
+    def test_recovery_budget(self):
+        decoder = NEC.NECDecoder()
+        decoder.RECOVERY_MAX_ATTEMPTS = 2
+
+        # 2 errors in one reading
+        timeline = readTimelineFile("Tests/test-002.txt")[-1]
+        result = decoder.decodePulses(list(timeline.pulses))
+        self.assertTrue(result['budget_exhausted'] and decoder.budgetExhaustedCount == 1)
+        self.assertTrue('_' in result['address'])
+
+        # Valid address found, budget ends only the search for a second one
+        decoder = NEC.NECDecoder()
+        decoder.RECOVERY_MAX_ATTEMPTS = 5
+        decoder.RECOVERY_MAX_SECONDS = 10
+        result = decoder.decodePulses(list(timeline.pulses))
+        self.assertTrue(result['hex'] == "0x2d58" and not result['budget_exhausted'] and decoder.budgetExhaustedCount == 0)
+        pass
+
+
+class NECClassifierTesting(unittest.TestCase):
+
+    def test_trained_weights(self):
+        weightsFile = os.path.join(tempfile.mkdtemp(), "NECWeights.bin")
+        NECClassifier.train(["Tests/test-001.txt", "Tests/test-002.txt"]).saveWeights(weightsFile)
+
+        decoder = NECClassifier.NECClassifierDecoder(weightsFile)
+        untrained = NECClassifier.NECClassifierDecoder(classifier=NECClassifier.PulseClassifier())
+
+        # 2 errors in one reading
+        timeline = readTimelineFile("Tests/test-002.txt")[-1]
+        addressArray = decoder.getFirst16bitsOr27ms(decoder.getDataPulses(timeline.pulses))
+
+        self.assertFalse(untrained.validateCombinationSignal(untrained.classifyArray(list(addressArray))))
+        self.assertTrue(decoder.classifyArray(list(addressArray)) == "1011010010110100")
+        pass
+
+    def test_001(self):
+        self.testProvider = TestDataProvider()
+        self.IReader = SignalDecoder.SignalDecoder(self.testProvider, NECClassifier.NECClassifierDecoder(classifier=NECClassifier.train(["Tests/test-002.txt"])))
+        self.testProvider.ReadFile("test-001.txt")
+        sleep(0.1)
+        for result in self.testProvider.expectedResult:
+            cmd = self.IReader.getCommand()
+            self.assertTrue(isinstance(cmd, NECCommand) and "hex" in cmd and cmd['hex'] in result)
+            sleep(0.1)
+
+        self.IReader.Stop()
+        pass
+
+
+class RegistryTesting(unittest.TestCase):
+
+    def test_simulated_provider(self):
+        provider = Registry.getProvider("gpio", SimulatedGPIO.BCM, 16, 100, Registry.getBackend("simulated"))
+        timeQueue = Queue()
+        provider.InitDataQueue(timeQueue)
+
+        for i in range(0, 3):
+            SimulatedGPIO.pulse(16)
+
+        self.assertTrue(timeQueue.qsize() == 3)
+        self.assertTrue(isinstance(Registry.getDecoder("nec"), NEC.NECDecoder))
+        provider.Stop()
+        pass
+
+    def test_unknown_decoder(self):
+        with self.assertRaises(KeyError):
+            Registry.getDecoder("rc5")
+        pass
+
+
+class MultiProtocolTesting(unittest.TestCase):
+
+    def test_one_edge_stream(self):
+        timeQueue = Queue()
+        decoder = MultiProtocolDecoder.MultiProtocolDecoder()
+        decoder.initialize(timeQueue)
+
+        necPulses = readTimelineFile("Tests/test-001.txt")[0].pulses
+        dht22Pulses = readTimelineFile("Tests/test-dht22-01.txt")[0].pulses
+        # NEC, DHT22, NEC repeat and Samsung (4.5ms + 4.5ms leader) on the same pin
+        pulses = [0.2] + necPulses + [0.1] + dht22Pulses + [0.1, 0.01125, 0.1, 0.009] + necPulses[2:] + [0.1]
+
+        edgeTime = default_timer()
+        for pulse in pulses:
+            edgeTime += pulse
+            timeQueue.put(edgeTime)
+
+        results = [decoder.getCommand() for i in range(0, 4)]
+        self.assertTrue(results[0]['protocol'] == "NEC" and results[0]['hex'] == "0x2d58")
+        self.assertTrue(results[1]['protocol'] == "DHT22" and results[1]['result'] == "OK")
+        self.assertTrue(isinstance(results[2], NECRepeat))
+        self.assertTrue(results[3]['protocol'] == "SAMSUNG" and results[3]['hex'] == "0x2d58")
+        pass
+
+
+class PulseProtocolTesting(unittest.TestCase):
+
+    def test_spec_decoder(self):
+        timeQueue = Queue()
+        decoder = MultiProtocolDecoder.PulseDistanceDecoder("NEC", "DHT22")
+        decoder.initialize(timeQueue)
+
+        necPulses = readTimelineFile("Tests/test-001.txt")[1].pulses
+        dht22Pulses = readTimelineFile("Tests/test-dht22-01.txt")[0].pulses
+        pulses = [0.2] + necPulses + [0.1] + dht22Pulses + [0.1]
+
+        edgeTime = default_timer()
+        for pulse in pulses:
+            edgeTime += pulse
+            timeQueue.put(edgeTime)
+
+        nec = decoder.getCommand()
+        dht22 = decoder.getCommand()
+        self.assertTrue(isinstance(nec, PulseFrame) and nec['protocol'] == "NEC" and nec['address'] == 0x2d2d and nec['command'] == 0xcf30)
+        self.assertTrue(NEC.NECDecoder().decodePulses(necPulses[2:])['hex'] == "0x2d30")
+        self.assertTrue(dht22['protocol'] == "DHT22" and dht22['humidity'] == 498 and dht22['temperature'] == 272)
+        pass
+
+    def test_compiled_tables(self):
+        spec = PulseProtocol.ProtocolSpec("TEST", leader=(0.004, 0.006), bits={0: 0.0005, 1: 0.001}, tolerance=0.0002,
+                                          bitCount=8, order="lsb", fields=[("low", 0, 4), ("high", 4, 4)])
+        compiled = PulseProtocol.getCompiled(spec)
+
+        # Bits sent: 1000 0110, every field from its least significant bit
+        frame = compiled.getFrame([0.001, 0.0005, 0.00051, 0.00049, 0.0005, 0.00102, 0.00098, 0.0005])
+        self.assertTrue(compiled.getFields(frame) == {"low": 1, "high": 6})
+
+        # Window boundaries are open, the same as the decoders compare
+        self.assertTrue(compiled.getBit(0.0003) is None and compiled.getBit(0.0003001) == 0)
+        self.assertTrue(compiled.getFrame([0.0003] + [0.0005] * 7) is None)
+        self.assertTrue(compiled.getFrame([0.0005] * 7) is None)
+        pass
+
+
+class BothEdgesTesting(unittest.TestCase):
+
+    def getNECEdges(self, address, command, missing=()):
+        # Falling edges of NEC bits with rising edges after 562.5us marks
+        bits = [(address >> i) & 1 for i in range(0, 8)] + [((address ^ 255) >> i) & 1 for i in range(0, 8)]
+        bits += [(command >> i) & 1 for i in range(0, 8)] + [((command ^ 255) >> i) & 1 for i in range(0, 8)]
+
+        edges = []
+        fallTime = 1.0
+        riseTime = None
+        for i in range(0, len(bits) + 1):
+            if i not in missing:
+                edges.append(SignalDecoder.Edge(fallTime, riseTime))
+            riseTime = fallTime + 0.0005625
+            if i < len(bits):
+                fallTime += 0.00225 if bits[i] else 0.001125
+        return edges
+
+    def test_provider(self):
+        clock = Clock.VirtualClock()
+        provider = GPIODataProvider.EdgeDetected(SimulatedGPIO.BCM, 21, GPIO_Backend=SimulatedGPIO, Both_Edges=True)
+        provider.setClock(clock)
+        timeQueue = Queue()
+        provider.InitDataQueue(timeQueue)
+
+        for edgeTime, level in ((1.0, SimulatedGPIO.LOW), (1.0005, SimulatedGPIO.HIGH), (1.002, SimulatedGPIO.LOW)):
+            clock.advanceTo(edgeTime)
+            SimulatedGPIO.setInput(21, level)
+
+        first = timeQueue.get()
+        second = timeQueue.get()
+        pulse = second - first
+        self.assertTrue(timeQueue.empty() and isinstance(second, SignalDecoder.Edge))
+        self.assertTrue(abs(pulse - 0.002) < 1e-9 and abs(pulse.space - 0.0015) < 1e-9 and abs(pulse.mark - 0.0005) < 1e-9)
+        provider.Stop()
+        pass
+
+    def test_short_marks(self):
+        # Level is high again when the callbacks run, edges alternate anyway
+        clock = Clock.VirtualClock()
+        provider = GPIODataProvider.EdgeDetected(SimulatedGPIO.BCM, 21, GPIO_Backend=SimulatedGPIO, Both_Edges=True)
+        provider.setClock(clock)
+        timeQueue = Queue()
+        provider.InitDataQueue(timeQueue)
+
+        # Rising edge before 2.0 is missed, the line is idle high after 1 second
+        for edgeTime in (1.0, 1.0005, 1.002, 1.0025, 2.0, 2.0005, 2.002):
+            clock.advanceTo(edgeTime)
+            provider.SignalEdgeDetected(21)
+
+        edges = [timeQueue.get() for i in range(timeQueue.qsize())]
+        self.assertTrue(edges == [1.0, 1.002, 2.0, 2.002] and edges[1].riseTime == 1.0005 and edges[3].riseTime == 2.0005)
+        provider.Stop()
+        pass
+
+    def test_missed_rising_edge(self):
+        # Edges of a whole NEC frame through the provider, one rising edge missed at a time
+        fallTimes = [10.0] + [float(edge) + 9.0135 for edge in self.getNECEdges(0x2d, 0x58)]
+        riseTimes = [10.009] + [fallTime + 0.0005625 for fallTime in fallTimes[1:]]
+
+        for missing in range(0, len(riseTimes)):
+            clock = Clock.VirtualClock()
+            provider = GPIODataProvider.EdgeDetected(SimulatedGPIO.BCM, 21, GPIO_Backend=SimulatedGPIO, Both_Edges=True)
+            provider.setClock(clock)
+            timeQueue = Queue()
+            provider.InitDataQueue(timeQueue)
+
+            edgeTimes = sorted(fallTimes + riseTimes[:missing] + riseTimes[missing + 1:])
+            for edgeTime in edgeTimes:
+                clock.advanceTo(edgeTime)
+                provider.SignalEdgeDetected(21)
+            provider.Stop()
+
+            edges = [timeQueue.get() for i in range(timeQueue.qsize())]
+            self.assertTrue(edges == fallTimes)
+            result = NEC.NECDecoder().decodePulses([edges[i] - edges[i - 1] for i in range(2, len(edges))])
+            self.assertTrue(result['hex'] == "0xd258" and result['confidence'] == 1.0)
+        pass
+
+    def test_missed_edges(self):
+        # Falling edges of 3 bits missed, spaces decide them without search
+        edges = self.getNECEdges(0x2d, 0x58, missing=(3, 20, 27))
+        decoder = NEC.NECDecoder()
+        result = decoder.decodePulses([edges[i] - edges[i - 1] for i in range(1, len(edges))])
+        self.assertTrue(result['hex'] == "0xd258" and result['confidence'] == 1.0 and decoder.validationAttempts == 2)
+
+        edges = [float(edge) for edge in edges]
+        decoder = NEC.NECDecoder()
+        result = decoder.decodePulses([edges[i] - edges[i - 1] for i in range(1, len(edges))])
+        self.assertTrue(result['hex'] == "0xd258" and decoder.validationAttempts > 2)
+        pass
+
+
+class FusedDataProviderTesting(unittest.TestCase):
+
+    def test_two_receivers(self):
+        clean = readTimelineFile("Tests/test-001.txt")[1].pulses
+
+        # First receiver missed an edge and got a glitch, second missed another edge
+        first = list(clean)
+        first[10:12] = [first[10] + first[11]]
+        first[20:21] = [first[20] - 0.0003, 0.0003]
+        second = list(clean)
+        second[25:27] = [second[25] + second[26]]
+        self.assertTrue(NEC.NECDecoder().decodePulses(first[2:])['confidence'] < 1.0)
+
+        startTime = default_timer()
+        receivers = [TimelineDataProvider(startTime=startTime), TimelineDataProvider(startTime=startTime + 0.00007)]
+        provider = Registry.getProvider("fused", receivers)
+        IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder())
+        receivers[0].putPulses(first)
+        receivers[1].putPulses(second)
+
+        command = IReader.getCommand(True)
+        self.assertTrue(command['hex'] == "0x2d30" and command['confidence'] == 1.0)
+
+        # Key press is decoded once
+        sleep(0.1)
+        self.assertTrue(not IReader.hasDetected() and provider.frames == 1 and provider.repairs == 1)
+        IReader.Stop()
+        provider.Stop()
+        pass
+
+    def test_noisy_receiver(self):
+        clean = readTimelineFile("Tests/test-001.txt")[1].pulses
+        provider = FusedDataProvider.FusedDataProvider([TimelineDataProvider(), TimelineDataProvider()])
+        provider.Queue = Queue()
+
+        edges = [1.0]
+        for pulse in clean:
+            edges.append(edges[-1] + pulse)
+
+        # Second receiver sees noise all the time, the frame of the first one is still fused
+        noiseTime = 0.9
+        while noiseTime < 2.0:
+            provider.putEdge(1, noiseTime)
+            while len(edges) > 0 and edges[0] <= noiseTime:
+                provider.putEdge(0, edges.pop(0))
+            provider.flush(noiseTime)
+            self.assertTrue(len(provider.streams[1]) < 50)
+            noiseTime += 0.003
+
+        fused = [provider.Queue.get() for i in range(0, provider.Queue.qsize())]
+        command = NEC.NECDecoder().decodePulses([fused[i] - fused[i - 1] for i in range(3, len(fused))])
+        self.assertTrue(provider.frames == 1 and provider.dropped > 0 and command['hex'] == "0x2d30")
+
+        # Receiver without edges never wins over a noisy frame
+        noisy = [1.0 + sum(clean[:i]) + (0.0004 if i % 2 else 0) for i in range(0, len(clean) + 1)]
+        self.assertTrue(provider.getScore(noisy) < 0 and provider.fuse([[], noisy]) == noisy)
+        pass
+
+
+class SignalToolTesting(unittest.TestCase):
+
+    def test_replay(self):
+        stats = SignalTool.replay("nec", ["Tests/test-001.txt"])
+        self.assertTrue(stats.frames == 4 and stats.valid == 4)
+
+        stats = SignalTool.replay("nec", ["Tests/test-003.txt"], leader=0.0045)
+        self.assertTrue(stats.valid == 2)
+
+        # Every replay joins its consumer thread
+        threads = threading.active_count()
+        for i in range(5):
+            SignalTool.replay("multi", ["Tests/test-001.txt", "Tests/test-dht22-02.txt"], True)
+        self.assertTrue(threading.active_count() == threads)
+        pass
+
+    def test_profile(self):
+        profiler = MemoryProfiler.MemoryProfiler()
+        stats = SignalTool.replay("nec", ["Tests/test-001.txt"], profiler=profiler)
+        report = profiler.getReport()
+        profiler.stop()
+
+        self.assertTrue(report["frames"] == stats.frames == 4)
+        self.assertTrue(set(report["stages"]) <= {"burst", "classification", "recovery", "result", "other"})
+        self.assertTrue("result" in report["stages"] and report["peak_bytes"] >= report["frame_peak_bytes"] > 0)
+
+        # Peak of a frame counts its own allocations, not the snapshots
+        profiler = MemoryProfiler.MemoryProfiler()
+        profiler.start()
+        data = bytearray(100000)
+        del data
+        profile = profiler.frameFinished(None)
+        profiler.stop()
+        self.assertTrue(100000 <= profile.peak < 110000)
+        pass
+
+
+class SharedEventsTesting(unittest.TestCase):
+
+    def test_ring(self):
+        publisher = SharedEvents.EventPublisher(slots=4, slotSize=128)
+        subscriber = SharedEvents.EventSubscriber(publisher.name)
+        lateSubscriber = SharedEvents.EventSubscriber(publisher.name)
+
+        publisher.publish({"hex": "0x2d58"})
+        publisher.publish('REPEAT')
+        self.assertTrue(subscriber.read() == [(1, {"hex": "0x2d58"}), (2, 'REPEAT')])
+
+        for i in range(0, 6):
+            publisher.publish(i)
+
+        # Slow reader loses the oldest events only
+        self.assertTrue([event for sequence, event in lateSubscriber.read()] == [2, 3, 4, 5])
+        self.assertTrue(lateSubscriber.lost == 4)
+        self.assertTrue([event for sequence, event in subscriber.read()] == [2, 3, 4, 5])
+
+        # Too long for a slot: skipped, the publisher goes on
+        self.assertTrue(publisher.publish("x" * 200) is None and publisher.dropped == 1)
+        self.assertTrue(publisher.publish(6) == 9)
+
+        subscriber.close()
+        lateSubscriber.close()
+        publisher.close()
+        pass
+
+    def test_unread_commands(self):
+        class CountingDecoder(SignalDecoder.SignalAdapter):
+            count = 0
+
+            def getCommand(self):
+                self.count += 1
+                return self.count
+
+        # Owner reads the ring only, never getCommand
+        publisher = SharedEvents.EventPublisher(slots=64, slotSize=128)
+        reader = SignalDecoder.SignalDecoder(TestDataProvider(), CountingDecoder(), publisher=publisher)
+        startTime = default_timer()
+        while publisher.sequence <= SignalDecoder.SignalDecoder.MAX_COMMANDS + 5 and default_timer() - startTime < 5:
+            sleep(0.01)
+        reader.Stop()
+
+        self.assertTrue(publisher.sequence > SignalDecoder.SignalDecoder.MAX_COMMANDS + 5)
+        sleep(0.05)
+        publisher.close()
+        pass
+
+
+class EventServerTesting(unittest.TestCase):
+
+    def test_localhost(self):
+        asyncio.run(self.localhost())
+        pass
+
+    async def localhost(self):
+        self.testProvider = TestDataProvider()
+        self.IReader = SignalDecoder.SignalDecoder(self.testProvider, NEC.NECDecoder())
+        server = EventServer.EventServer(self.IReader)
+        server.CLIENT_BUFFER_SIZE = 2
+        server.POLL_INTERVAL = 0.05
+        await server.start()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        slowReader, slowWriter = await asyncio.open_connection('127.0.0.1', server.port)
+        await asyncio.sleep(0.05)
+
+        self.testProvider.ReadFile("test-001.txt")
+        for result in self.testProvider.expectedResult:
+            record = json.loads(await asyncio.wait_for(reader.readline(), 2))
+            self.assertTrue(record["event"]["hex"] in result)
+
+        self.assertTrue(json.loads(await slowReader.readline())["seq"] == 1)
+
+        # Burst faster than the client is served keeps only the newest lines
+        for i in range(0, 5):
+            server.publish(i)
+        records = [json.loads(await asyncio.wait_for(reader.readline(), 2)) for i in range(0, 2)]
+        self.assertTrue([record["event"] for record in records] == [3, 4])
+        self.assertTrue(records[1]["seq"] - records[0]["seq"] == 1 and server.dropped >= 3)
+
+        # Disconnected client is removed without any write to it
+        writer.close()
+        for i in range(0, 20):
+            if len(server.clients) == 1:
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(len(server.clients) == 1 and len(server.handlers) == 1)
+
+        # Stop cancels the handler of the connected client and closes it
+        worker = server.worker
+        await server.stop()
+        self.assertTrue(not worker.is_alive() and len(server.handlers) == 0 and len(server.clients) == 0)
+        await asyncio.wait_for(slowReader.read(), 2)
+        self.assertTrue(slowReader.at_eof())
+        slowWriter.close()
+        self.IReader.Stop()
+        pass
+
+
+class MeasureStoreTesting(unittest.TestCase):
+
+    def test_rollups(self):
+        store = MeasureStore.MeasureStore(tempfile.mkdtemp())
+
+        # 2 sensors, every 30 seconds for 3 hours
+        for timestamp in range(0, 3 * 3600, 30):
+            store.append(1, 20 + (timestamp // 3600), 50, timestamp)
+            store.append(2, -5.5, 80.2, timestamp)
+
+        raw = list(store.query(sensor=1, start=600, end=660, level="raw"))
+        self.assertTrue([record.Time for record in raw] == [600, 630])
+
+        minutes = list(store.query(sensor=2, start=3600, end=7200, level="1m"))
+        self.assertTrue(len(minutes) == 60 and minutes[0].Count == 2 and minutes[0].Temperature == -5.5)
+
+        store.close()
+        store = MeasureStore.MeasureStore(store.directory)
+        hours = list(store.query(sensor=1, level="1h"))
+        self.assertTrue([(record.Time, record.Count, record.Temperature) for record in hours] == [(0, 120, 20), (3600, 120, 21), (7200, 120, 22)])
+        self.assertTrue(hours[0].Humidity == 50)
+        store.close()
+        pass
+
+    def test_reopen(self):
+        self.assertTrue(MeasureStore.RECORD.size == 16)
+        store = MeasureStore.MeasureStore(tempfile.mkdtemp())
+        store.append(1, 20, 50, 3600)
+        store.append(1, 21, 50, 3630)
+        store.close()
+
+        # Power cut in the middle of a record
+        with open(store.getFilename("raw"), "ab") as file:
+            file.write(b"torn")
+
+        # Same minute and hour after a restart: one record each
+        store = MeasureStore.MeasureStore(store.directory)
+        self.assertTrue(store.append(1, 22, 50, 3640))
+        store.append(1, 23, 50, 3670)
+        self.assertTrue([record.Time for record in store.query(level="raw")] == [3600, 3630, 3640, 3670])
+
+        # Late sample of the last written minute is merged, older ones rejected
+        store.append(1, 20, 50, 3725)
+        self.assertTrue(store.append(1, 24, 50, 3690))
+        self.assertFalse(store.append(1, 24, 50, 3650))
+        store.close()
+
+        store = MeasureStore.MeasureStore(store.directory)
+        minutes = list(store.query(sensor=1, level="1m"))
+        self.assertTrue([(record.Time, record.Count, record.Temperature) for record in minutes] == [(3600, 3, 21), (3660, 2, 23.5), (3720, 1, 20)])
+        hours = list(store.query(sensor=1, level="1h"))
+        self.assertTrue([(record.Time, record.Count, record.MinTemperature, record.MaxTemperature) for record in hours] == [(3600, 6, 20, 24)])
+        store.close()
+        pass
+
+
+class SensorSchedulerTesting(unittest.TestCase):
+
+    def test_staggered_slots(self):
+        scheduler = SensorScheduler.SensorScheduler(SimulatedGPIO)
+        sensors = [scheduler.addSensor(pin, 2) for pin in (20, 21, 22)]
+
+        planned = [scheduler.scheduleNext() for sensor in sensors]
+        self.assertTrue([sensor for sensor, triggerTime in planned] == sensors)
+        for i in range(1, len(planned)):
+            self.assertTrue(planned[i][1] - planned[i - 1][1] >= scheduler.SLOT_SECONDS - 1e-9)
+
+        for sensor, triggerTime in planned:
+            scheduler.measured(sensor, triggerTime)
+        sensor, triggerTime = scheduler.scheduleNext()
+        self.assertTrue(sensor == sensors[0] and triggerTime == planned[0][1] + 2)
+
+        for sensor in sensors:
+            sensor.provider.Stop()
+        pass
+
+    def test_read_measure(self):
+        scheduler = SensorScheduler.SensorScheduler(SimulatedGPIO)
+        sensor = scheduler.addSensor(23, 2)
+
+        edgeTime = default_timer()
+        sensor.timeQueue.put(edgeTime)
+        for pulse in readTimelineFile("Tests/test-dht22-01.txt")[0].pulses:
+            edgeTime += pulse
+            sensor.timeQueue.put(edgeTime)
+
+        measure = scheduler.readMeasure(sensor)
+        self.assertTrue(measure['result'] == "OK" and sensor.Temperature == 27.2 and sensor.Humidity == 49.8)
+
+        # Response preamble before the bits, the frame is aligned after it
+        pulses = readTimelineFile("Tests/test-dht22-01.txt")[0].pulses
+        edgeTime = default_timer()
+        sensor.timeQueue.put(edgeTime)
+        for pulse in pulses[:1] + [DHT22.DHT22Decoder.PREAMBLE_LENGTH] + pulses[1:]:
+            edgeTime += pulse
+            sensor.timeQueue.put(edgeTime)
+
+        measure = scheduler.readMeasure(sensor)
+        self.assertTrue(measure['result'] == "OK" and sensor.Temperature == 27.2)
+        sensor.provider.Stop()
+        pass
+
+    def test_start_before_sensors(self):
+        scheduler = SensorScheduler.SensorScheduler(SimulatedGPIO)
+        scheduler.Start()
+        sleep(0.05)
+        self.assertTrue(scheduler.worker.is_alive())
+
+        sensor = scheduler.addSensor(24, 2)
+        deadline = default_timer() + 2
+        while sensor.interval.measures == 0 and default_timer() < deadline:
+            sleep(0.01)
+        self.assertTrue(sensor.interval.measures == 1 and scheduler.worker.is_alive())
+
+        scheduler.Stop()
+        scheduler.worker.join(3)
+        self.assertTrue(not scheduler.worker.is_alive())
+        sensor.provider.Stop()
+
+        # Stopped while waiting for the first sensor
+        scheduler = SensorScheduler.SensorScheduler(SimulatedGPIO)
+        scheduler.Start()
+        scheduler.Stop()
+        scheduler.worker.join(1)
+        self.assertTrue(not scheduler.worker.is_alive())
+        pass
+
+
+    def test_adaptive_interval(self):
+        interval = SensorScheduler.AdaptiveInterval(2, 8)
+        stable = {"result": "OK", "temperature": 21.0, "humidity": 40.0}
+        self.assertTrue([interval.update(stable) for i in range(0, 8)] == [2, 2, 2, 3, 4.5, 6.75, 8, 8])
+
+        # Change tightens until the last readings agree again
+        changed = dict(stable, temperature=22.0)
+        self.assertTrue([interval.update(changed) for i in range(0, 4)] == [4, 2, 2, 3])
+        self.assertTrue(interval.update(DecodeError("No response")) == 2 and interval.failures == 1)
+
+        # Constant readings reach the maximum far beyond 3 minutes of averages
+        interval = SensorScheduler.AdaptiveInterval(2, 600)
+        seconds = [interval.update(stable) for i in range(0, 20)]
+        self.assertTrue(seconds == sorted(seconds) and seconds[-1] == 600)
+
+        # Without maximum the interval is fixed
+        self.assertTrue(SensorScheduler.AdaptiveInterval(8).update(changed) == 8)
+
+        scheduler = SensorScheduler.SensorScheduler(SimulatedGPIO)
+        sensors = [scheduler.addSensor(pin, 2, MaxMeasureFrequencyInSeconds=8) for pin in (25, 26)]
+        for i in range(0, 4):
+            sensors[0].interval.update(stable)
+        self.assertTrue(abs(scheduler.getSamplingRate() - (1 / 3 + 1 / 2)) < 1e-9)
+
+        sensor, triggerTime = scheduler.scheduleNext()
+        scheduler.measured(sensor, triggerTime)
+        self.assertTrue(sensor == sensors[0])
+        self.assertTrue([plannedTime for plannedTime, order, planned in scheduler.schedule if planned == sensor] == [triggerTime + 3])
+
+        for sensor in sensors:
+            sensor.provider.Stop()
+        pass
+
+
+class ReplayedFileProvider(TimelineDataProvider):
+
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+
+    def InitDataQueue(self, queue):
+        super().InitDataQueue(queue)
+        self.putFile(self.filename)
+
+
+def exitingProvider():
+    os._exit(3)
+
+
+class FailingDecoder(SignalDecoder.SignalAdapter):
+
+    def getCommand(self):
+        raise RuntimeError("Decoder failed")
+
+
+class SupervisorTesting(unittest.TestCase):
+
+    def test_results_from_worker(self):
+        supervisor = Supervisor.Supervisor()
+        supervisor.addWorker("ir", "nec", ReplayedFileProvider, ("Tests/test-001.txt",), cpu=0)
+        supervisor.Start()
+
+        name, command = supervisor.getResult(True, 10)
+        self.assertTrue(name == "ir" and isinstance(command, NECCommand) and command["hex"] in "".join(readTimelineFile("Tests/test-001.txt")[0].returns))
+        supervisor.Stop()
+        pass
+
+    def test_restart(self):
+        supervisor = Supervisor.Supervisor()
+        supervisor.CHECK_INTERVAL = 0.05
+        supervisor.RESTART_DELAY = 0
+        spec = supervisor.addWorker("crashing", "nec", exitingProvider)
+        supervisor.Start()
+
+        start = default_timer()
+        while spec.restarts < 2 and default_timer() - start < 10:
+            sleep(0.05)
+        supervisor.Stop()
+        self.assertTrue(spec.restarts >= 2)
+        pass
+
+    def test_restart_failed_decoder(self):
+        # Process stays alive when its decoder thread dies; spawned
+        # workers must not get the previous process
+        supervisor = Supervisor.Supervisor("spawn")
+        supervisor.CHECK_INTERVAL = 0.05
+        supervisor.RESTART_DELAY = 0
+        supervisor.POLL_INTERVAL = 0.05
+        spec = supervisor.addWorker("failing", FailingDecoder, SignalDecoder.SignalDataProvider)
+        supervisor.Start()
+
+        start = default_timer()
+        while spec.restarts < 2 and default_timer() - start < 20:
+            sleep(0.05)
+        supervisor.Stop()
+        self.assertTrue(spec.restarts >= 2)
+        pass
+
+
+class ClockTesting(unittest.TestCase):
+
+    def test_virtual_clock(self):
+        clock = Clock.VirtualClock()
+        provider = TimelineDataProvider(clock=clock)
+        reader = SignalDecoder.SignalDecoder(provider, DHT22.DHT22Decoder(), clock=clock)
+        provider.putFile("Tests/test-dht22-01.txt", True)
+
+        measure = reader.getCommand(True)
+        self.assertTrue(measure['result'] == "OK" and measure.dateTime == Clock.VirtualClock.START_TIME + 0.005)
+        reader.Stop()
+        pass
+
+    def decodeTruncatedFrame(self, slowProducer):
+        # Decoder waits for the producer, never for real time
+        clock = Clock.VirtualClock()
+        timeQueue = Queue()
+        decoder = MultiProtocolDecoder.MultiProtocolDecoder()
+        decoder.setClock(clock)
+        decoder.initialize(timeQueue)
+
+        # NEC frame cut after 20 pulses, then a whole frame 1s later
+        pulses = readTimelineFile("Tests/test-001.txt")[0].pulses
+        edgeTimes = [1.0]
+        for pulse in pulses[:21] + [1.0] + pulses[1:]:
+            edgeTimes.append(edgeTimes[-1] + pulse)
+
+        def produce():
+            for edgeTime in edgeTimes:
+                if slowProducer:
+                    sleep(0.001)
+                timeQueue.put(edgeTime)
+
+        producer = Thread(target=produce)
+        producer.start()
+        first = decoder.getCommand()
+        firstTime = clock.now()
+        second = decoder.getCommand()
+        producer.join()
+        return first, firstTime, second, clock
+
+    def test_queue_deadline(self):
+        first, firstTime, second, clock = self.decodeTruncatedFrame(False)
+        slowFirst, slowFirstTime, slowSecond, slowClock = self.decodeTruncatedFrame(True)
+
+        self.assertTrue(first['protocol'] == "NEC" and first['result'] == "ERROR" and second['hex'] == "0x2d58")
+        self.assertTrue(firstTime == slowFirstTime and clock.now() == slowClock.now())
+
+        # Idle producer: the decoder reaches its deadline without edges
+        clock.setIdle()
+        timeQueue = Queue()
+        with self.assertRaises(Empty):
+            clock.get(timeQueue, 0.5)
+        self.assertTrue(clock.now() == slowClock.now() + 0.5)
+        pass
+
+    def test_end_of_input(self):
+        # Decoder blocked on a part of a frame ends when the queue is stopped
+        timeQueue = SignalDecoder.EdgeQueue()
+        decoder = NEC.NECDecoder()
+        decoder.initialize(timeQueue)
+        for edgeTime in [1.0, 1.0135, 1.015]:
+            timeQueue.put(edgeTime)
+
+        ended = []
+        def consume():
+            try:
+                decoder.getCommand()
+            except SignalDecoder.EndOfInput:
+                ended.append(True)
+
+        worker = Thread(target=consume)
+        worker.start()
+        sleep(0.1)
+        timeQueue.stop()
+        worker.join(1)
+        self.assertTrue(not worker.is_alive() and ended == [True] and timeQueue.isFinished())
+
+        # Virtual deadlines before the end time are still reached
+        clock = Clock.VirtualClock()
+        timeQueue = SignalDecoder.EdgeQueue()
+        timeQueue.stop(clock.now() + 0.025)
+        deadlines = 0
+        with self.assertRaises(SignalDecoder.EndOfInput):
+            while True:
+                try:
+                    clock.get(timeQueue, 0.01)
+                except Empty:
+                    deadlines += 1
+        self.assertTrue(deadlines == 3 and clock.now() == Clock.VirtualClock.START_TIME + 0.025)
+        pass
+
+    def test_average_age(self):
+        clock = Clock.VirtualClock()
+        average = DHT22.AverageMeasure(180, clock)
+        average.append(DHT22.Measure(20, 50, clock.now()))
+
+        clock.sleep(180)
+        average.remove()
+        self.assertTrue(len(average.results) == 1)
+
+        clock.advanceTo(clock.now() + 1)
+        average.remove()
+        self.assertTrue(len(average.results) == 0)
+        pass
+
+
+class EdgeFilterTesting(unittest.TestCase):
+
+    def test_noisy_pin(self):
+        clock = Clock.VirtualClock()
+        provider = GPIODataProvider.EdgeDetected(SimulatedGPIO.BCM, 25, 100, SimulatedGPIO, EdgeFilter.getFilter("nec"))
+        provider.setClock(clock)
+        queue = Queue()
+        provider.InitDataQueue(queue)
+
+        def edge(time):
+            clock.advanceTo(time)
+            SimulatedGPIO.pulse(25)
+
+        # Idle noise, then the frame with a glitch after every 8th edge
+        for time in (1.1, 1.3, 1.302, 1.5):
+            edge(time)
+        time = 2.0
+        for i, pulse in enumerate(readTimelineFile("Tests/test-001.txt")[0].pulses):
+            if i % 8 == 1:
+                edge(time + 0.00005)
+            time += pulse
+            edge(time)
+        provider.Stop()
+
+        self.assertTrue(queue.qsize() == 34 and provider.filter.dropped == 4 + 5)
+
+        decoder = NEC.NECDecoder()
+        decoder.setClock(clock)
+        decoder.initialize(queue)
+        self.assertTrue(decoder.getCommand()["hex"] == "0x2d58")
+        pass
+
+
+class WavDataProviderTesting(unittest.TestCase):
+
+    SAMPLE_RATE = 96000
+
+    def getRecording(self, edgeTimes, lowSeconds=0.00056):
+        # Line-in recording: low after every falling edge, some noise
+        noise = random.Random(1)
+        length = int((edgeTimes[-1] + 0.01) * self.SAMPLE_RATE)
+        samples = []
+        edge = 0
+        for i in range(length):
+            time = i / self.SAMPLE_RATE
+            while edge + 1 < len(edgeTimes) and edgeTimes[edge + 1] <= time:
+                edge += 1
+            level = -0.5 if edgeTimes[edge] <= time < edgeTimes[edge] + lowSeconds else 0.5
+            samples.append(int((level + noise.uniform(-0.02, 0.02)) * 32767))
+
+        recording = io.BytesIO()
+        with wave.open(recording, "wb") as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(self.SAMPLE_RATE)
+            file.writeframes(struct.pack("<{0}h".format(len(samples)), *samples))
+        recording.seek(0)
+        return recording
+
+    def test_wav_edges(self):
+        edgeTimes = [0.01]
+        for pulse in readTimelineFile("Tests/test-001.txt")[0].pulses[1:]:
+            edgeTimes.append(edgeTimes[-1] + pulse)
+
+        provider = WavDataProvider.WavDataProvider(self.getRecording(edgeTimes), startTime=0)
+        provider.CHUNK_FRAMES = 1000
+        found = list(provider.readEdges())
+        self.assertTrue(len(found) == len(edgeTimes))
+        self.assertTrue(max(abs(a - b) for a, b in zip(found, edgeTimes)) < 1 / self.SAMPLE_RATE)
+
+        clock = Clock.VirtualClock()
+        provider = WavDataProvider.WavDataProvider(self.getRecording(edgeTimes), clock=clock)
+        reader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder(), clock=clock)
+        self.assertTrue(reader.getCommand(True)["hex"] == "0x2d58")
+        reader.Stop()
+        pass
+
+    def readEdges(self, recording, edges):
+        provider = WavDataProvider.WavDataProvider(recording, edges=edges, startTime=0)
+        provider.CHUNK_FRAMES = 1000
+        return [(float(edgeTime), getattr(edgeTime, "riseTime", None)) for edgeTime in provider.readEdges()]
+
+    @unittest.skipUnless(WavDataProvider.numpy, "NumPy is not installed")
+    def test_numpy_matches_python(self):
+        edgeTimes = [0.01]
+        for pulse in readTimelineFile("Tests/test-002.txt")[-1].pulses[1:]:
+            edgeTimes.append(edgeTimes[-1] + pulse)
+        recording = self.getRecording(edgeTimes).getvalue()
+
+        for edges in ("falling", "rising", "both"):
+            vectorized = self.readEdges(io.BytesIO(recording), edges)
+            numpy = WavDataProvider.numpy
+            try:
+                WavDataProvider.numpy = None
+                python = self.readEdges(io.BytesIO(recording), edges)
+            finally:
+                WavDataProvider.numpy = numpy
+
+            self.assertTrue(len(vectorized) == len(python) > 30)
+            for (fast, fastRise), (slow, slowRise) in zip(vectorized, python):
+                self.assertTrue(abs(fast - slow) < 1e-9)
+                self.assertTrue(fastRise == slowRise or abs(fastRise - slowRise) < 1e-9)
+        pass
+
+
+class BulkDecoderTesting(unittest.TestCase):
+
+    def test_parallel_decode(self):
+        files = ["Tests/test-001.txt", "Tests/test-dht22-01.txt", "Tests/test-dht22-02.txt", "Tests/test-001.txt"]
+        edgeTimes = BulkDecoder.getEdgeTimes(files, True)
+
+        # Whole capture by one decoder
+        expected = BulkDecoder.decodeTask((None, [], edgeTimes))
+
+        decoder = BulkDecoder.BulkDecoder(processes=2)
+        self.assertTrue(len(decoder.getTasks(edgeTimes)) == 7)
+
+        frames = list(decoder.decode(edgeTimes))
+        self.assertTrue([frameTime for frameTime, result in frames] == sorted(frameTime for frameTime, result in frames))
+        self.assertTrue([(frameTime, result.toDict()) for frameTime, result in frames] ==
+                        [(frameTime, result.toDict()) for frameTime, result in expected])
+        self.assertTrue(len([result for frameTime, result in frames if result.get("protocol") == "NEC"]) == 8)
+        pass
+
+    def getDHT22Edges(self, startTime, temperature, humidity):
+        # Leader and 40 bits: humidity, temperature and checksum
+        data = [int(round(humidity * 10)) >> 8, int(round(humidity * 10)) & 0xFF, int(round(temperature * 10)) >> 8, int(round(temperature * 10)) & 0xFF]
+        bits = "".join(format(byte, "08b") for byte in data + [sum(data) & 0xFF])
+        edgeTimes = [startTime, startTime + 0.005]
+        for bit in bits:
+            edgeTimes.append(edgeTimes[-1] + (0.00014 if bit == "1" else 0.000076))
+        return edgeTimes
+
+    def test_average_across_shards(self):
+        # Measure every 40s, the 3 minutes average covers 5 measures of several shards
+        temperatures = [20.0, 20.4, 20.8, 21.2, 21.6, 22.0, 22.4, 22.8]
+        edgeTimes = []
+        for i in range(0, len(temperatures)):
+            edgeTimes += self.getDHT22Edges(1 + 40 * i, temperatures[i], 50)
+
+        expected = BulkDecoder.decodeTask((["DHT22"], [], edgeTimes))
+        decoder = BulkDecoder.BulkDecoder(["DHT22"], processes=2)
+        self.assertTrue(len(decoder.getTasks(edgeTimes)) == 8)
+
+        frames = list(decoder.decode(edgeTimes))
+        self.assertTrue([result.toDict() for frameTime, result in frames] == [result.toDict() for frameTime, result in expected])
+        self.assertTrue([result["temperature"] for frameTime, result in frames] == temperatures)
+        self.assertTrue(frames[-1][1]["avg_temperature"] == 22.0)
+        pass
+
+
+class ResultsTesting(unittest.TestCase):
+
+    def test_nec_results(self):
+        decoder = NEC.NECDecoder()
+        timeline = readTimelineFile("Tests/test-002.txt")[-1]
+        first = decoder.decodePulses(list(timeline.pulses))
+        second = decoder.decodePulses(list(timeline.pulses))
+
+        self.assertTrue(first is second and first.code == int(first["hex"], 16))
+        self.assertTrue(json.loads(json.dumps(first, default=toJSON)) == first.toDict())
+        self.assertTrue(pickle.loads(pickle.dumps(first)).toDict() == first.toDict())
+        self.assertTrue(first.withProtocol("NEC")["protocol"] == "NEC" and "protocol" not in first)
+
+        error = decoder.decodePulses([])
+        self.assertTrue(isinstance(error, DecodeError) and not error and error["result"] == "ERROR")
+        pass
+
+    def test_dht22_reading(self):
+        reading = DHT22Reading("OK", "0000000111110010000000010001000000000100", 49.8, 27.2, 49.8, 27.2)
+        self.assertTrue(reading.binary == "00000001 11110010 00000001 00010000 00000100")
+        self.assertTrue("checksum" not in reading and reading.get("checksum", 0) == 0 and reading["avg_humidity"] == 27.2)
+        pass
+
+
+class DispatcherTesting(unittest.TestCase):
+
+    def test_dispatch(self):
+        dispatcher = Dispatcher.CommandDispatcher(workers=1)
+        received = {"hex": [], "address": [], "all": []}
+        dispatcher.subscribe(received["hex"].append, hex="0x2d58", repeatInterval=10)
+        dispatcher.subscribe(received["address"].append, address=0x2d, debounceSeconds=10)
+        dispatcher.subscribe(received["all"].append)
+
+        command = NECCommand.create(0x2d58, "1011010010110100", "0001101011100101")
+        for event in (command, NECRepeat.create(), NECRepeat.create(), NECCommand(0x2d59, "", ""), NECCommand(0x1100, "", ""), DecodeError("Test")):
+            dispatcher.dispatch(event)
+        dispatcher.join()
+
+        self.assertTrue(received["hex"] == [command])
+        self.assertTrue([event["hex"] for event in received["address"]] == ["0x2d58"] * 3 + ["0x2d59"])
+        self.assertTrue(len(received["all"]) == 5 and received["all"][1] is command.asRepeat() and received["all"][1]["repeat"])
+        dispatcher.close()
+        pass
+
+    def test_debounce_per_code(self):
+        dispatcher = Dispatcher.CommandDispatcher(workers=1, debounceSeconds=10)
+        received = []
+        dispatcher.subscribe(received.append)
+
+        for code in (0x2d58, 0x2d59, 0x2d58, 0x2d59):
+            dispatcher.dispatch(NECCommand(code, "", ""))
+        dispatcher.join()
+
+        self.assertTrue([event.code for event in received] == [0x2d58, 0x2d59])
+        dispatcher.close()
+        pass
+
+    def test_slow_handler(self):
+        dispatcher = Dispatcher.CommandDispatcher(workers=1)
+        dispatcher.subscribe(lambda event: sleep(0.2))
+
+        start = default_timer()
+        dispatcher.dispatch(NECCommand(0x2d58, "", ""))
+        self.assertTrue(default_timer() - start < 0.1)
+        dispatcher.close()
+        pass
+
+
+class LogTesting(unittest.TestCase):
+
+    def test_pulse_trace(self):
+        provider = GPIODataProvider.EdgeDetected(SimulatedGPIO.BCM, 24, 100, SimulatedGPIO)
+        provider.InitDataQueue(Queue())
+        provider.trace = Log.PulseTrace(3)
+
+        for i in range(5):
+            SimulatedGPIO.pulse(24)
+
+        edges = provider.trace.getEdges()
+        self.assertTrue(len(edges) == 3 and len(provider.trace.getPulses()) == 2)
+        self.assertTrue(edges == sorted(edges))
+
+        filename = os.path.join(tempfile.mkdtemp(), "trace.txt")
+        provider.trace.save(filename)
+        self.assertTrue(len(readTimelineFile(filename)[0].pulses) == 2)
+        provider.Stop()
+        pass
+
+    def test_debug_per_decoder(self):
+        debugged = NEC.NECDecoder()
+        silent = NEC.NECDecoder()
+        output = io.StringIO()
+        handler = logging.StreamHandler(output)
+        handler.setFormatter(logging.Formatter("%(name)s %(message)s"))
+        NEC.log.addHandler(handler)
+        try:
+            debugged.initialize(Queue(), True)
+            silent.initialize(Queue())
+            debugged.decodePulses(self.getPulses())
+            silent.decodePulses(self.getPulses())
+        finally:
+            NEC.log.removeHandler(handler)
+
+        self.assertTrue(debugged.DEBUG and not silent.DEBUG and not Log.isDebugEnabled(NEC.log))
+        self.assertTrue(debugged.log.name.startswith("SignalDecoder.NEC.") and debugged.log.name in output.getvalue())
+        self.assertTrue(output.getvalue().count("Address:") == 1)
+
+        # Initialized again, the decoder keeps its logger
+        logger = debugged.log
+        debugged.initialize(Queue(), True)
+        self.assertTrue(debugged.log is logger)
+        pass
+
+    def test_debug_checksum(self):
+        # Checksum diagnostics follow the logger of the decoder
+        decoder = DHT22.DHT22Decoder()
+        decoder.initialize(Queue(), True)
+        output = io.StringIO()
+        handler = logging.StreamHandler(output)
+        decoder.log.addHandler(handler)
+        try:
+            pulses = readTimelineFile("Tests/test-dht22-01.txt")[0].pulses[1:]
+            pulses[-1] = 0.00015
+            result = decoder.decodePulses(pulses, 0)
+        finally:
+            decoder.log.removeHandler(handler)
+        self.assertTrue(result["result"] == "ERROR" and "Checksum read" in output.getvalue())
+        pass
+
+    def getPulses(self):
+        return readTimelineFile("Tests/test-001.txt")[0].pulses
+
+    def test_silent_by_default(self):
+        average = DHT22.AverageMeasure()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for temperature in (20, 21, 22):
+                average.append(DHT22.Measure(temperature, 50, default_timer()))
+        self.assertTrue(output.getvalue() == "")
+        pass
+
 
 class DHT22Testing(unittest.TestCase):
+
+    def decodeWithNoise(self, before, after):
+        decoder = DHT22.DHT22Decoder()
+        queue = Queue()
+        decoder.initialize(queue)
+
+        edgeTime = default_timer()
+        queue.put(edgeTime)
+        for pulse in [0.005] + before + readTimelineFile("Tests/test-dht22-01.txt")[0].pulses[1:] + after:
+            edgeTime += pulse
+            queue.put(edgeTime)
+        return decoder.getCommand()
+
+    def test_frame_alignment(self):
+        # Response preamble, noise edges before it and after the frame
+        for before, after in (([0.00016], []), ([0.00003, 0.00002, 0.00016], [0.00003]), ([], [0.00002, 0.00003])):
+            measure = self.decodeWithNoise(before, after)
+            self.assertTrue(measure['result'] == "OK" and measure['temperature'] == 27.2 and measure['humidity'] == 49.8)
+        pass
+
     
     def dht_test_001(self):
         self.dhtTestProvider = TestDataProvider()
@@ -120,6 +1247,20 @@ class NeuralNetworkTesting(unittest.TestCase):
         self.assertTrue(neuralValue.calculate() == 2)
         pass
 
+    def test_value_array(self):
+        neuralValue = NeuralValueArray("value", 2, False, 2)
+        neuralValue.load([1, 0, 0, 1])
+        self.assertTrue(neuralValue.calculate() == 0)
+
+        neuralValue.reward(2)
+        self.assertTrue(neuralValue.calculate() == 2)
+        self.assertTrue(neuralValue.calculateBatch([[1, 0, 0, 1], [0, 1, 1, 0]]) == [2, 1])
+
+        neuralValue.rewardBatch([[0, 1, 1, 0]] * 2, [1, 1])
+        self.assertTrue(list(neuralValue.factors) == [4, 1, 4, 1])
+        self.assertTrue(neuralValue.calculateBatch([[1, 0, 0, 1], [0, 1, 1, 0]]) == [2, 1])
+        pass
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,138 @@
+#
+#   Recorded signal timelines (Tests/*.txt format)
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   File format:
+#
+#   Name
+#   <description>
+#
+#   Timeline
+#   1 <seconds from previous edge>
+#   2 <seconds from previous edge>
+#   ...
+#
+#   Pattern
+#   <expected bits, optional>
+#
+#   Returns
+#   <expected result>
+#
+
+from SignalDecoder import SignalDataProvider
+
+
+class Timeline:
+
+    def __init__(self, name=''):
+        self.name = name
+        self.pulses = []
+        self.pattern = None
+        self.returns = []
+
+    def getPatternBits(self):
+        if self.pattern is None:
+            return None
+        return self.pattern.replace(' ', '')
+
+
+def readTimelineFile(filename):
+    with open(filename, "r") as file:
+        lines = file.readlines()
+
+    timelines = []
+    name = ''
+    current = None
+    section = None
+    edge_number = 0
+
+    for line in lines:
+        text = line.strip()
+        words = text.split()
+
+        if section == 'Timeline':
+            if len(words) == 2 and int(words[0]) == edge_number + 1:
+                edge_number += 1
+                current.pulses.append(float(words[1]))
+                continue
+            section = None
+
+        if section == 'Name':
+            name = text
+            section = None
+        elif section == 'Pattern' and current is not None:
+            current.pattern = text
+            section = None
+        elif section == 'Returns' and current is not None:
+            current.returns.append(text)
+            section = None
+        elif text in ('Name', 'Pattern', 'Returns'):
+            section = text
+        elif text == 'Timeline':
+            current = Timeline(name)
+            timelines.append(current)
+            section = text
+            edge_number = 0
+
+    return timelines
+
+
+class TimelineDataProvider(SignalDataProvider):
+    # Puts recorded timelines into decoder queue, one after another
+
+    # Longer than NEC repeat break (0.097s), so it is never taken as repeat
+    GAP_BETWEEN_TIMELINES = 0.2
+
+    def __init__(self, startTime=None, clock=None):
+        if clock is not None:
+            self.clock = clock
+        self.edgeTime = self.clock.now() if startTime is None else startTime
+        self.edgeCount = 0
+
+    def InitDataQueue(self, queue):
+        self.Queue = queue
+        pass
+
+    def putPulses(self, pulses, addZeroTime=False, leader=None):
+        # Recordings of data bits only, leader starts from its own edge
+        if leader is not None:
+            pulses = [leader] + pulses
+            addZeroTime = True
+
+        if addZeroTime:
+            self.Queue.put(self.edgeTime)
+            self.edgeCount += 1
+
+        for pulseLength in pulses:
+            self.edgeTime += pulseLength
+            self.Queue.put(self.edgeTime)
+            self.edgeCount += 1
+
+        self.edgeTime += self.GAP_BETWEEN_TIMELINES
+        pass
+
+    def putFile(self, filename, addZeroTime=False, leader=None):
+        # Producer of a virtual clock is idle after the whole file
+        timelines = readTimelineFile(filename)
+        for timeline in timelines:
+            self.putPulses(timeline.pulses, addZeroTime, leader)
+        self.clock.setIdle()
+        return timelines
+
+    def Stop(self):
+        # No more timelines: a SignalDecoder.EdgeQueue ends after the gap
+        # of the last one, its decoder gets EndOfInput
+        if hasattr(self.Queue, "stop"):
+            self.Queue.stop(self.edgeTime)
+
+
+def writeTimelineFile(filename, edgeTimes, name=''):
+    with open(filename, "w") as file:
+        file.write("Name\n{0}\n\nTimeline\n".format(name))
+        for i in range(1, len(edgeTimes)):
+            file.write("{0} {1:.9f}\n".format(i, edgeTimes[i] - edgeTimes[i - 1]))
+        file.write("\n")
+    pass
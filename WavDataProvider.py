@@ -0,0 +1,217 @@
+#
+#   Edges read from sound card recordings
+#   Designed for Raspberry Pi, Python 3
+#
+#   2024 Kamil Skoczylas
+#   MIT Licence
+#
+#   Signals recorded by a sound card line-in (WAV file or raw PCM
+#   stream) are read in chunks, so memory does not grow with the length
+#   of the recording. Level crossings are found with hysteresis and the
+#   time of every edge is interpolated between samples. NumPy is used
+#   when it is installed, otherwise samples are checked one by one.
+#
+#   Usage:
+#   clock = Clock.VirtualClock()
+#   provider = WavDataProvider.WavDataProvider("Tests/nec-96k.wav", clock=clock)
+#   IReader = SignalDecoder.SignalDecoder(provider, NEC.NECDecoder(), clock=clock)
+#
+#   Both edges, the decoders use widths of marks and spaces:
+#   provider = WavDataProvider.WavDataProvider("Tests/nec-96k.wav", edges="both", clock=clock)
+#
+#   arecord -f S16_LE -r 96000 -t raw | python receiver.py
+#   provider = WavDataProvider.WavDataProvider(sys.stdin.buffer, sampleRate=96000)
+#
+
+import wave
+from array import array
+from threading import Thread
+from SignalDecoder import SignalDataProvider, Edge
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Sample width in bytes -> array type code, NumPy type
+SAMPLE_TYPES = {1: ('B', 'u1'), 2: ('h', '<i2'), 4: ('i', '<i4')}
+
+
+class WavDataProvider(SignalDataProvider):
+
+    CHUNK_FRAMES = 65536
+
+    def __init__(self, source, sampleRate=None, sampleWidth=2, channels=1, channel=0,
+                 threshold=0.0, hysteresis=0.1, invert=False, edges="falling", startTime=None, clock=None):
+        # WAV file name or file object; raw PCM stream when sampleRate is given
+        if sampleRate is None:
+            self.wav = wave.open(source, "rb")
+            sampleRate = self.wav.getframerate()
+            sampleWidth = self.wav.getsampwidth()
+            channels = self.wav.getnchannels()
+            self.stream = None
+        else:
+            self.wav = None
+            self.stream = open(source, "rb") if isinstance(source, str) else source
+
+        if sampleWidth not in SAMPLE_TYPES:
+            raise ValueError("Sample width of {0} bytes is not supported".format(sampleWidth))
+
+        self.sampleRate = sampleRate
+        self.sampleWidth = sampleWidth
+        self.channels = channels
+        self.channel = channel
+
+        # Levels from -1 to 1, a crossing needs to pass the whole hysteresis
+        self.highLevel = threshold + hysteresis / 2
+        self.lowLevel = threshold - hysteresis / 2
+        self.invert = invert
+        # "both": falling edges carry the time of the rising edge before them
+        self.bothEdges = edges == "both"
+        self.emitFalling = edges in ("falling", "both")
+        self.emitRising = edges == "rising"
+
+        if clock is not None:
+            self.clock = clock
+        self.startTime = self.clock.now() if startTime is None else startTime
+
+        # State carried between chunks
+        self.sampleIndex = 0
+        self.lastValue = None
+        self.isHigh = None
+        self.riseTime = None
+        self.edgeCount = 0
+        self.worker = None
+
+    def InitDataQueue(self, queue):
+        self.Queue = queue
+        self.Start()
+        pass
+
+    def Start(self):
+        self.worker = Thread(target=self.putEdges)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def putEdges(self):
+        for edgeTime in self.readEdges():
+            self.Queue.put(edgeTime)
+            self.edgeCount += 1
+        self.clock.setIdle()
+
+    def readChunk(self):
+        if self.wav is not None:
+            return self.wav.readframes(self.CHUNK_FRAMES)
+        return self.stream.read(self.CHUNK_FRAMES * self.sampleWidth * self.channels)
+
+    def readEdges(self):
+        # Edge times of the whole recording, chunk by chunk
+        frameSize = self.sampleWidth * self.channels
+        rest = b''
+        while True:
+            data = self.readChunk()
+            if not data:
+                break
+
+            data = rest + data
+            usable = len(data) - len(data) % frameSize
+            rest = data[usable:]
+
+            for edgeTime in self.findEdges(self.getLevels(data[:usable])):
+                yield edgeTime
+
+    def getLevels(self, data):
+        # Samples of the channel scaled from -1 to 1
+        typeCode, numpyType = SAMPLE_TYPES[self.sampleWidth]
+        scale = 1 << (8 * self.sampleWidth - 1)
+        offset = scale if self.sampleWidth == 1 else 0
+        sign = -1 if self.invert else 1
+
+        if numpy is not None:
+            samples = numpy.frombuffer(data, dtype=numpyType)[self.channel::self.channels]
+            return (samples.astype(numpy.float64) - offset) * (sign / scale)
+
+        samples = array(typeCode)
+        samples.frombytes(data)
+        return [(value - offset) * sign / scale for value in samples[self.channel::self.channels]]
+
+    def getEdgeTime(self, index, previous, value, level):
+        # Time when the line between two samples crosses the level
+        fraction = (previous - level) / (previous - value) if previous != value else 1.0
+        return self.startTime + (index - 1 + fraction) / self.sampleRate
+
+    def findEdges(self, levels):
+        if numpy is not None:
+            return self.findEdgesNumPy(levels)
+        return self.findEdgesPython(levels)
+
+    def findEdgesPython(self, levels):
+        edgeTimes = []
+        index = self.sampleIndex
+        previous = self.lastValue
+        isHigh = self.isHigh
+
+        for value in levels:
+            if value > self.highLevel:
+                if isHigh is False and self.emitRising:
+                    edgeTimes.append(self.getEdgeTime(index, previous, value, self.highLevel))
+                elif isHigh is False and self.bothEdges:
+                    self.riseTime = self.getEdgeTime(index, previous, value, self.highLevel)
+                isHigh = True
+            elif value < self.lowLevel:
+                if isHigh is True and self.emitFalling:
+                    edgeTime = self.getEdgeTime(index, previous, value, self.lowLevel)
+                    edgeTimes.append(Edge(edgeTime, self.riseTime) if self.bothEdges else edgeTime)
+                isHigh = False
+            previous = value
+            index += 1
+
+        self.sampleIndex = index
+        self.lastValue = previous
+        self.isHigh = isHigh
+        return edgeTimes
+
+    def findEdgesNumPy(self, levels):
+        if len(levels) == 0:
+            return []
+
+        # Samples outside the hysteresis decide the state, samples inside keep it
+        decided = numpy.flatnonzero((levels > self.highLevel) | (levels < self.lowLevel))
+        states = levels[decided] > self.highLevel
+
+        if self.isHigh is not None:
+            states = numpy.concatenate(([self.isHigh], states))
+            decided = numpy.concatenate(([-1], decided))
+
+        changes = numpy.flatnonzero(states[1:] != states[:-1]) + 1
+        changeIndexes = decided[changes]
+        rising = states[changes]
+
+        previous = numpy.concatenate(([self.lastValue if self.lastValue is not None else levels[0]], levels))[changeIndexes]
+        values = levels[changeIndexes]
+        crossed = numpy.where(rising, self.highLevel, self.lowLevel)
+        difference = previous - values
+        fraction = numpy.divide(previous - crossed, difference, out=numpy.ones_like(values), where=difference != 0)
+        edgeTimes = self.startTime + (self.sampleIndex + changeIndexes - 1 + fraction) / self.sampleRate
+
+        selected = (rising & self.emitRising) | (~rising & self.emitFalling)
+
+        if len(states) > 0:
+            self.isHigh = bool(states[-1])
+        self.sampleIndex += len(levels)
+        self.lastValue = float(levels[-1])
+
+        if self.bothEdges:
+            return self.markEdges(edgeTimes.tolist(), rising.tolist())
+        return edgeTimes[selected].tolist()
+
+    def markEdges(self, edgeTimes, rising):
+        # Falling edges with the time of the rising edge before them
+        marked = []
+        for edgeTime, isRising in zip(edgeTimes, rising):
+            if isRising:
+                self.riseTime = edgeTime
+            else:
+                marked.append(Edge(edgeTime, self.riseTime))
+        return marked